@@ -0,0 +1,23 @@
+import click
+from frappe.commands import pass_context
+
+
+@click.command("rebuild-whatsapp-phone-index")
+@pass_context
+def rebuild_whatsapp_phone_index(context):
+    """Rebuild the phone number index used to link incoming WhatsApp messages."""
+    import frappe
+
+    from whatsapp_evolution.utils import phone_index
+
+    for site in context.sites:
+        frappe.init(site=site)
+        frappe.connect()
+        try:
+            indexed = phone_index.rebuild()
+            click.echo(f"{site}: indexed {indexed} phone numbers")
+        finally:
+            frappe.destroy()
+
+
+commands = [rebuild_whatsapp_phone_index]
@@ -126,6 +126,13 @@ after_install = "whatsapp_evolution.setup.setup_custom_fields"
 # ---------------
 
 scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            "whatsapp_evolution.utils.deferred.enqueue_due_jobs",
+            "whatsapp_evolution.utils.instance_health.poll_instance_health",
+            "whatsapp_evolution.utils.webhook_stream.drain_webhook_stream",
+        ],
+    },
     "all": [
         "whatsapp_evolution.utils.trigger_whatsapp_notifications_all"
     ],
@@ -238,10 +245,38 @@ doc_events = {
         "on_submit": "whatsapp_evolution.whatsapp_evolution.payment_entry_balance.update_payment_entry_whatsapp_balances",
         "on_update_after_submit": "whatsapp_evolution.whatsapp_evolution.payment_entry_balance.update_payment_entry_whatsapp_balances",
     },
+    "Contact": {
+        "on_update": "whatsapp_evolution.utils.phone_index.update_doc",
+        "on_trash": "whatsapp_evolution.utils.phone_index.remove_doc",
+        "after_rename": "whatsapp_evolution.utils.phone_index.rename_doc",
+    },
+    "Customer": {
+        "on_update": "whatsapp_evolution.utils.phone_index.update_doc",
+        "on_trash": "whatsapp_evolution.utils.phone_index.remove_doc",
+        "after_rename": "whatsapp_evolution.utils.phone_index.rename_doc",
+    },
+    "Lead": {
+        "on_update": "whatsapp_evolution.utils.phone_index.update_doc",
+        "on_trash": "whatsapp_evolution.utils.phone_index.remove_doc",
+        "after_rename": "whatsapp_evolution.utils.phone_index.rename_doc",
+    },
+    "Supplier": {
+        "on_update": "whatsapp_evolution.utils.phone_index.update_doc",
+        "on_trash": "whatsapp_evolution.utils.phone_index.remove_doc",
+        "after_rename": "whatsapp_evolution.utils.phone_index.rename_doc",
+    },
+    "Employee": {
+        "on_update": "whatsapp_evolution.utils.phone_index.update_doc",
+        "on_trash": "whatsapp_evolution.utils.phone_index.remove_doc",
+        "after_rename": "whatsapp_evolution.utils.phone_index.rename_doc",
+    },
 }
 
 override_whatsapp_webhook = {
     "Evolution": "whatsapp_evolution.providers.evolution.handle_webhook"
 }
 
-after_migrate = "whatsapp_evolution.setup.setup_custom_fields"
+after_migrate = [
+    "whatsapp_evolution.setup.setup_custom_fields",
+    "whatsapp_evolution.utils.clear_notifications_map",
+]
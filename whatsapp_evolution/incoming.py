@@ -1,5 +1,7 @@
 import frappe
 
+from whatsapp_evolution.utils import normalize_message_id, phone_index
+
 
 def _digits(value):
     return "".join(ch for ch in str(value or "") if ch.isdigit())
@@ -15,6 +17,10 @@ def _numbers_match(a, b):
 
 
 def _find_reference_by_number(number):
+    return phone_index.resolve(number, _scan_reference_by_number)
+
+
+def _scan_reference_by_number(number):
     rows = frappe.get_all(
         "Contact Phone",
         filters={"is_whatsapp_number": 1},
@@ -44,7 +50,9 @@ def handle_incoming_message(msg):
     message_id = (msg.get("message_id") or "").strip()
 
     if message_id:
-        existing = frappe.db.get_value("WhatsApp Message", {"message_id": message_id}, "name")
+        existing = frappe.db.get_value(
+            "WhatsApp Message", {"normalized_message_id": normalize_message_id(message_id)}, "name"
+        )
         if existing:
             return existing
 
@@ -0,0 +1,35 @@
+import frappe
+
+from whatsapp_evolution.utils import phone_suffix
+
+BATCH_SIZE = 5000
+
+
+def execute():
+    if not frappe.db.has_column("WhatsApp Message", "to_number_suffix"):
+        return
+
+    last_name = ""
+    while True:
+        rows = frappe.get_all(
+            "WhatsApp Message",
+            filters={"name": (">", last_name)},
+            fields=["name", "to", "from", "to_number_suffix", "from_number_suffix"],
+            order_by="name asc",
+            limit_page_length=BATCH_SIZE,
+        )
+        if not rows:
+            break
+
+        for row in rows:
+            values = {
+                "to_number_suffix": phone_suffix(row.to) or None,
+                "from_number_suffix": phone_suffix(row.get("from")) or None,
+            }
+            if values != {"to_number_suffix": row.to_number_suffix, "from_number_suffix": row.from_number_suffix}:
+                frappe.db.set_value("WhatsApp Message", row.name, values, update_modified=False)
+        frappe.db.commit()
+
+        last_name = rows[-1].name
+        if len(rows) < BATCH_SIZE:
+            break
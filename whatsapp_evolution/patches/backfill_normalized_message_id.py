@@ -0,0 +1,44 @@
+import frappe
+
+from whatsapp_evolution.utils import normalize_message_id
+
+BATCH_SIZE = 5000
+
+
+def execute():
+    if not frappe.db.has_column("WhatsApp Message", "normalized_message_id"):
+        return
+
+    # Batched so large message logs are not rewritten in one transaction; paged
+    # by name so rows whose id normalizes to nothing cannot be selected again.
+    last_name = ""
+    while True:
+        rows = frappe.get_all(
+            "WhatsApp Message",
+            filters={
+                "name": (">", last_name),
+                "normalized_message_id": ("is", "not set"),
+                "message_id": ("is", "set"),
+            },
+            fields=["name", "message_id"],
+            order_by="name asc",
+            limit_page_length=BATCH_SIZE,
+        )
+        if not rows:
+            break
+
+        for row in rows:
+            normalized = normalize_message_id(row.message_id)
+            if normalized:
+                frappe.db.set_value(
+                    "WhatsApp Message",
+                    row.name,
+                    "normalized_message_id",
+                    normalized,
+                    update_modified=False,
+                )
+        frappe.db.commit()
+
+        last_name = rows[-1].name
+        if len(rows) < BATCH_SIZE:
+            break
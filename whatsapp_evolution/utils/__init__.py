@@ -1,8 +1,28 @@
 """Run on each event."""
+import time
+
 import frappe
 
 from frappe.core.doctype.server_script.server_script_utils import EVENT_MAP
 
+from whatsapp_evolution.utils.deferred import defer
+
+
+NOTIFICATION_MAP_KEY = "whatsapp_notification_map"
+NOTIFICATION_MAP_VERSION_KEY = "whatsapp_notification_map_version"
+# Settings kept on each map entry so dispatching a doc event needs no query.
+# The send job loads the notification itself, so only what dispatch reads is kept.
+NOTIFICATION_MAP_FIELDS = (
+    "modified",
+    "delay_seconds",
+    "condition",
+)
+# How long a worker trusts its local dispatch table before re-checking the version.
+DISPATCH_CHECK_INTERVAL = 10
+
+# site -> {"version", "checked_at", "table"}; lives for the worker process.
+_dispatch_tables = {}
+
 
 def run_server_script_for_doc_event(doc, event):
     """Run on each event."""
@@ -18,32 +38,33 @@ def run_server_script_for_doc_event(doc, event):
     if frappe.flags.in_uninstall:
         return
 
-    notification = get_notifications_map().get(
+    notification = get_dispatch_table().get(
         doc.doctype, {}
     ).get(EVENT_MAP[event], None)
 
     if notification:
+        doc_data = None
         # run all scripts for this doctype + event
-        for notification_name in notification:
+        for entry in notification:
+            notification_name = entry.name
             try:
                 if event in ("after_insert", "on_update", "on_submit", "on_cancel", "on_update_after_submit"):
-                    delay_seconds = frappe.db.get_value(
-                        "WhatsApp Notification",
-                        notification_name,
-                        "delay_seconds",
-                    ) or 0
-                    frappe.enqueue(
+                    if entry.condition:
+                        doc_data = doc_data or doc.as_dict()
+                        if not _condition_passes(entry, doc_data):
+                            continue
+                    # The job evaluates the condition again against the committed document.
+                    defer(
                         "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.send_template_message_job",
+                        delay=entry.delay_seconds,
                         queue="short",
-                        enqueue_after_commit=True,
                         notification_name=notification_name,
                         reference_doctype=doc.doctype,
                         reference_name=doc.name,
                         ignore_condition=False,
-                        delay_seconds=frappe.utils.cint(delay_seconds),
                     )
                 else:
-                    frappe.get_doc(
+                    frappe.get_cached_doc(
                         "WhatsApp Notification",
                         notification_name
                     ).send_template_message(doc)
@@ -53,19 +74,60 @@ def run_server_script_for_doc_event(doc, event):
                 )
 
 
+def _condition_passes(entry, doc_data):
+    """Pre-enqueue condition check; on errors the job runs and logs them."""
+    from whatsapp_evolution.utils.conditions import evaluate
+
+    try:
+        return bool(evaluate(entry.condition, doc_data, owner=entry))
+    except Exception:
+        return True
+
+
+def get_dispatch_table():
+    """Process-local copy of ``get_notifications_map`` for the ``*`` doc event hook.
+
+    Saves on doctypes without notifications are answered from memory; Redis is
+    consulted at most every ``DISPATCH_CHECK_INTERVAL`` seconds to compare the
+    map's version stamp.
+    """
+    site = getattr(frappe.local, "site", None)
+    entry = _dispatch_tables.get(site)
+    now = time.monotonic()
+    if entry and now - entry["checked_at"] < DISPATCH_CHECK_INTERVAL:
+        return entry["table"]
+
+    version = frappe.cache().get_value(NOTIFICATION_MAP_VERSION_KEY)
+    if entry and version == entry["version"]:
+        entry["checked_at"] = now
+        return entry["table"]
+
+    table = get_notifications_map()
+    # Read the version first: a change made while the map loads bumps it again.
+    _dispatch_tables[site] = {"version": version, "checked_at": now, "table": table}
+    return table
+
+
+def clear_notifications_map():
+    """Drop the cached map and bump its version so every worker reloads it."""
+    frappe.cache().delete_value(NOTIFICATION_MAP_KEY)
+    frappe.cache().set_value(NOTIFICATION_MAP_VERSION_KEY, frappe.generate_hash(length=10))
+    _dispatch_tables.pop(getattr(frappe.local, "site", None), None)
+
+
 def get_notifications_map():
     """Get mapping."""
     if frappe.flags.in_patch and not frappe.db.table_exists("WhatsApp Notification"):
         return {}
 
-    cached_map = frappe.cache().get_value("whatsapp_notification_map")
+    cached_map = frappe.cache().get_value(NOTIFICATION_MAP_KEY)
     if cached_map is not None:
         return cached_map
 
     notification_map = {}
     enabled_whatsapp_notifications = frappe.get_all(
         "WhatsApp Notification",
-        fields=("name", "reference_doctype", "doctype_event", "notification_type"),
+        fields=("name", "reference_doctype", "doctype_event", "notification_type", *NOTIFICATION_MAP_FIELDS),
         filters={"disabled": 0},
     )
     for notification in enabled_whatsapp_notifications:
@@ -74,9 +136,15 @@ def get_notifications_map():
                 notification.reference_doctype, {}
             ).setdefault(
                 notification.doctype_event, []
-            ).append(notification.name)
+            ).append(
+                frappe._dict(
+                    {fieldname: notification.get(fieldname) for fieldname in NOTIFICATION_MAP_FIELDS},
+                    name=notification.name,
+                    delay_seconds=frappe.utils.cint(notification.delay_seconds),
+                )
+            )
 
-    frappe.cache().set_value("whatsapp_notification_map", notification_map)
+    frappe.cache().set_value(NOTIFICATION_MAP_KEY, notification_map)
 
     return notification_map
 
@@ -265,6 +333,11 @@ def get_evolution_settings(whatsapp_account=None):
         "evolution_instance": instance,
         "evolution_send_endpoint": send_endpoint,
         "whatsapp_account": account_doc.name if account_doc else None,
+        "http_pool_size": settings_doc.get("http_pool_size"),
+        "http_idle_timeout": settings_doc.get("http_idle_timeout"),
+        "rate_limit_per_minute": account_doc.get("rate_limit_per_minute") if account_doc else 0,
+        "rate_limit_burst": account_doc.get("rate_limit_burst") if account_doc else 0,
+        "max_concurrent_sends": account_doc.get("max_concurrent_sends") if account_doc else 1,
     }
 
 
@@ -287,6 +360,20 @@ def format_number(number):
     return number
 
 
+def normalize_message_id(message_id):
+    """Return the provider message id without the Meta ``wamid.`` prefix."""
+    message_id = (message_id or "").strip()
+    if message_id.startswith("wamid."):
+        message_id = message_id[len("wamid."):]
+    return message_id
+
+
+def phone_suffix(number, length=10):
+    """Return the last ``length`` digits of ``number``, ignoring country code and formatting."""
+    digits = "".join(ch for ch in str(number or "") if ch.isdigit())
+    return digits[-length:]
+
+
 def cleanup_legacy_rq_jobs(needle="frappe_whatsapp"):
     """Delete stale RQ jobs that reference removed python module paths.
 
@@ -0,0 +1,78 @@
+"""Guarded sends of one or more messages through an Evolution instance.
+
+Every send path goes through ``send_many`` so the instance health check,
+the idempotency claim and the rate-limit token are applied the same way.
+The guards run on the calling thread, in item order; only the HTTP requests
+run concurrently, capped per instance by ``EvolutionProvider.send_many``.
+"""
+
+from whatsapp_evolution.utils import idempotency, instance_health, rate_limit
+from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
+
+
+def send_many(settings, items, concurrency=None):
+    """Send ``items`` through the instance in ``settings``; return one result per item, in order.
+
+    Items are ``EvolutionProvider.send_many`` items, plus optionally either
+    ``idempotency_parts`` to claim here or an ``idempotency_key`` the caller
+    already holds. Results are ``{"ok": True, "response": ...}`` or
+    ``{"ok": False, "error": ..., "exception": ...}``, each with the item's
+    ``idempotency_key``; duplicates come back as ``{"ok": False, "skipped": True}``,
+    and every item fails with ``instance_down`` when the health poller last saw
+    the instance down. Once the rate limiter refuses a token, that item and
+    every later one come back with ``rate_limited`` and ``retry_after`` and are
+    not sent. Claims made here are released for every item that was not sent.
+    """
+    from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider
+
+    items = list(items or [])
+    if not items:
+        return []
+
+    try:
+        instance_health.ensure_not_down(settings.get("whatsapp_account"))
+    except Exception as e:
+        return [{"ok": False, "instance_down": True, "error": str(e), "exception": e} for _ in items]
+
+    results = [None] * len(items)
+    ready = []
+    limited = None
+    for index, item in enumerate(items):
+        item = dict(item)
+        parts = item.pop("idempotency_parts", None)
+        key = item.pop("idempotency_key", None)
+        if limited is None:
+            claimed = False
+            if parts and not key:
+                key = idempotency.claim(*parts)
+                if not key:
+                    results[index] = {"ok": False, "skipped": True, "idempotency_key": None}
+                    continue
+                claimed = True
+            try:
+                rate_limit.acquire(settings)
+            except WhatsAppRateLimited as e:
+                limited = e
+                if claimed:
+                    idempotency.release(key)
+                    key = None
+            else:
+                ready.append((index, key, claimed, item))
+                continue
+        results[index] = {
+            "ok": False,
+            "rate_limited": True,
+            "retry_after": limited.retry_after,
+            "error": str(limited),
+            "exception": limited,
+            "idempotency_key": key,
+        }
+
+    sent = EvolutionProvider(settings).send_many([item for *_, item in ready], concurrency=concurrency)
+    for (index, key, claimed, _item), result in zip(ready, sent):
+        if not result["ok"] and claimed:
+            idempotency.release(key)
+            key = None
+        result["idempotency_key"] = key
+        results[index] = result
+    return results
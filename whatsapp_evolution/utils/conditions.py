@@ -0,0 +1,86 @@
+"""Process-local cache of compiled WhatsApp Notification conditions.
+
+Evaluation matches ``frappe.safe_eval``: the same syntax checks, restricted
+compiler policy and globals. Code objects are cached per notification and
+its ``modified`` timestamp, so editing a notification recompiles its
+conditions; the safe globals are built once per request or job.
+"""
+
+import unicodedata
+
+import frappe
+from frappe.utils.safe_exec import get_safe_globals
+
+try:
+    from RestrictedPython import compile_restricted_eval
+    from frappe.utils.safe_exec import (
+        WHITELISTED_SAFE_EVAL_GLOBALS,
+        FrappeTransformer,
+        _validate_safe_eval_syntax,
+    )
+except ImportError:
+    # Older Frappe releases: fall back to frappe.safe_eval, uncached.
+    compile_restricted_eval = None
+
+# Bounds the number of cached owners (notifications plus ad-hoc expressions).
+MAX_CACHED = 512
+
+# (owner name, owner modified) -> {expression: code}
+_compiled = {}
+
+
+def _compile(expression):
+    normalized = unicodedata.normalize("NFKC", expression)
+    _validate_safe_eval_syntax(normalized)
+    result = compile_restricted_eval(normalized, filename="<safe_eval>", policy=FrappeTransformer)
+    if result.errors:
+        raise SyntaxError("; ".join(result.errors))
+    return result.code
+
+
+def _owner_key(owner):
+    if owner is None:
+        return None, None
+    return owner.name, str(owner.modified)
+
+
+def compile_condition(expression, owner=None):
+    """Return the restricted code object for ``expression``, compiling it once.
+
+    ``owner`` is the notification (or its cached map entry) the expression
+    belongs to; its name and ``modified`` key the cache.
+    """
+    key = _owner_key(owner)
+    codes = _compiled.get(key)
+    if codes is None:
+        if len(_compiled) >= MAX_CACHED:
+            _compiled.clear()
+        if key[0] is not None:
+            # A newer ``modified`` replaces the owner's previous entry.
+            for stale in [k for k in _compiled if k[0] == key[0]]:
+                del _compiled[stale]
+        codes = _compiled[key] = {}
+
+    code = codes.get(expression)
+    if code is None:
+        code = codes[expression] = _compile(expression)
+    return code
+
+
+def _eval_globals():
+    eval_globals = getattr(frappe.local, "whatsapp_condition_globals", None)
+    if eval_globals is None:
+        # get_safe_globals() reflects the session user, so reuse stays within one request or job.
+        eval_globals = get_safe_globals()
+        eval_globals["__builtins__"] = {}
+        eval_globals.update(WHITELISTED_SAFE_EVAL_GLOBALS)
+        frappe.local.whatsapp_condition_globals = eval_globals
+    return eval_globals
+
+
+def evaluate(expression, doc_data, owner=None):
+    """Evaluate ``expression`` with ``doc`` bound to ``doc_data``."""
+    if compile_restricted_eval is None:
+        return frappe.safe_eval(expression, get_safe_globals(), {"doc": doc_data})
+
+    return eval(compile_condition(expression, owner), _eval_globals(), {"doc": doc_data})
@@ -0,0 +1,120 @@
+"""Bulk lookup of Contact phone rows for many Contacts and linked documents.
+
+A join over ``tabDynamic Link``, ``tabContact`` and ``tabContact Phone``
+returns every phone row (with its purpose and primary flags) for any number
+of ``(link_doctype, link_name)`` pairs, one ``link_name in (...)`` query per
+DocType and chunk, so callers no longer load each Contact with ``get_doc``.
+Which rows count as numbers is left to the caller.
+"""
+
+import frappe
+
+
+PRIMARY_PHONE_FLAGS = ("is_primary_mobile_no", "is_primary_mobile", "is_primary_phone", "is_primary")
+# Link names per query; larger lists are split across several queries.
+CHUNK_SIZE = 500
+# Checkbox fields used when no purpose-specific field is found by name.
+DEFAULT_TICK_FIELDS = {
+    "whatsapp": ("is_whatsapp_number", "is_whatsapp", "whatsapp"),
+    "notification": ("is_notification_number", "is_notification", "notification"),
+}
+
+
+def get_tick_fields(purpose="notification"):
+    """
+    Find fields in Contact Phone that match the requested purpose.
+    purpose='notification' -> fields containing 'notification'
+    purpose='whatsapp' -> fields containing 'whatsapp'
+    """
+    meta = frappe.get_meta("Contact Phone")
+    search_term = purpose.lower()
+    tick_fields = [
+        field.fieldname
+        for field in meta.fields
+        if field.fieldtype == "Check" and search_term in field.fieldname.lower()
+    ]
+
+    # Fallbacks for standard naming
+    for default_field in DEFAULT_TICK_FIELDS.get(purpose, ()):
+        if meta.get_field(default_field) and default_field not in tick_fields:
+            tick_fields.append(default_field)
+
+    return tick_fields
+
+
+def get_phone_rows(links=(), tick_fields=()):
+    """Return ``{(link_doctype, link_name): [row, ...]}`` with one query per DocType and chunk.
+
+    A ``("Contact", name)`` pair selects that Contact itself; any other pair
+    selects the Contacts linked to the document through Dynamic Link. Each
+    row carries ``contact``, ``phone``, ``ticked`` (any of ``tick_fields``
+    set), ``is_primary`` and the Contact's own ``mobile_no``/``phone`` as
+    ``contact_mobile_no``/``contact_phone``. Contacts without phone rows
+    yield one row with ``phone`` unset. Rows are ordered by Contact, then
+    by row index.
+    """
+    links = list(dict.fromkeys((dt, name) for dt, name in links if dt and name))
+    if not links:
+        return {}
+
+    meta = frappe.get_meta("Contact Phone")
+    tick_fields = [field for field in tick_fields if meta.get_field(field)]
+    primary_flags = [flag for flag in PRIMARY_PHONE_FLAGS if meta.get_field(flag)]
+
+    ticked = " or ".join(f"ifnull(cp.`{field}`, 0) = 1" for field in tick_fields) or "0 = 1"
+    primary = " or ".join(f"ifnull(cp.`{flag}`, 0) = 1" for flag in primary_flags) or "0 = 1"
+    columns = f"""
+            c.name as contact,
+            c.mobile_no as contact_mobile_no,
+            c.phone as contact_phone,
+            cp.phone,
+            cp.idx,
+            ({ticked}) as ticked,
+            ({primary}) as is_primary"""
+
+    names_by_doctype = {}
+    for link_doctype, link_name in links:
+        names_by_doctype.setdefault(link_doctype, []).append(link_name)
+
+    rows = []
+    for link_doctype, names in names_by_doctype.items():
+        for start in range(0, len(names), CHUNK_SIZE):
+            rows.extend(_fetch_rows(link_doctype, names[start : start + CHUNK_SIZE], columns))
+
+    rows.sort(key=lambda row: (row.link_doctype, row.link_name, row.contact, row.idx or 0))
+    grouped = {}
+    for row in rows:
+        row.ticked = bool(frappe.utils.cint(row.ticked))
+        row.is_primary = bool(frappe.utils.cint(row.is_primary))
+        grouped.setdefault((row.link_doctype, row.link_name), []).append(row)
+    return grouped
+
+
+def _fetch_rows(link_doctype, link_names, columns):
+    if link_doctype == "Contact":
+        return frappe.db.sql(
+            f"""
+            select 'Contact' as link_doctype, c.name as link_name, {columns}
+            from `tabContact` c
+            left join `tabContact Phone` cp
+                on cp.parent = c.name and cp.parenttype = 'Contact'
+            where c.name in %(link_names)s
+            """,
+            {"link_names": tuple(link_names)},
+            as_dict=True,
+        )
+
+    return frappe.db.sql(
+        f"""
+        select dl.link_doctype, dl.link_name, {columns}
+        from `tabDynamic Link` dl
+        inner join `tabContact` c on c.name = dl.parent
+        left join `tabContact Phone` cp
+            on cp.parent = c.name and cp.parenttype = 'Contact'
+        where dl.parenttype = 'Contact'
+            and dl.link_doctype = %(link_doctype)s
+            and dl.link_name in %(link_names)s
+        """,
+        {"link_doctype": link_doctype, "link_names": tuple(link_names)},
+        as_dict=True,
+    )
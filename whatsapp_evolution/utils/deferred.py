@@ -0,0 +1,75 @@
+"""Run background jobs later without holding a worker in ``sleep``.
+
+Deferred jobs wait in a Redis sorted set scored by their due time; the
+per-minute scheduler tick moves due entries onto the regular RQ queues.
+"""
+
+import json
+import time
+
+import frappe
+
+
+DEFERRED_JOBS_KEY = "whatsapp_deferred_jobs"
+# Upper bound on jobs moved to RQ per scheduler tick.
+BATCH_SIZE = 500
+
+
+def defer(method, delay=0, queue="short", timeout=None, **kwargs):
+    """Enqueue ``method`` with ``kwargs`` once ``delay`` seconds have passed.
+
+    Jobs run on the first scheduler tick after they become due, so delays are
+    honoured with minute granularity. ``kwargs`` must be JSON serialisable.
+    Nothing is scheduled unless the current transaction commits.
+    """
+    if not delay or delay <= 0:
+        frappe.enqueue(method, queue=queue, timeout=timeout, enqueue_after_commit=True, **kwargs)
+        return
+
+    payload = json.dumps(
+        {
+            "id": frappe.generate_hash(length=12),
+            "method": method,
+            "queue": queue,
+            "timeout": timeout,
+            "kwargs": kwargs,
+        },
+        default=str,
+    )
+
+    def _schedule():
+        cache = frappe.cache()
+        cache.zadd(cache.make_key(DEFERRED_JOBS_KEY), {payload: time.time() + delay})
+
+    frappe.db.after_commit.add(_schedule)
+
+
+def enqueue_due_jobs():
+    """Move due deferred jobs onto their RQ queues (scheduled every minute)."""
+    cache = frappe.cache()
+    key = cache.make_key(DEFERRED_JOBS_KEY)
+    for raw in cache.zrangebyscore(key, "-inf", time.time(), start=0, num=BATCH_SIZE):
+        # ZREM succeeds for exactly one caller, so overlapping ticks never double-enqueue.
+        if not cache.zrem(key, raw):
+            continue
+        job = json.loads(raw)
+        frappe.enqueue(
+            job["method"],
+            queue=job.get("queue") or "short",
+            timeout=job.get("timeout"),
+            **(job.get("kwargs") or {}),
+        )
+
+
+def defer_doc_method(doctype, name, method, delay=0, queue="short", timeout=None, **kwargs):
+    """Deferred counterpart of ``frappe.enqueue_doc``."""
+    defer(
+        "frappe.utils.background_jobs.run_doc_method",
+        delay=delay,
+        queue=queue,
+        timeout=timeout,
+        doctype=doctype,
+        name=name,
+        doc_method=method,
+        **kwargs,
+    )
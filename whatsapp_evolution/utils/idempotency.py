@@ -0,0 +1,58 @@
+"""Idempotency ledger shared by every outgoing WhatsApp send path."""
+
+import hashlib
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+
+DEFAULT_TTL = 120
+
+
+def fingerprint(*parts):
+    """Return a compact, fixed-length key for the identifying ``parts`` of a send."""
+    raw = "\x1f".join(str(part or "") for part in parts)
+    return hashlib.sha1(raw.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _cache_key(key):
+    return frappe.cache().make_key(f"wa_idem:{key}")
+
+
+def claim(*parts, ttl=DEFAULT_TTL):
+    """Atomically claim the send identified by ``parts``.
+
+    Returns the fingerprint when this caller owns the send, or ``None`` when the
+    same send was already claimed within ``ttl`` seconds. The claim is a single
+    Redis ``SET NX EX``; only when Redis is unavailable is it checked against
+    ``WhatsApp Message.idempotency_key`` instead.
+    """
+    key = fingerprint(*parts)
+    try:
+        claimed = frappe.cache().set(_cache_key(key), 1, nx=True, ex=max(int(ttl), 1))
+    except Exception:
+        return None if _recorded(key, ttl) else key
+    return key if claimed else None
+
+
+def release(key):
+    """Give up a claim so the same send can be retried (e.g. after a rate limit)."""
+    if not key:
+        return
+    try:
+        frappe.cache().delete(_cache_key(key))
+    except Exception:
+        pass
+
+
+def _recorded(key, ttl):
+    return bool(
+        frappe.db.exists(
+            "WhatsApp Message",
+            {
+                "idempotency_key": key,
+                "creation": (">=", add_to_date(now_datetime(), seconds=-int(ttl))),
+                "status": ("not in", ("Failed", "Skipped")),
+            },
+        )
+    )
@@ -0,0 +1,101 @@
+"""Cached Evolution instance connection state, refreshed by a scheduled poller."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+from frappe import _
+
+from whatsapp_evolution.whatsapp_evolution.providers.exceptions import EvolutionTransientError
+
+# Entries outlive a few missed poller runs, then expire so stale state is never trusted.
+HEALTH_TTL = 10 * 60
+MAX_WORKERS = 8
+
+
+def _cache_key(account_name):
+    return f"wa_instance_health:{account_name or '__global__'}"
+
+
+def get_health(account_name):
+    """Return the last polled state for ``account_name`` or ``None`` if unknown."""
+    try:
+        return frappe.cache().get_value(_cache_key(account_name))
+    except Exception:
+        return None
+
+
+def is_known_down(account_name):
+    health = get_health(account_name)
+    return bool(health) and health.get("status") in ("disconnected", "error")
+
+
+def ensure_not_down(account_name):
+    """Fail fast when the poller last saw this account's instance disconnected."""
+    health = get_health(account_name)
+    if health and health.get("status") in ("disconnected", "error"):
+        frappe.throw(
+            _("Evolution instance '{0}' is {1} (checked {2}s ago): {3}").format(
+                health.get("instance") or "-",
+                health.get("status"),
+                int(time.time() - (health.get("checked_at") or time.time())),
+                health.get("message") or "",
+            ),
+            exc=EvolutionTransientError,
+        )
+
+
+def _probe(provider):
+    started = time.monotonic()
+    try:
+        result = provider.test_connection()
+    except Exception as e:
+        result = {"ok": False, "status": "error", "message": str(e)}
+    result["latency_ms"] = int((time.monotonic() - started) * 1000)
+    return result
+
+
+def check_accounts(account_names):
+    """Probe the Evolution instance of each account concurrently and cache the results.
+
+    Settings are resolved on the calling thread (they need the database); only
+    the HTTP probes run in the thread pool.
+    """
+    from whatsapp_evolution.utils import get_evolution_settings
+    from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider
+
+    targets = []
+    for account_name in account_names:
+        settings = get_evolution_settings(account_name)
+        targets.append((account_name, settings, EvolutionProvider(settings)))
+    if not targets:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(targets))) as pool:
+        probes = list(pool.map(lambda target: _probe(target[2]), targets))
+
+    results = []
+    cache = frappe.cache()
+    for (account_name, settings, _provider), result in zip(targets, probes):
+        result.pop("data", None)
+        result.update(
+            {
+                "account": account_name,
+                "instance": settings.get("evolution_instance"),
+                "checked_at": time.time(),
+            }
+        )
+        cache.set_value(_cache_key(account_name), result, expires_in_sec=HEALTH_TTL)
+        results.append(result)
+    return results
+
+
+def poll_instance_health():
+    """Scheduled job: refresh cached connection state of all active accounts."""
+    accounts = frappe.get_all(
+        "WhatsApp Account",
+        filters={"status": "Active"},
+        pluck="name",
+        order_by="is_default desc, modified desc",
+    )
+    check_accounts(accounts)
@@ -0,0 +1,171 @@
+"""Batched status reconciliation for outgoing WhatsApp Messages."""
+
+import json
+
+import frappe
+
+from whatsapp_evolution.utils import normalize_message_id
+
+
+# Failed shares Delivered's rank: a late failure report must not undo a delivery.
+STATUS_RANK = {
+    "success": 1,
+    "sent": 2,
+    "failed": 3,
+    "delivered": 3,
+    "read": 4,
+    "played": 5,
+}
+# Written whenever the stored value is empty, whatever the receipt's rank.
+FILL_IF_EMPTY = ("conversation_id",)
+# Receipts can beat the send job's commit; they wait this long for the message id.
+PENDING_ACK_TTL = 15 * 60
+
+_RANK_SQL = (
+    "CASE LOWER(COALESCE(`status`, ''))"
+    + "".join(f" WHEN '{status}' THEN {rank}" for status, rank in STATUS_RANK.items())
+    + " ELSE 0 END"
+)
+
+
+def find_messages_by_ids(message_ids):
+    """Return ``{normalized_message_id: row}`` for the given provider ids in one query."""
+    normalized = {normalize_message_id(message_id) for message_id in message_ids or []}
+    normalized.discard("")
+    if not normalized:
+        return {}
+
+    rows = frappe.get_all(
+        "WhatsApp Message",
+        filters={"normalized_message_id": ("in", sorted(normalized))},
+        fields=["name", "status", "normalized_message_id"],
+        order_by="modified asc",
+    )
+    # Oldest first, so the most recently modified duplicate wins.
+    return {row.normalized_message_id: row for row in rows}
+
+
+def status_rank(status):
+    """Rank of a delivery status; a message only ever moves to a higher rank."""
+    return STATUS_RANK.get((status or "").strip().lower(), 0)
+
+
+def add_status_update(updates, name, status, **values):
+    """Coalesce a receipt into ``updates`` (``{docname: values}``).
+
+    Only receipts within one batch are merged: those for the same message
+    collapse into one write carrying the highest-ranked status and any extra
+    non-empty values seen. Ordering across batches is left to the
+    ``_RANK_SQL`` guard in ``apply_status_updates``.
+    """
+    current = updates.setdefault(name, {"status": status})
+    if status_rank(status) >= status_rank(current["status"]):
+        current["status"] = status
+    current.update({key: value for key, value in values.items() if value})
+
+
+def apply_status_updates(updates):
+    """Write ``{docname: values}`` with one conditional UPDATE per distinct set of values.
+
+    Rows whose stored status already ranks at or above the new one are left
+    untouched, so concurrent or out-of-order receipts can never regress a
+    message. ``FILL_IF_EMPTY`` columns are written separately, to any row
+    where they are still empty.
+    """
+    groups = {}
+    fills = {}
+    for name, values in (updates or {}).items():
+        values = dict(values)
+        for column in FILL_IF_EMPTY:
+            if values.get(column):
+                fills.setdefault((column, values.pop(column)), []).append(name)
+            else:
+                values.pop(column, None)
+        groups.setdefault(tuple(sorted(values.items())), []).append(name)
+
+    for values, names in groups.items():
+        values = dict(values)
+        status = values.pop("status")
+        assignments = "".join(f", `{column}` = %({column})s" for column in values)
+        frappe.db.sql(
+            f"""
+            UPDATE `tabWhatsApp Message`
+            SET `status` = %(status)s, `modified` = %(modified)s{assignments}
+            WHERE `name` IN %(names)s AND {_RANK_SQL} < %(rank)s
+            """,
+            {
+                **values,
+                "status": status,
+                "modified": frappe.utils.now(),
+                "names": tuple(names),
+                "rank": status_rank(status),
+            },
+        )
+
+    for (column, value), names in fills.items():
+        frappe.db.sql(
+            f"""
+            UPDATE `tabWhatsApp Message`
+            SET `{column}` = %(value)s
+            WHERE `name` IN %(names)s AND IFNULL(`{column}`, '') = ''
+            """,
+            {"value": value, "names": tuple(names)},
+        )
+
+
+def _pending_ack_key(message_id):
+    cache = frappe.cache()
+    return cache, cache.make_key(f"wa_pending_ack:{normalize_message_id(message_id)}")
+
+
+def buffer_pending_acks(receipts):
+    """Hold receipts for messages whose id is not persisted yet.
+
+    ``receipts`` is a list of ``(message_id, status, values)``. Ids that
+    became visible since the caller's lookup are applied straight away, so a
+    receipt racing the send job's commit is never stranded.
+    """
+    receipts = [receipt for receipt in receipts if normalize_message_id(receipt[0])]
+    if not receipts:
+        return
+
+    for message_id, status, values in receipts:
+        cache, key = _pending_ack_key(message_id)
+        pipe = cache.pipeline()
+        pipe.rpush(key, json.dumps({**values, "status": status}))
+        pipe.expire(key, PENDING_ACK_TTL)
+        pipe.execute()
+
+    for message_id, row in find_messages_by_ids(receipt[0] for receipt in receipts).items():
+        apply_pending_acks(row.name, message_id)
+
+
+def apply_pending_acks(name, message_id):
+    """Apply and clear receipts buffered for ``message_id`` on message ``name``."""
+    if not normalize_message_id(message_id):
+        return False
+
+    cache, key = _pending_ack_key(message_id)
+    pipe = cache.pipeline()
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    raw_receipts, _ = pipe.execute()
+
+    updates = {}
+    for raw in raw_receipts:
+        receipt = json.loads(raw)
+        add_status_update(updates, name, receipt.pop("status"), **receipt)
+    apply_status_updates(updates)
+    return bool(updates)
+
+
+def apply_pending_acks_after_commit(name, message_id):
+    """Apply buffered receipts once the transaction storing ``message_id`` commits."""
+    if not normalize_message_id(message_id):
+        return
+
+    def _apply():
+        if apply_pending_acks(name, message_id):
+            frappe.db.commit()
+
+    frappe.db.after_commit.add(_apply)
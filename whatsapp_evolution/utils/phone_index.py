@@ -0,0 +1,205 @@
+"""Reverse index from phone number suffix to the Contact or party that owns it.
+
+Each suffix maps to a Redis hash of ``"{doctype}::{name}" -> priority``, kept
+current by Contact and party doc events, so attributing an incoming message
+is one HGETALL. A per-document set remembers which suffixes the document was
+indexed under, so a changed or deleted number is unindexed without a scan.
+
+The index lives in the LRU-evicted cache, so a missing entry only means
+"unknown": ``resolve`` falls back to a scan, re-indexes what the scan finds
+and schedules a rebuild, and remembers numbers that really have no owner
+for a short while.
+"""
+
+import frappe
+
+from whatsapp_evolution.utils import phone_suffix
+
+
+INDEX_KEY = "wa_phone_index"
+REFS_KEY = "wa_phone_index_refs"
+BUILT_KEY = "wa_phone_index_built"
+REBUILD_LOCK_KEY = "wa_phone_index_rebuilding"
+REBUILD_LOCK_TTL = 10 * 60
+MISS_KEY = "wa_phone_index_miss"
+MISS_TTL = 10 * 60
+BATCH_SIZE = 5000
+
+# Lower wins; matches the order incoming messages were attributed in before.
+CONTACT_PRIORITY = 0
+PARTY_PRIORITIES = {"Customer": 1, "Lead": 2, "Supplier": 3, "Employee": 4}
+
+
+def _key(*parts):
+    return frappe.cache().make_key(":".join(parts))
+
+
+def _member(doctype, name):
+    return f"{doctype}::{name}"
+
+
+def _priority(doctype):
+    return CONTACT_PRIORITY if doctype == "Contact" else PARTY_PRIORITIES.get(doctype)
+
+
+def _doc_suffixes(doc):
+    if doc.doctype == "Contact":
+        numbers = [
+            row.phone
+            for row in doc.get("phone_nos") or []
+            if row.get("is_whatsapp_number") and row.get("is_primary_mobile_no")
+        ]
+    else:
+        numbers = [doc.get("mobile_no")]
+    return {suffix for suffix in map(phone_suffix, numbers) if suffix}
+
+
+def _index(pipe, doctype, name, suffixes):
+    refs_key = _key(REFS_KEY, doctype, name)
+    for suffix in suffixes:
+        pipe.hset(_key(INDEX_KEY, suffix), _member(doctype, name), _priority(doctype))
+        pipe.sadd(refs_key, suffix)
+        pipe.delete(_key(MISS_KEY, suffix))
+
+
+def _unindex(doctype, name):
+    cache = frappe.cache()
+    refs_key = _key(REFS_KEY, doctype, name)
+    pipe = cache.pipeline()
+    for suffix in cache.smembers(refs_key):
+        pipe.hdel(_key(INDEX_KEY, frappe.safe_decode(suffix)), _member(doctype, name))
+    pipe.delete(refs_key)
+    return pipe
+
+
+def update_doc(doc, method=None):
+    """Re-index ``doc`` under its current numbers (Contact/party ``on_update``)."""
+    pipe = _unindex(doc.doctype, doc.name)
+    _index(pipe, doc.doctype, doc.name, _doc_suffixes(doc))
+    pipe.execute()
+
+
+def remove_doc(doc, method=None):
+    """Drop ``doc`` from the index (Contact/party ``on_trash``)."""
+    _unindex(doc.doctype, doc.name).execute()
+
+
+def rename_doc(doc, method=None, old_name=None, new_name=None, merge=False):
+    """Move index entries to the new name (Contact/party ``after_rename``)."""
+    if old_name:
+        _unindex(doc.doctype, old_name).execute()
+    update_doc(doc)
+
+
+def lookup(number):
+    """Return ``(doctype, name)`` for the best indexed owner of ``number`` or ``(None, None)``."""
+    suffix = phone_suffix(number)
+    if not suffix:
+        return None, None
+
+    entries = frappe.cache().hgetall(_key(INDEX_KEY, suffix))
+    if not entries:
+        return None, None
+
+    member, _ = min(
+        ((frappe.safe_decode(member), int(priority)) for member, priority in entries.items()),
+        key=lambda entry: (entry[1], entry[0]),
+    )
+    doctype, name = member.split("::", 1)
+    return doctype, name
+
+
+def resolve(number, scan):
+    """Attribute ``number`` through the index, using ``scan(number)`` when it has no entry."""
+    if not ensure_built():
+        # Index is being (re)built in the background; scan until it is ready.
+        return scan(number)
+
+    doctype, name = lookup(number)
+    if doctype:
+        return doctype, name
+
+    suffix = phone_suffix(number)
+    cache = frappe.cache()
+    if suffix and cache.exists(_key(MISS_KEY, suffix)):
+        return None, None
+
+    doctype, name = scan(number)
+    if doctype and suffix:
+        # The entry was evicted: restore it now and rebuild the rest in the background.
+        pipe = cache.pipeline()
+        _index(pipe, doctype, name, {suffix})
+        pipe.execute()
+        cache.delete(_key(BUILT_KEY))
+        ensure_built()
+    elif suffix:
+        cache.set(_key(MISS_KEY, suffix), 1, ex=MISS_TTL)
+    return doctype, name
+
+
+def is_built():
+    return bool(frappe.cache().exists(_key(BUILT_KEY)))
+
+
+def ensure_built():
+    """Return True when the index is usable; otherwise schedule one rebuild."""
+    if is_built():
+        return True
+    cache = frappe.cache()
+    if cache.set(_key(REBUILD_LOCK_KEY), 1, nx=True, ex=REBUILD_LOCK_TTL):
+        frappe.enqueue("whatsapp_evolution.utils.phone_index.rebuild", queue="long")
+    return False
+
+
+def rebuild():
+    """Rebuild the whole index from Contact Phone and party mobile numbers."""
+    cache = frappe.cache()
+    cache.delete(_key(BUILT_KEY))
+    for pattern in (INDEX_KEY, REFS_KEY, MISS_KEY):
+        cache.delete_keys(f"{pattern}:")
+
+    indexed = 0
+    for doctype, rows in _iter_sources():
+        pipe = cache.pipeline()
+        for name, number in rows:
+            suffix = phone_suffix(number)
+            if suffix:
+                _index(pipe, doctype, name, {suffix})
+                indexed += 1
+        pipe.execute()
+
+    cache.set(_key(BUILT_KEY), 1)
+    cache.delete(_key(REBUILD_LOCK_KEY))
+    return indexed
+
+
+def _iter_sources():
+    yield from _iter_batches(
+        "Contact Phone",
+        "Contact",
+        {"parenttype": "Contact", "is_whatsapp_number": 1, "is_primary_mobile_no": 1},
+        ["parent", "phone"],
+    )
+    for doctype in PARTY_PRIORITIES:
+        if frappe.db.exists("DocType", doctype):
+            yield from _iter_batches(doctype, doctype, {"mobile_no": ("is", "set")}, ["name", "mobile_no"])
+
+
+def _iter_batches(source, doctype, filters, fields):
+    start = 0
+    while True:
+        rows = frappe.get_all(
+            source,
+            filters=filters,
+            fields=fields,
+            order_by="name asc",
+            limit_start=start,
+            limit_page_length=BATCH_SIZE,
+            as_list=True,
+        )
+        if not rows:
+            return
+        yield doctype, rows
+        if len(rows) < BATCH_SIZE:
+            return
+        start += BATCH_SIZE
@@ -0,0 +1,72 @@
+"""Distributed token-bucket rate limiting for outgoing WhatsApp sends."""
+
+import hashlib
+
+import frappe
+from frappe import _
+
+
+# Tokens are refilled continuously from the Redis server clock, so every worker
+# and bench node shares one bucket per Evolution instance.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = burst
+    ts = now
+end
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    wait = math.ceil((requested - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate) + 1000)
+return {allowed, wait}
+"""
+
+
+class WhatsAppRateLimited(frappe.ValidationError):
+    def __init__(self, message=None, retry_after=1):
+        self.retry_after = max(int(retry_after or 1), 1)
+        super().__init__(
+            message
+            or _("WhatsApp send rate limit reached. Retry in {0} seconds.").format(self.retry_after)
+        )
+
+
+def get_bucket_key(settings):
+    identity = f"{(settings.get('evolution_api_base') or '').rstrip('/')}|{settings.get('evolution_instance') or ''}"
+    return f"wa_rate:{hashlib.sha1(identity.encode('utf-8')).hexdigest()}"
+
+
+def acquire(settings, tokens=1):
+    """Take ``tokens`` from the bucket of the instance in ``settings``.
+
+    Raises ``WhatsAppRateLimited`` with ``retry_after`` (seconds) instead of
+    waiting, so callers can defer the send rather than holding a worker.
+    Accounts without ``rate_limit_per_minute`` are not limited.
+    """
+    per_minute = frappe.utils.cint((settings or {}).get("rate_limit_per_minute"))
+    if per_minute <= 0:
+        return
+    burst = max(frappe.utils.cint(settings.get("rate_limit_burst")), tokens, 1)
+
+    cache = frappe.cache()
+    script = cache.register_script(TOKEN_BUCKET_SCRIPT)
+    allowed, wait_ms = script(
+        keys=[cache.make_key(get_bucket_key(settings))],
+        args=[per_minute / 60000.0, burst, tokens],
+    )
+    if not allowed:
+        raise WhatsAppRateLimited(retry_after=-(-int(wait_ms) // 1000))
@@ -0,0 +1,102 @@
+"""Cross-node mutual exclusion on Redis, a drop-in for ``frappe.utils.synchronization.filelock``.
+
+``filelock`` only serializes workers on one host. This lock is a Redis key
+taken with ``SET NX PX`` and a random token; it is released with a script
+that deletes the key only while it still holds our token, so a holder whose
+lease expired cannot release a lock another worker has since acquired.
+"""
+
+import random
+import secrets
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils.file_lock import LockTimeoutError
+from frappe.utils.synchronization import filelock
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+# Minimum lease: the upper bound on how long a crashed holder can block others.
+DEFAULT_LEASE_MS = 60 * 1000
+# Leases are at least this many times the wait timeout.
+LEASE_TIMEOUT_FACTOR = 2
+# Polling backoff while waiting, in seconds.
+MIN_WAIT = 0.01
+MAX_WAIT = 0.2
+
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _key(lock_name, is_global=False):
+    # Like filelock, a global lock is shared by every site on the bench.
+    return frappe.cache().make_key(f"wa_lock:{lock_name}", shared=is_global)
+
+
+def lease_for(timeout):
+    """Default lease for a lock waited on for ``timeout`` seconds."""
+    return max(DEFAULT_LEASE_MS, int(timeout * 1000 * LEASE_TIMEOUT_FACTOR))
+
+
+def acquire(lock_name, timeout=30, lease_ms=None, is_global=False):
+    """Wait up to ``timeout`` seconds for the lock and return its token.
+
+    Raises ``LockTimeoutError`` if the lock is still held when time runs out.
+    """
+    cache = frappe.cache()
+    key = _key(lock_name, is_global)
+    token = secrets.token_hex(16)
+    lease_ms = lease_ms or lease_for(timeout)
+    deadline = time.monotonic() + timeout
+    wait = MIN_WAIT
+    while True:
+        if cache.set(key, token, nx=True, px=int(lease_ms)):
+            return token
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LockTimeoutError(f"Failed to acquire lock: {lock_name}. Lock may be held by another process.")
+        time.sleep(min(remaining, wait * random.uniform(0.5, 1.5)))
+        wait = min(wait * 2, MAX_WAIT)
+
+
+def release(lock_name, token, is_global=False):
+    """Release the lock if ``token`` still owns it; return whether it did."""
+    return bool(frappe.cache().eval(RELEASE_SCRIPT, 1, _key(lock_name, is_global), token))
+
+
+@contextmanager
+def redis_lock(lock_name, timeout=30, is_global=False, lease_ms=None):
+    """Hold ``lock_name`` across all nodes sharing the Redis cache.
+
+    Same call and timeout semantics as ``filelock``: the lock is per site
+    unless ``is_global`` is set, and is always shared by every node. When
+    Redis cannot be reached the host-local ``filelock`` is used instead.
+
+    The critical section must finish within the lease (``lease_ms``, by
+    default ``lease_for(timeout)``): after that another worker may take the
+    lock. An overrun is logged when the lock is released.
+    """
+    try:
+        token = acquire(lock_name, timeout=timeout, lease_ms=lease_ms, is_global=is_global)
+    except RedisConnectionError:
+        with filelock(lock_name, timeout=timeout, is_global=is_global):
+            yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            released = release(lock_name, token, is_global)
+        except RedisConnectionError:
+            # The lease expires on its own.
+            released = True
+        if not released:
+            frappe.log_error(
+                title="WhatsApp lock lease expired",
+                message=f"Lock {lock_name} was held longer than its lease; another worker may have taken it.",
+            )
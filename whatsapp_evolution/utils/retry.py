@@ -0,0 +1,42 @@
+"""Exponential-backoff retries for transient send failures."""
+
+import random
+
+import frappe
+import requests
+
+from whatsapp_evolution.utils.deferred import defer
+from whatsapp_evolution.whatsapp_evolution.providers.exceptions import EvolutionTransientError
+
+
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 60
+MAX_DELAY = 60 * 60
+
+
+def is_transient(exc):
+    return isinstance(exc, (EvolutionTransientError, requests.ConnectionError, requests.Timeout))
+
+
+def get_max_attempts():
+    value = frappe.db.get_single_value("WhatsApp Settings", "max_send_attempts")
+    return DEFAULT_MAX_ATTEMPTS if value is None else frappe.utils.cint(value)
+
+
+def backoff_delay(attempt):
+    """Seconds to wait before ``attempt + 1``: doubling per attempt, capped, with jitter."""
+    ceiling = min(MAX_DELAY, BASE_DELAY * 2 ** max(int(attempt) - 1, 0))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def schedule_retry(method, exc, attempt=1, **kwargs):
+    """Defer another attempt of ``method`` when ``exc`` is transient and attempts remain.
+
+    Returns ``True`` when a retry was scheduled; the next call receives
+    ``attempt + 1`` alongside ``kwargs``.
+    """
+    attempt = frappe.utils.cint(attempt) or 1
+    if not is_transient(exc) or attempt >= get_max_attempts():
+        return False
+    defer(method, delay=backoff_delay(attempt), attempt=attempt + 1, **kwargs)
+    return True
@@ -0,0 +1,52 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import batch_send, idempotency, rate_limit
+
+
+class TestBatchSend(IntegrationTestCase):
+    """Tests for the guarded batch send path."""
+
+    def setUp(self):
+        self.settings = {
+            "evolution_api_base": "https://evo.example.com",
+            "evolution_instance": "batch-test",
+            "rate_limit_per_minute": 1,
+            "rate_limit_burst": 1,
+        }
+        cache = frappe.cache()
+        cache.delete(cache.make_key(rate_limit.get_bucket_key(self.settings)))
+        self.first = ("Test Batch Send", "919900120001", frappe.generate_hash(length=8))
+        self.second = ("Test Batch Send", "919900120002", frappe.generate_hash(length=8))
+
+    def tearDown(self):
+        for parts in (self.first, self.second):
+            idempotency.release(idempotency.fingerprint(*parts))
+
+    @patch("whatsapp_evolution.whatsapp_evolution.providers.EvolutionProvider.send_many")
+    @patch("whatsapp_evolution.utils.batch_send.instance_health.ensure_not_down")
+    def test_duplicates_skip_and_rate_limit_stops_the_tail(self, mock_ensure_not_down, mock_send_many):
+        mock_send_many.return_value = [{"ok": True, "response": {"key": {"id": "A"}}}]
+        items = [
+            {"to_number": "919900120001", "message": "hi", "idempotency_parts": self.first},
+            {"to_number": "919900120001", "message": "hi", "idempotency_parts": self.first},
+            {"to_number": "919900120002", "message": "hi", "idempotency_parts": self.second},
+        ]
+
+        results = batch_send.send_many(self.settings, items)
+
+        # Only the first item reaches the provider, without the guard keys.
+        self.assertEqual(mock_send_many.call_args.args[0], [{"to_number": "919900120001", "message": "hi"}])
+        self.assertTrue(results[0]["ok"])
+        self.assertEqual(results[0]["idempotency_key"], idempotency.fingerprint(*self.first))
+        self.assertTrue(results[1]["skipped"])
+        self.assertTrue(results[2]["rate_limited"])
+        self.assertGreater(results[2]["retry_after"], 0)
+        # The refused item's claim was released so a retry can send it.
+        self.assertIsNone(results[2]["idempotency_key"])
+        self.assertTrue(idempotency.claim(*self.second))
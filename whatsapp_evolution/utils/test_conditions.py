@@ -0,0 +1,40 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import conditions
+
+
+class TestConditions(IntegrationTestCase):
+    """Tests for the compiled notification condition cache."""
+
+    def setUp(self):
+        conditions._compiled.clear()
+        self.owner = frappe._dict(name="Cond Notif", modified="2026-01-01 00:00:00")
+
+    def test_matches_safe_eval(self):
+        doc = frappe._dict(grand_total=150, status="Paid")
+        for expression in ("doc.grand_total > 100", "doc.status == 'Draft'", "len(doc.status)"):
+            self.assertEqual(
+                conditions.evaluate(expression, doc, owner=self.owner),
+                frappe.safe_eval(expression, None, {"doc": doc}),
+            )
+
+    def test_compiles_once_per_modified(self):
+        with patch.object(conditions, "_compile", wraps=conditions._compile) as compile_:
+            conditions.evaluate("doc.x == 1", frappe._dict(x=1), owner=self.owner)
+            conditions.evaluate("doc.x == 1", frappe._dict(x=2), owner=self.owner)
+            self.assertEqual(compile_.call_count, 1)
+
+            self.owner.modified = "2026-01-02 00:00:00"
+            conditions.evaluate("doc.x == 1", frappe._dict(x=1), owner=self.owner)
+            self.assertEqual(compile_.call_count, 2)
+        self.assertEqual(len(conditions._compiled), 1)
+
+    def test_unsafe_expression_is_rejected(self):
+        with self.assertRaises(Exception):
+            conditions.evaluate("doc.__class__", frappe._dict(), owner=self.owner)
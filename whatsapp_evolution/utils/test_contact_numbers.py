@@ -0,0 +1,54 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import contact_numbers
+
+
+class TestContactNumbers(IntegrationTestCase):
+    """Tests for the bulk Contact phone lookup."""
+
+    def setUp(self):
+        self.contact = frappe.get_doc(
+            {
+                "doctype": "Contact",
+                "first_name": "CN Test",
+                "phone_nos": [
+                    {"phone": "5550100001", "is_whatsapp_number": 0},
+                    {"phone": "5550100002", "is_whatsapp_number": 1, "is_primary_mobile_no": 1},
+                ],
+                "links": [{"link_doctype": "User", "link_name": "Administrator"}],
+            }
+        ).insert(ignore_permissions=True)
+        self.bare_contact = frappe.get_doc({"doctype": "Contact", "first_name": "CN Bare"}).insert(
+            ignore_permissions=True
+        )
+
+    def tearDown(self):
+        for contact in (self.contact, self.bare_contact):
+            frappe.delete_doc("Contact", contact.name, force=True)
+
+    def test_rows_for_links_and_contacts_in_one_call(self):
+        rows = contact_numbers.get_phone_rows(
+            [("User", "Administrator"), ("Contact", self.contact.name), ("Contact", self.bare_contact.name)],
+            ["is_whatsapp_number"],
+        )
+
+        own = rows[("Contact", self.contact.name)]
+        self.assertEqual([row.phone for row in own], ["5550100001", "5550100002"])
+        self.assertEqual([row.ticked for row in own], [False, True])
+        self.assertEqual([row.is_primary for row in own], [False, True])
+
+        linked = [row for row in rows[("User", "Administrator")] if row.contact == self.contact.name]
+        self.assertEqual(len(linked), 2)
+
+        # A Contact without phone rows still comes back for the caller's fallbacks.
+        bare = rows[("Contact", self.bare_contact.name)]
+        self.assertEqual(len(bare), 1)
+        self.assertIsNone(bare[0].phone)
+
+    def test_unknown_links_are_absent(self):
+        self.assertEqual(contact_numbers.get_phone_rows([("Contact", "CN Missing Contact")], []), {})
+        self.assertEqual(contact_numbers.get_phone_rows([], ["is_whatsapp_number"]), {})
@@ -0,0 +1,27 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import idempotency
+
+
+class TestIdempotency(IntegrationTestCase):
+    """Tests for the outgoing send idempotency ledger."""
+
+    def setUp(self):
+        self.parts = ("Test Idem Notif", "User", "Administrator", "919900110000", frappe.generate_hash(length=8))
+
+    def test_second_claim_is_rejected(self):
+        key = idempotency.claim(*self.parts)
+        self.assertEqual(key, idempotency.fingerprint(*self.parts))
+        self.assertIsNone(idempotency.claim(*self.parts))
+
+    def test_release_allows_reclaim(self):
+        key = idempotency.claim(*self.parts)
+        idempotency.release(key)
+        self.assertEqual(idempotency.claim(*self.parts), key)
+
+    def test_fingerprint_is_compact(self):
+        self.assertEqual(len(idempotency.fingerprint("x" * 5000, "y")), 40)
@@ -0,0 +1,42 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import instance_health
+
+
+class TestInstanceHealth(IntegrationTestCase):
+    """Tests for the cached Evolution instance health poller."""
+
+    def setUp(self):
+        if not frappe.db.exists("WhatsApp Account", "Test WA Health Account"):
+            frappe.get_doc({
+                "doctype": "WhatsApp Account",
+                "account_name": "Test WA Health Account",
+                "status": "Active",
+                "evolution_api_base": "https://evo.example.com",
+                "evolution_instance": "health-test",
+            }).insert(ignore_permissions=True)
+        frappe.cache().delete_value(instance_health._cache_key("Test WA Health Account"))
+
+    @patch("whatsapp_evolution.whatsapp_evolution.providers.evolution.EvolutionProvider.test_connection")
+    def test_check_accounts_caches_state_and_latency(self, mock_test_connection):
+        mock_test_connection.return_value = {"ok": False, "status": "disconnected", "message": "closed"}
+
+        instance_health.check_accounts(["Test WA Health Account"])
+
+        health = instance_health.get_health("Test WA Health Account")
+        self.assertEqual(health["status"], "disconnected")
+        self.assertEqual(health["instance"], "health-test")
+        self.assertIn("latency_ms", health)
+        self.assertTrue(instance_health.is_known_down("Test WA Health Account"))
+        with self.assertRaises(frappe.ValidationError):
+            instance_health.ensure_not_down("Test WA Health Account")
+
+    def test_unknown_state_is_not_down(self):
+        self.assertIsNone(instance_health.get_health("Test WA Health Account"))
+        self.assertFalse(instance_health.is_known_down("Test WA Health Account"))
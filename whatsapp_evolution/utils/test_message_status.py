@@ -0,0 +1,84 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils.message_status import (
+    add_status_update,
+    apply_pending_acks,
+    apply_status_updates,
+    buffer_pending_acks,
+    find_messages_by_ids,
+)
+
+
+class TestMessageStatus(IntegrationTestCase):
+    """Tests for the monotonic message status engine."""
+
+    def setUp(self):
+        msg = frappe.get_doc({
+            "doctype": "WhatsApp Message",
+            "type": "Outgoing",
+            "to": "919900112240",
+            "message": "Status engine test",
+            "message_id": "wamid.status_engine_test",
+            "normalized_message_id": "status_engine_test",
+            "content_type": "text",
+            "status": "Sent",
+        })
+        msg.flags.ignore_validate = True
+        msg.db_insert()
+        self.name = msg.name
+
+    def tearDown(self):
+        frappe.delete_doc("WhatsApp Message", self.name, force=True)
+
+    def _status(self):
+        return frappe.db.get_value("WhatsApp Message", self.name, "status")
+
+    def test_status_only_moves_forward(self):
+        apply_status_updates({self.name: {"status": "Read"}})
+        apply_status_updates({self.name: {"status": "Delivered"}})
+        self.assertEqual(self._status(), "Read")
+
+    def test_rank_ignores_case(self):
+        apply_status_updates({self.name: {"status": "delivered"}})
+        apply_status_updates({self.name: {"status": "Sent"}})
+        self.assertEqual(self._status(), "delivered")
+
+    def test_receipts_coalesce_to_highest_rank(self):
+        updates = {}
+        add_status_update(updates, self.name, "Read")
+        add_status_update(updates, self.name, "Delivered", conversation_id="conv_1")
+        self.assertEqual(updates, {self.name: {"status": "Read", "conversation_id": "conv_1"}})
+
+    def test_conversation_id_is_filled_by_lower_ranked_receipt(self):
+        apply_status_updates({self.name: {"status": "Read"}})
+        apply_status_updates({self.name: {"status": "Sent", "conversation_id": "conv_late"}})
+        apply_status_updates({self.name: {"status": "Sent", "conversation_id": "conv_other"}})
+        values = frappe.db.get_value("WhatsApp Message", self.name, ["status", "conversation_id"], as_dict=True)
+        self.assertEqual(values.status, "Read")
+        self.assertEqual(values.conversation_id, "conv_late")
+
+    def test_find_messages_by_ids_accepts_prefixed_ids(self):
+        found = find_messages_by_ids(["wamid.status_engine_test", "unknown"])
+        self.assertEqual(list(found), ["status_engine_test"])
+        self.assertEqual(found["status_engine_test"].name, self.name)
+
+    def test_buffered_receipt_applies_when_id_is_stored(self):
+        buffer_pending_acks([("wamid.status_engine_late", "Delivered", {})])
+        buffer_pending_acks([("wamid.status_engine_late", "Read", {})])
+
+        frappe.db.set_value(
+            "WhatsApp Message",
+            self.name,
+            {"message_id": "wamid.status_engine_late", "normalized_message_id": "status_engine_late"},
+        )
+        self.assertTrue(apply_pending_acks(self.name, "wamid.status_engine_late"))
+        self.assertEqual(self._status(), "Read")
+        self.assertFalse(apply_pending_acks(self.name, "wamid.status_engine_late"))
+
+    def test_buffering_applies_receipts_for_ids_already_stored(self):
+        buffer_pending_acks([("status_engine_test", "Delivered", {})])
+        self.assertEqual(self._status(), "Delivered")
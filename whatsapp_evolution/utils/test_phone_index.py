@@ -0,0 +1,65 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import phone_index
+
+
+def _doc(doctype, name, **values):
+    return frappe._dict(doctype=doctype, name=name, **values)
+
+
+class TestPhoneIndex(IntegrationTestCase):
+    """Tests for the phone number reverse index."""
+
+    def tearDown(self):
+        for doctype, name in (("Contact", "PI Contact"), ("Customer", "PI Customer"), ("Customer", "PI Renamed")):
+            phone_index.remove_doc(_doc(doctype, name))
+        frappe.cache().delete(phone_index._key(phone_index.MISS_KEY, "5550005555"))
+
+    def test_contact_outranks_party_for_same_number(self):
+        phone_index.update_doc(_doc("Customer", "PI Customer", mobile_no="+92 331 7654321"))
+        phone_index.update_doc(
+            _doc(
+                "Contact",
+                "PI Contact",
+                phone_nos=[frappe._dict(phone="03317654321", is_whatsapp_number=1, is_primary_mobile_no=1)],
+            )
+        )
+        self.assertEqual(phone_index.lookup("923317654321"), ("Contact", "PI Contact"))
+
+    def test_changed_number_is_unindexed(self):
+        phone_index.update_doc(_doc("Customer", "PI Customer", mobile_no="5550001111"))
+        phone_index.update_doc(_doc("Customer", "PI Customer", mobile_no="5550002222"))
+        self.assertEqual(phone_index.lookup("5550001111"), (None, None))
+        self.assertEqual(phone_index.lookup("5550002222"), ("Customer", "PI Customer"))
+
+    def test_rename_moves_entry(self):
+        phone_index.update_doc(_doc("Customer", "PI Customer", mobile_no="5550003333"))
+        phone_index.rename_doc(
+            _doc("Customer", "PI Renamed", mobile_no="5550003333"), old_name="PI Customer", new_name="PI Renamed"
+        )
+        self.assertEqual(phone_index.lookup("5550003333"), ("Customer", "PI Renamed"))
+
+    def test_removed_doc_is_not_found(self):
+        phone_index.update_doc(_doc("Customer", "PI Customer", mobile_no="5550004444"))
+        phone_index.remove_doc(_doc("Customer", "PI Customer"))
+        self.assertEqual(phone_index.lookup("5550004444"), (None, None))
+
+    @patch.object(phone_index, "ensure_built", return_value=True)
+    def test_evicted_entry_falls_back_to_scan_and_is_restored(self, _ensure_built):
+        scan = MagicMock(return_value=("Customer", "PI Customer"))
+        self.assertEqual(phone_index.resolve("5550005555", scan), ("Customer", "PI Customer"))
+        scan.assert_called_once_with("5550005555")
+        self.assertEqual(phone_index.lookup("5550005555"), ("Customer", "PI Customer"))
+
+    @patch.object(phone_index, "ensure_built", return_value=True)
+    def test_unknown_number_is_scanned_once(self, _ensure_built):
+        scan = MagicMock(return_value=(None, None))
+        phone_index.resolve("5550005555", scan)
+        phone_index.resolve("5550005555", scan)
+        scan.assert_called_once()
@@ -0,0 +1,51 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import deferred, rate_limit
+
+
+class TestRateLimit(IntegrationTestCase):
+    """Tests for the per-instance token bucket and deferred job queue."""
+
+    def setUp(self):
+        self.settings = {
+            "evolution_api_base": "https://evo.example.com",
+            "evolution_instance": "rate-test",
+            "rate_limit_per_minute": 1,
+            "rate_limit_burst": 2,
+        }
+        cache = frappe.cache()
+        cache.delete(cache.make_key(rate_limit.get_bucket_key(self.settings)))
+        cache.delete(cache.make_key(deferred.DEFERRED_JOBS_KEY))
+
+    def test_burst_then_rate_limited(self):
+        rate_limit.acquire(self.settings)
+        rate_limit.acquire(self.settings)
+        with self.assertRaises(rate_limit.WhatsAppRateLimited) as ctx:
+            rate_limit.acquire(self.settings)
+        self.assertGreater(ctx.exception.retry_after, 0)
+        self.assertLessEqual(ctx.exception.retry_after, 60)
+
+    def test_unlimited_when_rate_not_set(self):
+        self.settings["rate_limit_per_minute"] = 0
+        for _ in range(10):
+            rate_limit.acquire(self.settings)
+
+    def test_deferred_job_waits_until_due(self):
+        deferred.defer("frappe.ping", delay=3600)
+        frappe.db.commit()
+        cache = frappe.cache()
+        self.assertEqual(cache.zcard(cache.make_key(deferred.DEFERRED_JOBS_KEY)), 1)
+
+        deferred.enqueue_due_jobs()
+        self.assertEqual(cache.zcard(cache.make_key(deferred.DEFERRED_JOBS_KEY)), 1)
+
+    def test_deferred_job_dropped_on_rollback(self):
+        deferred.defer("frappe.ping", delay=5)
+        frappe.db.rollback()
+        frappe.db.commit()
+        cache = frappe.cache()
+        self.assertEqual(cache.zcard(cache.make_key(deferred.DEFERRED_JOBS_KEY)), 0)
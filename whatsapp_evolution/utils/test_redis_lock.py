@@ -0,0 +1,48 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import frappe
+from frappe.utils.file_lock import LockTimeoutError
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import redis_lock
+
+
+class TestRedisLock(IntegrationTestCase):
+    """Tests for the Redis-backed notification lock."""
+
+    LOCK = "test-redis-lock"
+
+    def tearDown(self):
+        frappe.cache().delete(redis_lock._key(self.LOCK))
+        frappe.cache().delete(redis_lock._key(self.LOCK, is_global=True))
+
+    def test_second_holder_times_out(self):
+        with redis_lock.redis_lock(self.LOCK, timeout=1):
+            with self.assertRaises(LockTimeoutError):
+                with redis_lock.redis_lock(self.LOCK, timeout=0.05):
+                    pass
+
+        # Released on exit, so it can be taken again.
+        with redis_lock.redis_lock(self.LOCK, timeout=0.05):
+            pass
+
+    def test_release_ignores_foreign_token(self):
+        token = redis_lock.acquire(self.LOCK, timeout=1)
+        self.assertFalse(redis_lock.release(self.LOCK, "not-the-owner"))
+        self.assertTrue(redis_lock.release(self.LOCK, token))
+
+    def test_expired_lease_can_be_taken_over(self):
+        stale = redis_lock.acquire(self.LOCK, timeout=1, lease_ms=20)
+        fresh = redis_lock.acquire(self.LOCK, timeout=1)
+        # The first holder's late release must not drop the new holder's lock.
+        self.assertFalse(redis_lock.release(self.LOCK, stale))
+        self.assertTrue(redis_lock.release(self.LOCK, fresh))
+
+    def test_filelock_signature_is_accepted(self):
+        with redis_lock.redis_lock(self.LOCK, timeout=1, is_global=True):
+            pass
+
+    def test_lease_covers_timeout(self):
+        self.assertEqual(redis_lock.lease_for(10), redis_lock.DEFAULT_LEASE_MS)
+        self.assertEqual(redis_lock.lease_for(120), 240 * 1000)
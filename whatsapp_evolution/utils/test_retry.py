@@ -0,0 +1,35 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import retry
+from whatsapp_evolution.whatsapp_evolution.providers import EvolutionTransientError
+
+
+class TestRetry(IntegrationTestCase):
+    """Tests for transient send failure retries."""
+
+    def test_backoff_grows_and_is_capped(self):
+        for attempt in range(1, 12):
+            ceiling = min(retry.MAX_DELAY, retry.BASE_DELAY * 2 ** (attempt - 1))
+            delay = retry.backoff_delay(attempt)
+            self.assertGreaterEqual(delay, ceiling / 2)
+            self.assertLessEqual(delay, ceiling)
+
+    @patch("whatsapp_evolution.utils.retry.defer")
+    def test_transient_error_is_retried_with_next_attempt(self, mock_defer):
+        scheduled = retry.schedule_retry("frappe.ping", EvolutionTransientError("timeout"), attempt=2, foo="bar")
+        self.assertTrue(scheduled)
+        self.assertEqual(mock_defer.call_args.kwargs["attempt"], 3)
+        self.assertEqual(mock_defer.call_args.kwargs["foo"], "bar")
+
+    @patch("whatsapp_evolution.utils.retry.defer")
+    def test_permanent_error_and_attempt_cap_are_not_retried(self, mock_defer):
+        self.assertFalse(retry.schedule_retry("frappe.ping", frappe.ValidationError("invalid number")))
+        with patch("whatsapp_evolution.utils.retry.get_max_attempts", return_value=3):
+            self.assertFalse(retry.schedule_retry("frappe.ping", EvolutionTransientError("timeout"), attempt=3))
+        mock_defer.assert_not_called()
@@ -6,10 +6,14 @@ from unittest.mock import patch, MagicMock
 import frappe
 from whatsapp_evolution.testing import IntegrationTestCase
 
+from whatsapp_evolution import utils
 from whatsapp_evolution.utils import (
+    clear_notifications_map,
+    get_dispatch_table,
     format_number,
     get_notifications_map,
     get_whatsapp_account,
+    phone_suffix,
     run_server_script_for_doc_event,
     trigger_whatsapp_notifications,
 )
@@ -28,6 +32,19 @@ class TestFormatNumber(IntegrationTestCase):
         self.assertEqual(format_number("+1234567890"), "1234567890")
 
 
+class TestPhoneSuffix(IntegrationTestCase):
+    """Tests for phone_suffix utility."""
+
+    def test_local_and_international_forms_match(self):
+        self.assertEqual(phone_suffix("03311234567"), phone_suffix("+92 331 1234567"))
+
+    def test_short_numbers_kept_whole(self):
+        self.assertEqual(phone_suffix("12345"), "12345")
+
+    def test_empty(self):
+        self.assertEqual(phone_suffix(None), "")
+
+
 class TestGetWhatsAppAccount(IntegrationTestCase):
     """Tests for get_whatsapp_account utility."""
 
@@ -148,7 +165,39 @@ class TestGetNotificationsMap(IntegrationTestCase):
         result = get_notifications_map()
         self.assertIn("User", result)
         self.assertIn("After Save", result["User"])
-        self.assertIn("Test Utils Map Notif", result["User"]["After Save"])
+        entries = {entry.name: entry for entry in result["User"]["After Save"]}
+        self.assertIn("Test Utils Map Notif", entries)
+        self.assertEqual(entries["Test Utils Map Notif"].template, template_name)
+        self.assertEqual(entries["Test Utils Map Notif"].delay_seconds, 0)
+
+
+class TestDispatchTable(IntegrationTestCase):
+    """Tests for the process-local notification dispatch table."""
+
+    def setUp(self):
+        utils._dispatch_tables.clear()
+
+    def tearDown(self):
+        utils._dispatch_tables.clear()
+
+    @patch("whatsapp_evolution.utils.get_notifications_map", return_value={"User": {"After Save": ["N"]}})
+    def test_served_from_memory_within_interval(self, mock_map):
+        get_dispatch_table()
+        with patch("whatsapp_evolution.utils.frappe.cache") as mock_cache:
+            self.assertEqual(get_dispatch_table(), {"User": {"After Save": ["N"]}})
+            mock_cache.assert_not_called()
+        mock_map.assert_called_once()
+
+    @patch("whatsapp_evolution.utils.get_notifications_map", return_value={})
+    def test_version_bump_reloads_after_interval(self, mock_map):
+        get_dispatch_table()
+        clear_notifications_map()
+        get_dispatch_table()
+        self.assertEqual(mock_map.call_count, 2)
+
+        with patch.object(utils, "DISPATCH_CHECK_INTERVAL", 0):
+            get_dispatch_table()
+        self.assertEqual(mock_map.call_count, 2)
 
 
 class TestRunServerScriptForDocEvent(IntegrationTestCase):
@@ -189,6 +238,28 @@ class TestRunServerScriptForDocEvent(IntegrationTestCase):
         run_server_script_for_doc_event(doc, "random_event")
 
 
+class TestPreEnqueueCondition(IntegrationTestCase):
+    """Tests for evaluating notification conditions before enqueueing."""
+
+    def _run(self, condition):
+        entry = frappe._dict(name="N", delay_seconds=0, condition=condition)
+        doc = frappe._dict(doctype="ToDo", name="T1", status="Open")
+        doc.as_dict = lambda: frappe._dict(doctype="ToDo", name="T1", status="Open")
+        with patch("whatsapp_evolution.utils.get_dispatch_table", return_value={"ToDo": {"After Save": [entry]}}):
+            with patch("whatsapp_evolution.utils.frappe.enqueue") as mock_enqueue:
+                run_server_script_for_doc_event(doc, "on_update")
+        return mock_enqueue
+
+    def test_failing_condition_is_not_enqueued(self):
+        self._run("doc.status == 'Closed'").assert_not_called()
+
+    def test_passing_condition_is_enqueued(self):
+        self._run("doc.status == 'Open'").assert_called_once()
+
+    def test_broken_condition_is_left_to_the_job(self):
+        self._run("doc.status ==").assert_called_once()
+
+
 class TestTriggerWhatsAppNotifications(IntegrationTestCase):
     """Tests for trigger_whatsapp_notifications."""
 
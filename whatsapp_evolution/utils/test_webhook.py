@@ -76,6 +76,7 @@ class TestWebhookHelpers(IntegrationTestCase):
             "to": "919900112233",
             "message": "Status test",
             "message_id": "wamid.webhook_status_test",
+            "normalized_message_id": "webhook_status_test",
             "content_type": "text",
             "whatsapp_account": "Test WA Webhook Account",
         })
@@ -104,6 +105,7 @@ class TestWebhookHelpers(IntegrationTestCase):
             "to": "919900112234",
             "message": "No conv test",
             "message_id": "wamid.webhook_no_conv",
+            "normalized_message_id": "webhook_no_conv",
             "content_type": "text",
             "whatsapp_account": "Test WA Webhook Account",
         })
@@ -122,6 +124,40 @@ class TestWebhookHelpers(IntegrationTestCase):
         msg.reload()
         self.assertEqual(msg.status, "sent")
 
+    def test_update_message_status_applies_every_receipt(self):
+        """Test update_message_status handles batched statuses in one pass."""
+        names = []
+        for suffix in ("a", "b"):
+            msg = frappe.get_doc({
+                "doctype": "WhatsApp Message",
+                "type": "Outgoing",
+                "to": "919900112235",
+                "message": "Batch test",
+                "message_id": f"wamid.webhook_batch_{suffix}",
+                "normalized_message_id": f"webhook_batch_{suffix}",
+                "content_type": "text",
+                "whatsapp_account": "Test WA Webhook Account",
+            })
+            msg.flags.ignore_validate = True
+            msg.db_insert()
+            names.append(msg.name)
+        frappe.db.commit()
+
+        data = {
+            "statuses": [
+                {"id": "wamid.webhook_batch_a", "status": "delivered"},
+                {"id": "wamid.webhook_batch_b", "status": "read", "conversation": {"id": "conv_b"}},
+                {"id": "wamid.webhook_batch_missing", "status": "read"},
+            ]
+        }
+        update_message_status(data)
+
+        self.assertEqual(frappe.db.get_value("WhatsApp Message", names[0], "status"), "delivered")
+        self.assertEqual(
+            frappe.db.get_value("WhatsApp Message", names[1], ["status", "conversation_id"]),
+            ("read", "conv_b"),
+        )
+
     def test_update_template_status(self):
         """Test update_template_status updates template status via SQL."""
         # Create a template directly
@@ -366,6 +402,7 @@ class TestWebhookEndpoint(IntegrationTestCase):
             "to": "919900112292",
             "message": "Status update test",
             "message_id": "wamid.webhook_ep_status_1",
+            "normalized_message_id": "webhook_ep_status_1",
             "content_type": "text",
             "whatsapp_account": "Test WA Webhook EP Account",
         })
@@ -0,0 +1,102 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.utils import webhook_stream
+
+
+def _receipt(message_id, instance):
+    return {
+        "event": "messages.update",
+        "instance": instance,
+        "data": {"key": {"id": message_id}, "status": "READ"},
+    }
+
+
+class TestWebhookStream(IntegrationTestCase):
+    """Tests for queued Evolution webhook ingestion."""
+
+    def setUp(self):
+        self.key_patch = patch.object(webhook_stream, "STREAM_KEY", "whatsapp_evolution_webhooks_test")
+        self.dead_key_patch = patch.object(webhook_stream, "DEAD_LETTER_KEY", "whatsapp_evolution_webhooks_dead_test")
+        self.key_patch.start()
+        self.dead_key_patch.start()
+        self._clear()
+
+    def tearDown(self):
+        self._clear()
+        self.key_patch.stop()
+        self.dead_key_patch.stop()
+
+    def _clear(self):
+        conn = webhook_stream._conn()
+        conn.delete(webhook_stream._key(webhook_stream.STREAM_KEY))
+        conn.delete(webhook_stream._key(webhook_stream.DEAD_LETTER_KEY))
+        cache = frappe.cache()
+        cache.delete(cache.make_key(webhook_stream.DRAIN_SCHEDULED_KEY))
+
+    def _pending(self):
+        conn = webhook_stream._conn()
+        return conn.xpending(webhook_stream._key(webhook_stream.STREAM_KEY), webhook_stream.GROUP)["pending"]
+
+    @patch("whatsapp_evolution.utils.webhook_stream.frappe.enqueue")
+    def test_publish_schedules_a_single_drain(self, enqueue):
+        webhook_stream.publish(_receipt("A", "one"))
+        webhook_stream.publish(_receipt("B", "one"))
+        enqueue.assert_called_once()
+
+    @patch("whatsapp_evolution.whatsapp_evolution.providers.evolution.process_webhook_payload")
+    @patch("whatsapp_evolution.utils.webhook_stream.frappe.enqueue")
+    def test_drain_groups_by_instance_and_acks(self, enqueue, process):
+        for message_id, instance in (("A", "one"), ("B", "two"), ("C", "one")):
+            webhook_stream.publish(_receipt(message_id, instance))
+
+        webhook_stream.drain_webhook_stream()
+
+        batches = {call.args[0]["instance"]: call.args[0]["data"] for call in process.call_args_list}
+        self.assertEqual([item["key"]["id"] for item in batches["one"]], ["A", "C"])
+        self.assertEqual([item["key"]["id"] for item in batches["two"]], ["B"])
+        self.assertEqual(self._pending(), 0)
+
+    @patch("whatsapp_evolution.whatsapp_evolution.providers.evolution.process_webhook_payload")
+    @patch("whatsapp_evolution.utils.webhook_stream.frappe.enqueue")
+    def test_failed_group_stays_pending(self, enqueue, process):
+        process.side_effect = Exception("db down")
+        webhook_stream.publish(_receipt("A", "one"))
+
+        webhook_stream.drain_webhook_stream()
+
+        self.assertEqual(self._pending(), 1)
+
+    @patch("whatsapp_evolution.whatsapp_evolution.providers.evolution.process_webhook_payload")
+    @patch("whatsapp_evolution.utils.webhook_stream.frappe.enqueue")
+    def test_bad_entry_does_not_hold_back_its_group(self, enqueue, process):
+        def fail_on_bad(data):
+            items = data["data"] if isinstance(data["data"], list) else [data["data"]]
+            if any(item["key"]["id"] == "BAD" for item in items):
+                raise Exception("bad payload")
+
+        process.side_effect = fail_on_bad
+        for message_id in ("A", "BAD", "C"):
+            webhook_stream.publish(_receipt(message_id, "one"))
+
+        webhook_stream.drain_webhook_stream()
+
+        self.assertEqual(self._pending(), 1)
+
+    @patch("whatsapp_evolution.utils.webhook_stream.frappe.enqueue")
+    def test_exhausted_entry_moves_to_dead_letter_stream(self, enqueue):
+        webhook_stream.publish(_receipt("A", "one"))
+        conn = webhook_stream._conn()
+        key = webhook_stream._key(webhook_stream.STREAM_KEY)
+        webhook_stream._ensure_group(conn, key)
+        entries = conn.xreadgroup(webhook_stream.GROUP, "test", {key: ">"})[0][1]
+
+        webhook_stream._dead_letter(conn, key, entries[0][0], entries[0][1])
+
+        self.assertEqual(self._pending(), 0)
+        self.assertEqual(conn.xlen(webhook_stream._key(webhook_stream.DEAD_LETTER_KEY)), 1)
@@ -4,7 +4,13 @@ import json
 import requests
 from werkzeug.wrappers import Response
 
-from whatsapp_evolution.utils import get_whatsapp_account
+from whatsapp_evolution.utils import get_whatsapp_account, normalize_message_id
+from whatsapp_evolution.utils.message_status import (
+	add_status_update,
+	apply_status_updates,
+	buffer_pending_acks,
+	find_messages_by_ids,
+)
 
 REQUEST_TIMEOUT = 15
 
@@ -234,22 +240,24 @@ def update_template_status(data):
 	)
 
 def update_message_status(data):
-	"""Update message status."""
-	statuses = data.get("statuses") or []
-	if not statuses:
-		return
-	first_status = statuses[0]
-	message_id = first_status.get("id")
-	status = first_status.get("status")
-	if not message_id or not status:
-		return
-	conversation = first_status.get("conversation", {}).get("id")
-	name = frappe.db.get_value("WhatsApp Message", filters={"message_id": message_id})
-	if not name:
+	"""Update message status for every receipt in the payload."""
+	receipts = [
+		status for status in data.get("statuses") or [] if status.get("id") and status.get("status")
+	]
+	if not receipts:
 		return
 
-	doc = frappe.get_doc("WhatsApp Message", name)
-	doc.status = status
-	if conversation:
-		doc.conversation_id = conversation
-	doc.save(ignore_permissions=True)
+	found_by_id = find_messages_by_ids(status.get("id") for status in receipts)
+	updates = {}
+	pending = []
+	for status in receipts:
+		conversation_id = (status.get("conversation") or {}).get("id")
+		found = found_by_id.get(normalize_message_id(status.get("id")))
+		if not found:
+			values = {"conversation_id": conversation_id} if conversation_id else {}
+			pending.append((status.get("id"), status.get("status"), values))
+			continue
+		add_status_update(updates, found.name, status.get("status"), conversation_id=conversation_id)
+
+	apply_status_updates(updates)
+	buffer_pending_acks(pending)
@@ -0,0 +1,188 @@
+"""Ack-first Evolution webhook ingestion through a Redis stream.
+
+In "Queued" ingest mode the webhook endpoint only appends the raw payload to
+a stream and returns. A consumer group drains it in batches, grouping items
+by instance and event so status receipts are reconciled with one query per
+group; if a group fails, its entries are retried one by one so a single bad
+payload cannot hold back the rest. Entries are acknowledged only after they
+commit, so a crashed worker leaves them pending for the next drain to
+reclaim (at-least-once); status updates and incoming-message inserts are
+both idempotent. Entries that keep failing move to a dead-letter stream.
+
+The streams live on the background-job Redis rather than the LRU-evicted
+cache, so unprocessed webhooks are not evicted under memory pressure.
+"""
+
+import json
+import os
+import socket
+
+import frappe
+from frappe.utils.background_jobs import get_redis_conn
+from redis.exceptions import ResponseError
+
+
+STREAM_KEY = "whatsapp_evolution_webhooks"
+DEAD_LETTER_KEY = "whatsapp_evolution_webhooks_dead"
+GROUP = "whatsapp_evolution_webhook_consumers"
+# Approximate cap so a stalled consumer cannot grow the stream without bound.
+STREAM_MAXLEN = 100000
+BATCH_SIZE = 200
+# Stop after this many batches; the next trigger or scheduler tick continues.
+MAX_BATCHES = 50
+# Entries pending for longer than this are assumed orphaned by a dead worker.
+RECLAIM_IDLE_MS = 5 * 60 * 1000
+# Entries delivered this many times are logged and moved to the dead-letter stream.
+MAX_DELIVERIES = 5
+DRAIN_SCHEDULED_KEY = "whatsapp_evolution_webhook_drain_scheduled"
+DRAIN_SCHEDULE_TTL = 5
+
+
+def is_queued_mode():
+    return frappe.get_cached_doc("WhatsApp Settings").get("webhook_ingest_mode") == "Queued"
+
+
+def _conn():
+    """Redis connection used for the streams (RQ's, which is not LRU-evicted)."""
+    return get_redis_conn()
+
+
+def _key(name):
+    # Site-prefixed like cache keys, so sites sharing the queue Redis stay apart.
+    return frappe.cache().make_key(name)
+
+
+def publish(data):
+    """Append a webhook payload to the stream and make sure a consumer will run."""
+    _conn().xadd(
+        _key(STREAM_KEY),
+        {"payload": json.dumps(data, separators=(",", ":"))},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+    # At most one drain is enqueued per few seconds however many webhooks arrive.
+    cache = frappe.cache()
+    if cache.set(cache.make_key(DRAIN_SCHEDULED_KEY), 1, nx=True, ex=DRAIN_SCHEDULE_TTL):
+        frappe.enqueue(
+            "whatsapp_evolution.utils.webhook_stream.drain_webhook_stream",
+            queue="short",
+        )
+
+
+def drain_webhook_stream(batch_size=BATCH_SIZE, max_batches=MAX_BATCHES):
+    """Process queued webhook payloads (enqueued by ``publish`` and every minute)."""
+    conn = _conn()
+    key = _key(STREAM_KEY)
+    _ensure_group(conn, key)
+    consumer = f"{socket.gethostname()}:{os.getpid()}"
+
+    _process_entries(conn, key, _reclaim_orphaned(conn, key, consumer, batch_size))
+    for _ in range(max_batches):
+        response = conn.xreadgroup(GROUP, consumer, {key: ">"}, count=batch_size)
+        entries = response[0][1] if response else []
+        if not entries:
+            break
+        _process_entries(conn, key, entries)
+
+
+def _ensure_group(conn, key):
+    try:
+        conn.xgroup_create(key, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _reclaim_orphaned(conn, key, consumer, batch_size):
+    claimed = conn.xautoclaim(
+        key, GROUP, consumer, min_idle_time=RECLAIM_IDLE_MS, start_id="0-0", count=batch_size
+    )
+    entries = claimed[1] if claimed else []
+    if not entries:
+        return []
+
+    deliveries = {
+        row["message_id"]: row["times_delivered"]
+        for row in conn.xpending_range(key, GROUP, min=entries[0][0], max=entries[-1][0], count=len(entries))
+    }
+    alive = []
+    for entry_id, fields in entries:
+        if deliveries.get(entry_id, 0) > MAX_DELIVERIES:
+            _dead_letter(conn, key, entry_id, fields)
+            continue
+        alive.append((entry_id, fields))
+    return alive
+
+
+def _dead_letter(conn, key, entry_id, fields):
+    """Park an entry that keeps failing in the dead-letter stream, then ack it."""
+    conn.xadd(
+        _key(DEAD_LETTER_KEY),
+        {"payload": fields.get(b"payload") or fields.get("payload") or b"{}", "entry_id": entry_id},
+        maxlen=STREAM_MAXLEN,
+        approximate=True,
+    )
+    conn.xack(key, GROUP, entry_id)
+    frappe.log_error(
+        title="WhatsApp webhook dead-lettered",
+        message=f"Gave up after {MAX_DELIVERIES} deliveries (entry {frappe.safe_decode(entry_id)}): {_decode(fields)}",
+    )
+
+
+def _decode(fields):
+    raw = fields.get(b"payload") or fields.get("payload") or b"{}"
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _group_payloads(entries):
+    """Merge entries into one payload per (instance, event), keeping them for ack or retry."""
+    from whatsapp_evolution.whatsapp_evolution.providers.evolution import (
+        _extract_instance_name,
+        _webhook_items,
+    )
+
+    groups = {}
+    for entry_id, fields in entries:
+        data = _decode(fields)
+        items = _webhook_items(data)
+        instance = _extract_instance_name(data, items[0] if items else {})
+        group = groups.setdefault(
+            (instance, data.get("event")),
+            {"entries": [], "data": {"event": data.get("event"), "instance": instance, "data": []}},
+        )
+        group["entries"].append((entry_id, data))
+        group["data"]["data"].extend(items)
+    return groups.values()
+
+
+def _process(conn, key, data, entry_ids, log_failure=True):
+    from whatsapp_evolution.whatsapp_evolution.providers.evolution import process_webhook_payload
+
+    try:
+        process_webhook_payload(data)
+        frappe.db.commit()
+    except Exception:
+        # Left pending; reclaimed by a later drain once RECLAIM_IDLE_MS passes.
+        frappe.db.rollback()
+        if log_failure:
+            frappe.log_error(title="WhatsApp webhook processing failed")
+        return False
+    conn.xack(key, GROUP, *entry_ids)
+    return True
+
+
+def _process_entries(conn, key, entries):
+    for group in _group_payloads(entries):
+        entry_ids = [entry_id for entry_id, _ in group["entries"]]
+        if _process(conn, key, group["data"], entry_ids, log_failure=len(entry_ids) == 1):
+            continue
+        if len(entry_ids) > 1:
+            # Retry entry by entry so one bad payload does not hold back the group.
+            for entry_id, data in group["entries"]:
+                _process(conn, key, data, [entry_id])
@@ -8,12 +8,23 @@ import time
 from frappe.utils import cint
 from frappe.model.document import Document
 from frappe.model.naming import make_autoname
+from whatsapp_evolution.utils import batch_send, get_evolution_settings
+from whatsapp_evolution.utils.deferred import defer_doc_method
+from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
 from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message import (
     _is_evolution_enabled_global,
+    _outgoing_idempotency_parts,
     _parse_body_param,
     _render_template_text,
 )
 
+# Shorter waits are slept in the worker: deferred jobs only start on the
+# scheduler's once-a-minute tick.
+MIN_DEFER_SECONDS = 60
+# A job stops sleeping and defers the rest of the queue after this long,
+# well inside its 4000s timeout.
+SLEEP_BUDGET_SECONDS = 30 * 60
+
 # Add these files to your whatsapp_evolution app
 
 # 1. First, create a new DocType for Bulk WhatsApp Messaging
@@ -100,25 +111,41 @@ class BulkWhatsAppMessage(Document):
             )
             return {}
 
-    def process_message_queue(self):
-        """Send one-by-one with delay to reduce provider throttling/blocks."""
+    def process_message_queue(self, start_index=0):
+        """Send in rounds, waiting ``delay_between_messages`` between rounds.
+
+        With Evolution a round is up to the account's ``max_concurrent_sends``
+        recipients sent together through ``batch_send.send_many``; otherwise
+        it is one recipient. Waits under ``MIN_DEFER_SECONDS`` (including rate-limit retries) are
+        slept in this job; longer ones, or any once the job has used its
+        ``SLEEP_BUDGET_SECONDS``, hand the remaining recipients back to the
+        deferred-job scheduler instead of holding the worker.
+        """
         recipients = self._get_recipients()
         total_recipients = len(recipients)
         delay_between_messages = max(cint(self.delay_between_messages) or 60, 0)
+        index = cint(start_index)
+        started = time.monotonic()
+        round_size = self._round_size()
 
         if not total_recipients:
             self.db_set("status", "Partially Failed")
             return
 
         self.db_set("status", "In Progress")
-        any_failure = False
 
-        for index, recipient in enumerate(recipients, start=1):
-            if not self.create_single_message(recipient):
-                any_failure = True
+        while index < total_recipients:
+            handled, retry_after = self._send_round(recipients[index : index + round_size])
+            index += handled
+            if retry_after is not None:
+                # Retry from the refused recipient once the account's bucket has refilled.
+                if not self._wait_or_defer(index, retry_after, started):
+                    return
+                continue
 
             if index < total_recipients and delay_between_messages:
-                time.sleep(delay_between_messages)
+                if not self._wait_or_defer(index, delay_between_messages, started):
+                    return
 
         failed_count = frappe.db.count(
             "WhatsApp Message",
@@ -126,15 +153,119 @@ class BulkWhatsAppMessage(Document):
         )
         self.reload()
 
-        if any_failure or failed_count:
+        if failed_count:
             self.db_set("status", "Partially Failed")
         elif cint(self.sent_count) >= cint(self.recipient_count):
             self.db_set("status", "Completed")
         else:
             self.db_set("status", "Partially Failed")
+
+    def _wait_or_defer(self, start_index, delay, started):
+        """Sleep ``delay`` seconds and return True, or defer the queue from ``start_index`` and return False."""
+        if delay < MIN_DEFER_SECONDS and time.monotonic() - started + delay <= SLEEP_BUDGET_SECONDS:
+            # Make the sends so far visible before idling.
+            frappe.db.commit()
+            time.sleep(delay)
+            return True
+        self._defer_message_queue(start_index, delay)
+        return False
+
+    def _defer_message_queue(self, start_index, delay):
+        defer_doc_method(
+            self.doctype,
+            self.name,
+            "process_message_queue",
+            delay=delay,
+            queue="long",
+            timeout=4000,
+            start_index=start_index,
+        )
     
+    def _round_size(self):
+        if not _is_evolution_enabled_global():
+            return 1
+        settings = get_evolution_settings(self.whatsapp_account)
+        return max(cint(settings.get("max_concurrent_sends")), 1)
+
+    def _send_round(self, recipients):
+        """Send to ``recipients``; return how many were handled and the rate limiter's ``retry_after``, if it refused one."""
+        if not _is_evolution_enabled_global():
+            for handled, recipient in enumerate(recipients):
+                try:
+                    self.create_single_message(recipient)
+                except WhatsAppRateLimited as e:
+                    return handled, e.retry_after
+            return len(recipients), None
+
+        messages = [self._new_message(recipient) for recipient in recipients]
+        for message in messages:
+            message.set_whatsapp_account()
+        settings = get_evolution_settings(messages[0].whatsapp_account)
+        items = [message._evolution_send_item() for message in messages]
+        results = batch_send.send_many(
+            settings,
+            [
+                dict(item, idempotency_parts=_outgoing_idempotency_parts(message))
+                for message, item in zip(messages, items)
+            ],
+        )
+        for handled, (message, item, result) in enumerate(zip(messages, items, results)):
+            if result.get("rate_limited"):
+                return handled, result["retry_after"]
+            self._record_sent_message(message, settings, item, result)
+        return len(messages), None
+
+    def _record_sent_message(self, message, settings, item, result):
+        """Insert ``message`` for its ``batch_send`` result without sending it again."""
+        if result.get("skipped"):
+            message.status = "Skipped"
+            message.message_id = "dedup-skip"
+        else:
+            message.idempotency_key = result.get("idempotency_key")
+            try:
+                message._apply_evolution_result(settings, item, result)
+            except Exception:
+                self.db_set("status", "Partially Failed")
+                frappe.log_error(
+                    title="WhatsApp Bulk Messaging",
+                    message=frappe.get_traceback(),
+                )
+                return False
+            message.status = "Success"
+
+        message.flags.skip_send = True
+        message.insert(ignore_permissions=True)
+        message.create_whatsapp_profile()
+        self._count_sent()
+        return True
+
     def create_single_message(self, recipient):
         """Create a single message in the queue"""
+        wa_message = self._new_message(recipient)
+        wa_message.status = "Queued"
+        try:
+            wa_message.insert(ignore_permissions=True)
+        except WhatsAppRateLimited:
+            raise
+        except Exception:
+            self.db_set("status", "Partially Failed")
+            frappe.log_error(
+                title="WhatsApp Bulk Messaging",
+                message=frappe.get_traceback(),
+            )
+            return False
+        self._count_sent()
+        return True
+
+    def _count_sent(self):
+        self.reload()
+        self.db_set("sent_count", cint(self.sent_count) + 1)
+        self.reload()
+        if cint(self.recipient_count) == cint(self.sent_count):
+            self.db_set("status", "Completed")
+
+    def _new_message(self, recipient):
+        """Build the unsaved WhatsApp Message for ``recipient``."""
         recipient_data = self._parse_recipient_data(recipient)
 
         wa_message = frappe.new_doc("WhatsApp Message")
@@ -169,24 +300,7 @@ class BulkWhatsAppMessage(Document):
             wa_message.message_type = "Manual"
             wa_message.content_type = "text"
             wa_message.message = self.message_content or ""
-
-        wa_message.status = "Queued"
-        try:
-            wa_message.insert(ignore_permissions=True)
-        except Exception:
-            self.db_set("status", "Partially Failed")
-            frappe.log_error(
-                title="WhatsApp Bulk Messaging",
-                message=frappe.get_traceback(),
-            )
-            return False
-        # Update message count
-        self.reload()
-        self.db_set("sent_count", cint(self.sent_count) + 1)
-        self.reload()
-        if cint(self.recipient_count) == cint(self.sent_count):
-            self.db_set("status", "Completed")
-        return True
+        return wa_message
 
     def _render_bulk_template_text(self, recipient_data):
         if not self.template:
@@ -216,21 +330,25 @@ class BulkWhatsAppMessage(Document):
         return _render_template_text(template_text, params)
 
     def retry_failed(self):
-        """Retry failed messages"""
+        """Requeue failed messages and re-send them in the background."""
         failed_messages = frappe.get_all(
             "WhatsApp Message",
             filters={
                 "bulk_message_reference": self.name,
                 "status": "Failed"
             },
-            fields=["name"]
+            pluck="name",
         )
-        
+
         count = 0
-        for msg in failed_messages:
-            message_doc = frappe.get_doc("WhatsApp Message", msg.name)
-            message_doc.status = "Queued"
-            message_doc.save(ignore_permissions=True)
+        for message_name in failed_messages:
+            frappe.db.set_value("WhatsApp Message", message_name, "status", "Queued")
+            frappe.enqueue(
+                "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.retry_message",
+                queue="short",
+                enqueue_after_commit=True,
+                message_name=message_name,
+            )
             count += 1
         
         frappe.msgprint(_("{0} messages have been requeued for sending").format(count))
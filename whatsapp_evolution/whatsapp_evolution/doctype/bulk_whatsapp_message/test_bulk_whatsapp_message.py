@@ -6,6 +6,7 @@ from unittest.mock import patch
 
 import frappe
 from whatsapp_evolution.testing import IntegrationTestCase
+from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
 
 
 class TestBulkWhatsAppMessage(IntegrationTestCase):
@@ -83,6 +84,7 @@ class TestBulkWhatsAppMessage(IntegrationTestCase):
             "recipient_type": kwargs.get("recipient_type", "Individual"),
             "use_template": kwargs.get("use_template", 1),
             "template": kwargs.get("template", "test_bulk_template-en"),
+            "message_content": kwargs.get("message_content"),
             "variable_type": kwargs.get("variable_type", "Common"),
             "whatsapp_account": kwargs.get("whatsapp_account", "Test WA Bulk Account"),
         })
@@ -148,18 +150,86 @@ class TestBulkWhatsAppMessage(IntegrationTestCase):
         self.assertEqual(args[2], "process_message_queue")
 
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.time.sleep")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.defer_doc_method")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.BulkWhatsAppMessage.create_single_message")
-    def test_process_message_queue_respects_delay(self, mock_create_single_message, mock_sleep):
-        """Sequential queue should sleep between each recipient."""
+    def test_process_message_queue_sleeps_short_delays(self, mock_create_single_message, mock_defer, mock_sleep):
+        """Delays under a minute are waited out in the job, not rounded up by the scheduler."""
         doc = self._make_bulk_message(title="Test Bulk Delay")
         doc.delay_between_messages = 1
         mock_create_single_message.return_value = True
 
+        with patch.object(frappe.db, "commit"):
+            doc.process_message_queue()
+
+        self.assertEqual(mock_create_single_message.call_count, 2)
+        mock_sleep.assert_called_once_with(1)
+        mock_defer.assert_not_called()
+
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.time.sleep")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.defer_doc_method")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.BulkWhatsAppMessage.create_single_message")
+    def test_process_message_queue_defers_long_delays(self, mock_create_single_message, mock_defer, mock_sleep):
+        """Sequential queue should defer the next recipient instead of sleeping for long delays."""
+        doc = self._make_bulk_message(title="Test Bulk Long Delay")
+        doc.delay_between_messages = 120
+        mock_create_single_message.return_value = True
+
         doc.process_message_queue()
 
+        self.assertEqual(mock_create_single_message.call_count, 1)
+        mock_sleep.assert_not_called()
+        mock_defer.assert_called_once()
+        self.assertEqual(mock_defer.call_args.kwargs["delay"], 120)
+        self.assertEqual(mock_defer.call_args.kwargs["start_index"], 1)
+
+        mock_defer.reset_mock()
+        doc.process_message_queue(start_index=1)
         self.assertEqual(mock_create_single_message.call_count, 2)
-        self.assertEqual(mock_sleep.call_count, 1)
-        mock_sleep.assert_called_with(1)
+        mock_defer.assert_not_called()
+
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.time.sleep")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.defer_doc_method")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.BulkWhatsAppMessage.create_single_message")
+    def test_process_message_queue_waits_when_rate_limited(self, mock_create_single_message, mock_defer, mock_sleep):
+        """A rate-limited recipient is retried after the limiter's retry_after."""
+        doc = self._make_bulk_message(title="Test Bulk Rate Limit")
+        mock_create_single_message.side_effect = [WhatsAppRateLimited(retry_after=7), True]
+
+        with patch.object(frappe.db, "commit"):
+            doc.process_message_queue(start_index=1)
+
+        mock_sleep.assert_called_once_with(7)
+        mock_defer.assert_not_called()
+        self.assertEqual(mock_create_single_message.call_count, 2)
+
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.batch_send.send_many")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message.get_evolution_settings")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.bulk_whatsapp_message.bulk_whatsapp_message._is_evolution_enabled_global")
+    def test_send_round_stops_at_rate_limited_recipient(self, mock_enabled, mock_settings, mock_send_many):
+        """A round records the sends before the rate limiter refused and hands back its retry_after."""
+        mock_enabled.return_value = True
+        mock_settings.return_value = {"whatsapp_account": "Test WA Bulk Account", "max_concurrent_sends": 2}
+        mock_send_many.return_value = [
+            {"ok": True, "response": {"key": {"id": "BULKROUND1"}}, "idempotency_key": "k1"},
+            {"ok": False, "rate_limited": True, "retry_after": 5, "error": "limited", "idempotency_key": None},
+        ]
+        doc = self._make_bulk_message(title="Test Bulk Round", use_template=0, message_content="Round hello")
+
+        self.assertEqual(doc._round_size(), 2)
+        handled, retry_after = doc._send_round(doc._get_recipients())
+
+        self.assertEqual((handled, retry_after), (1, 5))
+        items = mock_send_many.call_args.args[1]
+        self.assertEqual([item["to_number"] for item in items], ["919900112233", "919900112244"])
+        self.assertTrue(all(item["idempotency_parts"] for item in items))
+        sent = frappe.get_all(
+            "WhatsApp Message",
+            filters={"bulk_message_reference": doc.name},
+            fields=["to", "status", "message_id"],
+        )
+        self.assertEqual([(m.to, m.status, m.message_id) for m in sent], [("919900112233", "Success", "BULKROUND1")])
+        doc.reload()
+        self.assertEqual(doc.sent_count, 1)
 
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.make_post_request")
     def test_create_single_message(self, mock_post):
@@ -7,7 +7,7 @@ frappe.ui.form.on("WhatsApp Account", {
 		frm.add_custom_button(__('Test Connection'), function() {
 			frappe.call({
 				method: 'whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_settings.whatsapp_settings.test_evolution_connection',
-				args: { account: frm.doc.name },
+				args: { account: frm.doc.name, live: 1 },
 				callback: function(r) {
 					const rows = (r.message && r.message.results) ? r.message.results : [];
 					const x = rows.length ? rows[0] : null;
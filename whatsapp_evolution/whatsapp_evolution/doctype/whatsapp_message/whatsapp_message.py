@@ -17,8 +17,16 @@ from whatsapp_evolution.utils import (
     format_number,
     get_evolution_settings,
     is_evolution_enabled,
+    normalize_message_id,
+    phone_suffix,
 )
-from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider
+from whatsapp_evolution.utils import batch_send, idempotency, instance_health
+from whatsapp_evolution.utils.deferred import defer
+from whatsapp_evolution.utils.message_status import apply_pending_acks_after_commit
+from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
+from whatsapp_evolution.utils.retry import is_transient, schedule_retry
+from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider, EvolutionTransientError
+from whatsapp_evolution.whatsapp_evolution.providers.media_stream import local_file_path
 
 
 LEDGER_BALANCE_ALIASES = {"ledger_balance", "_ledger_balance", "ledger balance"}
@@ -261,7 +269,13 @@ def _resolve_outgoing_account_name(preferred_account=None):
 
 
 def _resolve_evolution_account(preferred_account=None, template_account=None):
+    """Pick the first Evolution-enabled account whose instance is not known to be down.
+
+    Connection state comes from the instance health poller cache; when every
+    enabled account is down, the first enabled one is returned anyway.
+    """
     candidates = []
+    first_enabled = None
     for candidate in (preferred_account, template_account):
         if candidate and candidate not in candidates and frappe.db.exists("WhatsApp Account", candidate):
             candidates.append(candidate)
@@ -277,7 +291,9 @@ def _resolve_evolution_account(preferred_account=None, template_account=None):
     for account_name in candidates:
         try:
             if is_evolution_enabled(whatsapp_account=account_name):
-                return account_name
+                if not instance_health.is_known_down(account_name):
+                    return account_name
+                first_enabled = first_enabled or account_name
         except Exception:
             continue
 
@@ -297,7 +313,9 @@ def _resolve_evolution_account(preferred_account=None, template_account=None):
             continue
         try:
             if is_evolution_enabled(whatsapp_account=account_name):
-                return account_name
+                if not instance_health.is_known_down(account_name):
+                    return account_name
+                first_enabled = first_enabled or account_name
         except Exception:
             continue
 
@@ -308,12 +326,14 @@ def _resolve_evolution_account(preferred_account=None, template_account=None):
             continue
         try:
             if is_evolution_enabled(whatsapp_account=account_name):
-                return account_name
+                if not instance_health.is_known_down(account_name):
+                    return account_name
+                first_enabled = first_enabled or account_name
         except Exception:
             continue
 
     # Return first resolvable account for clearer error messages downstream.
-    return candidates[0] if candidates else None
+    return first_enabled or (candidates[0] if candidates else None)
 
 
 def _resolve_print_format(doctype_name, selected_print_format=None):
@@ -516,29 +536,18 @@ def _extract_print_format_from_attach(attach):
         return None
 
 
-def _outgoing_dedup_key(doc):
-    return "|".join(
-        [
-            str(doc.get("to") or ""),
-            str(doc.get("content_type") or ""),
-            str(doc.get("message") or ""),
-            _normalized_attachment_identity(doc.get("attach")),
-            str(doc.get("template") or ""),
-            str(doc.get("reference_doctype") or ""),
-            str(doc.get("reference_name") or ""),
-        ]
+def _outgoing_idempotency_parts(doc):
+    return (
+        doc.get("to"),
+        doc.get("content_type"),
+        doc.get("message"),
+        _normalized_attachment_identity(doc.get("attach")),
+        doc.get("template"),
+        doc.get("reference_doctype"),
+        doc.get("reference_name"),
     )
 
 
-def _acquire_outgoing_dedup(doc, ttl=60):
-    key = f"wa_msg_dedup:{_outgoing_dedup_key(doc)}"
-    cache = frappe.cache()
-    if cache.get_value(key):
-        return False
-    cache.set_value(key, 1, expires_in_sec=ttl)
-    return True
-
-
 def _create_queue_placeholder(
     to,
     reference_doctype,
@@ -577,54 +586,12 @@ def _update_queue_status(name, status, message_id=None, details=None):
     values = {"status": status}
     if message_id:
         values["message_id"] = message_id
+        values["normalized_message_id"] = normalize_message_id(message_id) or None
     if details:
         values["message"] = details
     frappe.db.set_value("WhatsApp Message", name, values, update_modified=True)
-
-
-def _recent_duplicate_exists(
-    *,
-    reference_doctype,
-    reference_name,
-    to_number,
-    content_type,
-    message,
-    attach,
-    template=None,
-    exclude_name=None,
-    seconds=120,
-):
-    rows = frappe.db.sql(
-        """
-        select name
-        from `tabWhatsApp Message`
-        where type='Outgoing'
-          and ifnull(reference_doctype,'')=%s
-          and ifnull(reference_name,'')=%s
-          and ifnull(`to`,'')=%s
-          and ifnull(content_type,'')=%s
-          and ifnull(message,'')=%s
-          and ifnull(attach,'')=%s
-          and ifnull(template,'')=%s
-          and ifnull(status,'') in ('Queued', 'Started', 'Success')
-          and creation >= (now() - interval %s second)
-          and (%s is null or name != %s)
-        limit 1
-        """,
-        (
-            reference_doctype or "",
-            reference_name or "",
-            to_number or "",
-            content_type or "",
-            message or "",
-            attach or "",
-            template or "",
-            seconds,
-            exclude_name,
-            exclude_name,
-        ),
-    )
-    return bool(rows)
+    if message_id:
+        apply_pending_acks_after_commit(name, message_id)
 
 
 class WhatsAppMessage(Document):
@@ -656,6 +623,15 @@ class WhatsAppMessage(Document):
     def validate(self):
         self.set_whatsapp_account()
         self.set_label()
+        self.set_normalized_message_id()
+        self.set_number_suffixes()
+
+    def set_normalized_message_id(self):
+        self.normalized_message_id = normalize_message_id(self.message_id) or None
+
+    def set_number_suffixes(self):
+        self.to_number_suffix = phone_suffix(self.to) or None
+        self.from_number_suffix = phone_suffix(self.get("from")) or None
 
     def set_label(self):
         if (self.label or "").strip():
@@ -694,7 +670,8 @@ class WhatsAppMessage(Document):
 
     def after_insert(self):
         # Timeline entries are rendered directly from WhatsApp Message docs.
-        return
+        if self.type == "Outgoing" and self.status != "Queued" and self.message_id:
+            apply_pending_acks_after_commit(self.name, self.message_id)
 
     def on_update(self):
         self.update_profile_name()
@@ -753,7 +730,8 @@ class WhatsAppMessage(Document):
 
         self.set_whatsapp_account()
         if self.type == "Outgoing" and self.message_type != "Template" and not self.message_id:
-            if not _acquire_outgoing_dedup(self, ttl=60):
+            self.idempotency_key = idempotency.claim(*_outgoing_idempotency_parts(self))
+            if not self.idempotency_key:
                 self.status = "Skipped"
                 self.message_id = "dedup-skip"
                 self.create_whatsapp_profile()
@@ -827,12 +805,24 @@ class WhatsAppMessage(Document):
             try:
                 self.notify(data)
                 self.status = "Success"
+            except WhatsAppRateLimited:
+                # Nothing was sent; let the caller retry without tripping dedup.
+                idempotency.release(self.idempotency_key)
+                raise
             except Exception as e:
+                idempotency.release(self.idempotency_key)
                 self.status = "Failed"
-                frappe.throw(f"Failed to send message {str(e)}")
+                # Keep the transient type so queued callers can schedule a retry.
+                frappe.throw(
+                    f"Failed to send message {str(e)}",
+                    exc=EvolutionTransientError if is_transient(e) else frappe.ValidationError,
+                )
         elif self.type == "Outgoing" and self.message_type == "Template" and not self.message_id:
             self.send_template()
 
+        # Queued sends persist with db_update(), which skips validate.
+        self.set_normalized_message_id()
+        self.set_number_suffixes()
         self.create_whatsapp_profile()
 
     def send_template(self):
@@ -974,7 +964,18 @@ class WhatsAppMessage(Document):
             if button_parameters:
                 data['template']['components'].extend(button_parameters)
 
-        self.notify(data)
+        self.idempotency_key = idempotency.claim(*_outgoing_idempotency_parts(self), self.template_parameters)
+        if not self.idempotency_key:
+            self.status = "Skipped"
+            self.message_id = "dedup-skip"
+            return
+
+        try:
+            self.notify(data)
+        except Exception:
+            # Nothing was sent; let a retry claim the send again.
+            idempotency.release(self.idempotency_key)
+            raise
 
     def notify(self, data):
         """Notify."""
@@ -988,65 +989,75 @@ class WhatsAppMessage(Document):
             frappe.throw(_("Mobile number is required."))
 
         settings = get_evolution_settings(self.whatsapp_account)
-        provider = EvolutionProvider(settings)
+        item = self._evolution_send_item()
+        result = batch_send.send_many(settings, [item])[0]
+        self._apply_evolution_result(settings, item, result)
+
+    def _evolution_send_item(self):
+        """Return the ``batch_send`` item for this message, resolving its attachment."""
         to_number = format_number(self.to)
+        if not (self.content_type in ["document", "image", "video", "audio"] and self.attach):
+            return {"to_number": to_number, "message": self.message or ""}
 
-        if self.content_type in ["document", "image", "video", "audio"] and self.attach:
-            if self.attach.startswith("http"):
-                file_url = self.attach
-            else:
-                file_url = f"{frappe.utils.get_url()}{self.attach}"
-            media_bytes = None
-            media_filename = None
-
-            if (
-                self.content_type == "document"
-                and self.reference_doctype
-                and self.reference_name
-                and "download_pdf" in (self.attach or "")
-            ):
+        if self.attach.startswith("http"):
+            file_url = self.attach
+        else:
+            file_url = f"{frappe.utils.get_url()}{self.attach}"
+        media_bytes = None
+        media_filename = None
+
+        if (
+            self.content_type == "document"
+            and self.reference_doctype
+            and self.reference_name
+            and "download_pdf" in (self.attach or "")
+        ):
+            try:
+                resolved_print_format = (
+                    _extract_print_format_from_attach(self.attach)
+                    or _resolve_print_format(self.reference_doctype, None)
+                )
+                print_data = frappe.attach_print(
+                    self.reference_doctype,
+                    self.reference_name,
+                    print_format=resolved_print_format,
+                )
+                media_bytes = print_data.get("fcontent")
+                media_filename = print_data.get("fname")
+            except Exception:
+                media_bytes = None
+                media_filename = None
+                # If attach_print fails, try fetching the signed PDF internally
+                # so Evolution doesn't need to resolve local bench hostnames.
                 try:
-                    resolved_print_format = (
-                        _extract_print_format_from_attach(self.attach)
-                        or _resolve_print_format(self.reference_doctype, None)
-                    )
-                    print_data = frappe.attach_print(
-                        self.reference_doctype,
-                        self.reference_name,
-                        print_format=resolved_print_format,
-                    )
-                    media_bytes = print_data.get("fcontent")
-                    media_filename = print_data.get("fname")
+                    parsed = urlparse(file_url or "")
+                    urls_to_try = [file_url] if file_url else []
+                    if parsed.hostname and parsed.hostname.endswith(".local"):
+                        internal = parsed._replace(netloc="127.0.0.1:8000")
+                        urls_to_try.append(internal.geturl())
+
+                    for candidate in urls_to_try:
+                        resp = requests.get(candidate, timeout=20)
+                        resp.raise_for_status()
+                        if resp.content:
+                            media_bytes = resp.content
+                            media_filename = f"{self.reference_name or 'document'}.pdf"
+                            break
                 except Exception:
                     media_bytes = None
                     media_filename = None
-                    # If attach_print fails, try fetching the signed PDF internally
-                    # so Evolution doesn't need to resolve local bench hostnames.
-                    try:
-                        parsed = urlparse(file_url or "")
-                        urls_to_try = [file_url] if file_url else []
-                        if parsed.hostname and parsed.hostname.endswith(".local"):
-                            internal = parsed._replace(netloc="127.0.0.1:8000")
-                            urls_to_try.append(internal.geturl())
-
-                        for candidate in urls_to_try:
-                            resp = requests.get(candidate, timeout=20)
-                            resp.raise_for_status()
-                            if resp.content:
-                                media_bytes = resp.content
-                                media_filename = f"{self.reference_name or 'document'}.pdf"
-                                break
-                    except Exception:
-                        media_bytes = None
-                        media_filename = None
-
-            # For File attachments (/files or /private/files), upload bytes directly.
-            if (
-                not media_bytes
-                and self.attach
-                and isinstance(self.attach, str)
-                and (self.attach.startswith("/files/") or self.attach.startswith("/private/files/"))
-            ):
+
+        # For File attachments (/files or /private/files), upload bytes directly.
+        # Files on this bench are streamed from disk instead of being read into memory.
+        media_path = None
+        if (
+            not media_bytes
+            and self.attach
+            and isinstance(self.attach, str)
+            and (self.attach.startswith("/files/") or self.attach.startswith("/private/files/"))
+        ):
+            media_path = local_file_path(self.attach)
+            if not media_path:
                 try:
                     media_filename, content = get_file(self.attach)
                     media_bytes = content.encode() if isinstance(content, str) else content
@@ -1054,35 +1065,42 @@ class WhatsAppMessage(Document):
                     media_bytes = None
                     media_filename = None
 
-            # Prefer byte upload when available to avoid Evolution DNS issues on site1.local.
-            if media_bytes:
-                file_url = ""
+        # Prefer byte upload when available to avoid Evolution DNS issues on site1.local.
+        if media_bytes or media_path:
+            file_url = ""
+
+        return {
+            "to_number": to_number,
+            "media_url": file_url,
+            "media_type": self.content_type,
+            "caption": self.message or "",
+            "media_bytes": media_bytes,
+            "filename": media_filename,
+            "media_path": media_path,
+        }
+
+    def _apply_evolution_result(self, settings, item, result):
+        """Record a ``batch_send`` result for ``item``.
 
-            try:
-                response = provider.send_media(
-                    to_number=to_number,
-                    media_url=file_url,
-                    media_type=self.content_type,
-                    caption=self.message or "",
-                    media_bytes=media_bytes,
-                    filename=media_filename,
+        A failed attachment send falls back to a text message carrying the link
+        when the settings allow it; any other failure is raised.
+        """
+        if not result["ok"] and "message" not in item and not result.get("rate_limited") and not result.get("instance_down"):
+            error = result["error"]
+            is_dns_resolution_error = "enotfound" in error.lower()
+            if not self._allow_attachment_link_fallback() and not is_dns_resolution_error:
+                frappe.throw(
+                    _("Attachment send failed in File Only mode: {0}").format(error)
                 )
-            except Exception as e:
-                is_dns_resolution_error = "enotfound" in str(e).lower()
-                if not self._allow_attachment_link_fallback() and not is_dns_resolution_error:
-                    frappe.throw(
-                        _("Attachment send failed in File Only mode: {0}").format(str(e))
-                    )
-                fallback_text = self.message or ""
-                if file_url:
-                    fallback_text = (fallback_text + "\n\n" if fallback_text else "") + _("Attachment: {0}").format(file_url)
-                self.message = fallback_text
-                self.content_type = "text"
-                response = provider.send_message(to_number, fallback_text)
-        else:
-            response = provider.send_message(to_number, self.message or "")
-        self.message_id = _extract_response_message_id(response)
-        return
+            fallback_text = self.message or ""
+            if item.get("media_url"):
+                fallback_text = (fallback_text + "\n\n" if fallback_text else "") + _("Attachment: {0}").format(item["media_url"])
+            self.message = fallback_text
+            self.content_type = "text"
+            result = batch_send.send_many(settings, [{"to_number": item["to_number"], "message": fallback_text}])[0]
+        if not result["ok"]:
+            raise result["exception"]
+        self.message_id = _extract_response_message_id(result["response"])
 
     def format_number(self, number):
         """Format number."""
@@ -1106,6 +1124,8 @@ class WhatsAppMessage(Document):
 
 def on_doctype_update():
     frappe.db.add_index("WhatsApp Message", ["reference_doctype", "reference_name"])
+    frappe.db.add_index("WhatsApp Message", ["to_number_suffix", "creation"])
+    frappe.db.add_index("WhatsApp Message", ["from_number_suffix", "creation"])
 
 
 @frappe.whitelist()
@@ -1171,7 +1191,9 @@ def send_template_now(
     no_letterhead=0,
     whatsapp_account=None,
     queued_message_name=None,
+    attempt=1,
 ):
+    job_kwargs = dict(locals())
     _update_queue_status(queued_message_name, "Started")
     try:
         sent_doc = None
@@ -1204,19 +1226,6 @@ def send_template_now(
                 f"?doctype={reference_doctype}&name={reference_name}&format={fmt}&no_letterhead={frappe.utils.cint(no_letterhead)}&key={key}"
             )
 
-        if _recent_duplicate_exists(
-            reference_doctype=reference_doctype,
-            reference_name=reference_name,
-            to_number=to,
-            content_type="document" if send_attach else "text",
-            message=rendered_text,
-            attach=send_attach or "",
-            template=template,
-            exclude_name=queued_message_name,
-        ):
-            _update_queue_status(queued_message_name, "Skipped", details="Duplicate prevented")
-            return
-
         if not queued_message_name:
             # Fallback for old enqueued tasks without a reference name
             doc = frappe.get_doc({
@@ -1249,6 +1258,9 @@ def send_template_now(
             # Reset it and invoke send flow explicitly for existing docs.
             sent_doc.message_id = ""
             sent_doc.before_insert()
+            if sent_doc.status == "Skipped":
+                _update_queue_status(queued_message_name, "Skipped", details="Duplicate prevented")
+                return
             sent_doc.db_update()
         
         _update_queue_status(
@@ -1257,7 +1269,24 @@ def send_template_now(
             message_id=getattr(sent_doc, "message_id", None),
             details=getattr(sent_doc, "message", None),
         )
+    except WhatsAppRateLimited as e:
+        _update_queue_status(queued_message_name, "Queued")
+        defer(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.send_template_now",
+            delay=e.retry_after,
+            **job_kwargs,
+        )
+        return {"queued": True, "status": "Queued", "retry_after": e.retry_after}
     except Exception as e:
+        retry_kwargs = {k: v for k, v in job_kwargs.items() if k != "attempt"}
+        if schedule_retry(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.send_template_now",
+            e,
+            attempt=attempt,
+            **retry_kwargs,
+        ):
+            _update_queue_status(queued_message_name, "Queued")
+            return {"queued": True, "status": "Queued", "attempt": frappe.utils.cint(attempt) + 1}
         _update_queue_status(queued_message_name, "Failed", details=str(e))
         frappe.db.commit()
         if queued_message_name:
@@ -1324,7 +1353,9 @@ def send_custom_now(
     no_letterhead=0,
     whatsapp_account=None,
     queued_message_name=None,
+    attempt=1,
 ):
+    job_kwargs = dict(locals())
     _update_queue_status(queued_message_name, "Started")
     try:
         actual_content_type = content_type or "text"
@@ -1340,19 +1371,6 @@ def send_custom_now(
             )
             actual_content_type = "document"
 
-        if _recent_duplicate_exists(
-            reference_doctype=reference_doctype,
-            reference_name=reference_name,
-            to_number=to,
-            content_type=actual_content_type,
-            message=message or "",
-            attach=attach or "",
-            template=None,
-            exclude_name=queued_message_name,
-        ):
-            _update_queue_status(queued_message_name, "Skipped", details="Duplicate prevented")
-            return
-
         selected_account = _resolve_evolution_account(preferred_account=whatsapp_account)
 
         if not queued_message_name:
@@ -1387,6 +1405,9 @@ def send_custom_now(
             # Reset it and invoke send flow explicitly for existing docs.
             sent_doc.message_id = ""
             sent_doc.before_insert()
+            if sent_doc.status == "Skipped":
+                _update_queue_status(queued_message_name, "Skipped", details="Duplicate prevented")
+                return
             sent_doc.db_update()
 
         _update_queue_status(
@@ -1395,7 +1416,24 @@ def send_custom_now(
             message_id=getattr(sent_doc, "message_id", None),
             details=getattr(sent_doc, "message", None),
         )
+    except WhatsAppRateLimited as e:
+        _update_queue_status(queued_message_name, "Queued")
+        defer(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.send_custom_now",
+            delay=e.retry_after,
+            **job_kwargs,
+        )
+        return {"queued": True, "status": "Queued", "retry_after": e.retry_after}
     except Exception as e:
+        retry_kwargs = {k: v for k, v in job_kwargs.items() if k != "attempt"}
+        if schedule_retry(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.send_custom_now",
+            e,
+            attempt=attempt,
+            **retry_kwargs,
+        ):
+            _update_queue_status(queued_message_name, "Queued")
+            return {"queued": True, "status": "Queued", "attempt": frappe.utils.cint(attempt) + 1}
         _update_queue_status(queued_message_name, "Failed", details=str(e))
         frappe.db.commit()
         if queued_message_name:
@@ -1404,6 +1442,44 @@ def send_custom_now(
         raise
 
 
+def retry_message(message_name, attempt=1):
+    """Re-send an existing outgoing message (transient-failure retries, Bulk retry_failed)."""
+    if not frappe.db.exists("WhatsApp Message", message_name):
+        return
+    doc = frappe.get_doc("WhatsApp Message", message_name)
+    if doc.type != "Outgoing" or doc.status in ("Success", "Skipped"):
+        return
+
+    _update_queue_status(message_name, "Started")
+    try:
+        doc.message_id = ""
+        doc.status = "Started"
+        doc.before_insert()
+        if doc.status == "Skipped":
+            _update_queue_status(message_name, "Skipped")
+            return
+        doc.db_update()
+    except WhatsAppRateLimited as e:
+        _update_queue_status(message_name, "Queued")
+        defer(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.retry_message",
+            delay=e.retry_after,
+            message_name=message_name,
+            attempt=attempt,
+        )
+    except Exception as e:
+        if schedule_retry(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_message.whatsapp_message.retry_message",
+            e,
+            attempt=attempt,
+            message_name=message_name,
+        ):
+            _update_queue_status(message_name, "Queued")
+            return
+        _update_queue_status(message_name, "Failed")
+        frappe.log_error(frappe.get_traceback(), "WhatsApp Message Retry Failed")
+
+
 @frappe.whitelist()
 def get_template_preview(template, reference_doctype=None, reference_name=None, body_param=None):
     template_doc = frappe.get_doc("WhatsApp Templates", template)
@@ -1465,8 +1541,8 @@ def get_linked_contacts_query(doctype, txt, searchfield, start, page_len, filter
         return []
 
     # Get WhatsApp tick fields dynamically
-    from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification import _get_tick_fields
-    tick_fields = _get_tick_fields(purpose="whatsapp")
+    from whatsapp_evolution.utils.contact_numbers import get_tick_fields
+    tick_fields = get_tick_fields(purpose="whatsapp")
     if not tick_fields:
         return []
     tick_condition = "and (" + " or ".join([f"ifnull(cp.{tf}, 0) = 1" for tf in tick_fields]) + ")"
@@ -1501,32 +1577,16 @@ def get_linked_contacts_query(doctype, txt, searchfield, start, page_len, filter
 @frappe.whitelist()
 def get_authorized_whatsapp_numbers(reference_doctype, reference_name, primary_only=0):
     from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification import (
-        _get_dynamic_link_contact_numbers,
-        _get_contact_numbers,
+        _get_links_numbers,
     )
-    primary_only = frappe.utils.cint(primary_only)
-    
-    # 1. Direct Dynamic Links (strict)
-    numbers = _get_dynamic_link_contact_numbers(
-        reference_doctype,
-        reference_name,
-        purpose="whatsapp",
-        primary_only=primary_only,
-    )
-    
-    # 2. Check document fields if it's a Contact
-    if reference_doctype == "Contact":
-        numbers.extend(
-            _get_contact_numbers(
-                reference_name,
-                purpose="whatsapp",
-                primary_only=primary_only,
-            )
-        )
 
-    # Return deduped list
-    from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification import _dedupe_numbers
-    return _dedupe_numbers(numbers)
+    # Contacts linked to the document, or the Contact itself, from one query.
+    link = (reference_doctype, reference_name)
+    return _get_links_numbers(
+        [link],
+        purpose="whatsapp",
+        primary_only=frappe.utils.cint(primary_only),
+    ).get(link, [])
 
 
 def _collect_reference_links(reference_doctype, reference_name):
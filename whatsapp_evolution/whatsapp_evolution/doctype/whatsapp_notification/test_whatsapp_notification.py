@@ -167,10 +167,9 @@ class TestWhatsAppNotification(IntegrationTestCase):
         cached = frappe.cache().get_value("whatsapp_notification_map")
         self.assertFalse(cached)
 
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._was_recently_sent", return_value=False)
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._acquire_notification_dedup", return_value=True)
+    @patch("whatsapp_evolution.utils.idempotency.claim", return_value="test-idempotency-key")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
-    def test_send_template_message(self, mock_send, _mock_dedup, _mock_recent):
+    def test_send_template_message(self, mock_send, _mock_claim):
         """Test send_template_message sends correct data."""
         mock_send.return_value = {"id": "wamid.notif_test_1"}
 
@@ -190,10 +189,9 @@ class TestWhatsAppNotification(IntegrationTestCase):
         self.assertEqual(mock_send.call_args.args[0], "919900112233")
         self.assertIn("Hello", mock_send.call_args.args[1])
 
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._was_recently_sent", return_value=False)
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._acquire_notification_dedup", return_value=True)
+    @patch("whatsapp_evolution.utils.idempotency.claim", return_value="test-idempotency-key")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
-    def test_send_template_message_without_field_name_uses_auto_resolution(self, mock_send, _mock_dedup, _mock_recent):
+    def test_send_template_message_without_field_name_uses_auto_resolution(self, mock_send, _mock_claim):
         """Test auto-recipient resolution when field_name is left blank."""
         mock_send.return_value = {"id": "wamid.notif_auto_1"}
 
@@ -210,10 +208,9 @@ class TestWhatsAppNotification(IntegrationTestCase):
         self.assertTrue(mock_send.called)
         self.assertEqual(mock_send.call_args.args[0], "919900112234")
 
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._was_recently_sent", return_value=False)
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._acquire_notification_dedup", return_value=True)
+    @patch("whatsapp_evolution.utils.idempotency.claim", return_value="test-idempotency-key")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
-    def test_send_template_message_with_condition(self, mock_send, _mock_dedup, _mock_recent):
+    def test_send_template_message_with_condition(self, mock_send, _mock_claim):
         """Test that condition evaluation works."""
         mock_send.return_value = {"id": "wamid.notif_cond_1"}
 
@@ -246,10 +243,10 @@ class TestWhatsAppNotification(IntegrationTestCase):
 
         self.assertFalse(mock_send.called)
 
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.frappe.enqueue")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.defer")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
-    def test_send_template_message_with_delay_enqueues_job(self, mock_send, mock_enqueue):
-        """Test delayed notifications are queued and not sent inline."""
+    def test_send_template_message_with_delay_enqueues_job(self, mock_send, mock_defer):
+        """Test delayed notifications are deferred and not sent inline."""
         doc = self._make_notification(
             notification_name="Test Notif Delayed",
             field_name="mobile_no",
@@ -261,22 +258,18 @@ class TestWhatsAppNotification(IntegrationTestCase):
         doc.send_template_message(user)
 
         self.assertFalse(mock_send.called)
-        self.assertTrue(mock_enqueue.called)
-        enqueue_kwargs = mock_enqueue.call_args.kwargs
-        self.assertEqual(
-            enqueue_kwargs.get("queue"),
-            "short",
-        )
-        self.assertEqual(enqueue_kwargs.get("notification_name"), doc.name)
-        self.assertEqual(enqueue_kwargs.get("reference_doctype"), "User")
-        self.assertEqual(enqueue_kwargs.get("reference_name"), "Administrator")
-        self.assertEqual(enqueue_kwargs.get("delay_seconds"), 5)
-
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.sleep")
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._was_recently_sent", return_value=False)
-    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification._acquire_notification_dedup", return_value=True)
+        self.assertTrue(mock_defer.called)
+        defer_kwargs = mock_defer.call_args.kwargs
+        self.assertEqual(defer_kwargs.get("queue"), "short")
+        self.assertEqual(defer_kwargs.get("delay"), 5)
+        self.assertEqual(defer_kwargs.get("notification_name"), doc.name)
+        self.assertEqual(defer_kwargs.get("reference_doctype"), "User")
+        self.assertEqual(defer_kwargs.get("reference_name"), "Administrator")
+        self.assertNotIn("delay_seconds", defer_kwargs)
+
+    @patch("whatsapp_evolution.utils.idempotency.claim", return_value="test-idempotency-key")
     @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
-    def test_send_template_message_job(self, mock_send, _mock_dedup, _mock_recent, mock_sleep):
+    def test_send_template_message_job(self, mock_send, _mock_claim):
         """Test background delayed worker sends notification."""
         mock_send.return_value = {"id": "wamid.notif_delay_1"}
 
@@ -297,12 +290,50 @@ class TestWhatsAppNotification(IntegrationTestCase):
             notification_name=doc.name,
             reference_doctype="User",
             reference_name="Administrator",
-            delay_seconds=10,
         )
 
-        self.assertTrue(mock_sleep.called)
         self.assertTrue(mock_send.called)
 
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.defer")
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.EvolutionProvider.send_message")
+    def test_legacy_delayed_job_is_rescheduled(self, mock_send, mock_defer):
+        """Test jobs queued with delay_seconds are deferred instead of sleeping."""
+        from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification import (
+            send_template_message_job,
+        )
+
+        send_template_message_job(
+            notification_name="Test Notif Legacy",
+            reference_doctype="User",
+            reference_name="Administrator",
+            delay_seconds=10,
+        )
+
+        self.assertFalse(mock_send.called)
+        self.assertEqual(mock_defer.call_args.kwargs.get("delay"), 10)
+        self.assertNotIn("delay_seconds", mock_defer.call_args.kwargs)
+
+    @patch("whatsapp_evolution.utils.idempotency.release")
+    @patch("whatsapp_evolution.utils.idempotency.claim", side_effect=["key-1", None, "key-3"])
+    @patch("whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.defer")
+    def test_simple_template_claims_each_contact(self, mock_defer, _mock_claim, mock_release):
+        """Test simple template sends skip claimed contacts and defer the rest when rate limited."""
+        from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
+
+        doc = self._make_notification(notification_name="Test Notif Simple")
+        doc._contact_list = ["919900112201", "919900112202", "919900112203", "919900112204"]
+        template = frappe.db.get_value("WhatsApp Templates", doc.template, fieldname="*")
+
+        with patch.object(type(doc), "notify", side_effect=[None, WhatsAppRateLimited(retry_after=7)]) as notify:
+            doc.send_simple_template(template)
+
+        self.assertEqual(notify.call_count, 2)
+        self.assertEqual(notify.call_args_list[0].kwargs["idempotency_key"], "key-1")
+        mock_release.assert_called_once_with("key-3")
+        defer_kwargs = mock_defer.call_args.kwargs
+        self.assertEqual(defer_kwargs["delay"], 7)
+        self.assertEqual(defer_kwargs["contact_list"], ["919900112203", "919900112204"])
+
     def test_disabled_notification_does_not_send(self):
         """Test that disabled notification does not trigger."""
         doc = self._make_notification(
@@ -330,3 +361,38 @@ class TestWhatsAppNotification(IntegrationTestCase):
         doc.insert(ignore_permissions=True)
         self.assertEqual(doc.notification_type, "Scheduler Event")
         self.assertEqual(doc.event_frequency, "Daily")
+
+    def test_recipient_plan_is_cached_per_version(self):
+        """Test the recipient plan is built once and rebuilt after the notification changes."""
+        from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification import whatsapp_notification
+
+        doc = self._make_notification(notification_name="Test Notif Recipient Plan")
+        user = frappe.get_doc("User", "Administrator")
+
+        with patch.object(
+            whatsapp_notification,
+            "_build_recipient_plan",
+            wraps=whatsapp_notification._build_recipient_plan,
+        ) as build:
+            doc.get_recipient_numbers(user, user.as_dict())
+            doc.get_recipient_numbers(user, user.as_dict())
+            self.assertEqual(build.call_count, 1)
+
+            doc.field_name = "phone"
+            doc.save(ignore_permissions=True)
+            plan = whatsapp_notification._get_recipient_plan(doc)
+            self.assertEqual(build.call_count, 2)
+            self.assertEqual(plan.field_name, "phone")
+
+    def test_recipient_value_naming_a_contact_is_not_resolved_as_party(self):
+        """Test a value that names both a Contact and a Customer only reaches the Contact."""
+        from whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification import whatsapp_notification
+
+        batch = whatsapp_notification._RecipientBatch()
+        batch.add_candidate("Jane Doe", link_doctypes=("Customer",))
+        with patch.object(whatsapp_notification, "_existing_names", return_value={"Jane Doe"}), patch.object(
+            whatsapp_notification, "_get_links_numbers", return_value={}
+        ) as get_links_numbers:
+            batch.resolve()
+
+        self.assertEqual(get_links_numbers.call_args.args[0], [("Contact", "Jane Doe")])
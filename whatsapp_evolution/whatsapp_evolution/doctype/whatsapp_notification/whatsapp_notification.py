@@ -2,8 +2,9 @@
 
 import json
 import re
+from contextlib import ExitStack
+
 import frappe
-from time import sleep
 
 from frappe import _dict, _
 from frappe.model.document import Document
@@ -11,20 +12,28 @@ from frappe.utils.safe_exec import get_safe_globals, safe_exec
 from frappe.integrations.utils import make_post_request  # Backward-compat for legacy tests that patch this symbol.
 from frappe.desk.form.utils import get_pdf_link
 from frappe.utils import add_to_date, nowdate, datetime
-from frappe.utils.synchronization import filelock
 from frappe.utils.file_lock import LockTimeoutError
 
 from whatsapp_evolution.utils import (
+    clear_notifications_map,
     get_whatsapp_account,
     format_number,
     get_evolution_settings,
     is_evolution_enabled,
 )
-from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider
+from whatsapp_evolution.utils import batch_send, conditions, contact_numbers, idempotency
+from whatsapp_evolution.utils.contact_numbers import get_tick_fields as _get_tick_fields
+from whatsapp_evolution.utils.deferred import defer
+from whatsapp_evolution.utils.rate_limit import WhatsAppRateLimited
+from whatsapp_evolution.utils.redis_lock import redis_lock
+from whatsapp_evolution.whatsapp_evolution.providers import EvolutionProvider  # Tests patch the provider through this symbol.
+from whatsapp_evolution.whatsapp_evolution.providers.media_stream import spool_bytes
 
 
 LEDGER_BALANCE_ALIASES = {"ledger_balance", "_ledger_balance", "ledger balance"}
 ITEMS_TEXT_ALIASES = {"custom_wa_items", "wa_items", "items_list", "invoice_items_list"}
+# A recipient's send lock outlives slow media sends; a crashed holder blocks for at most this long.
+SEND_LOCK_LEASE_MS = 5 * 60 * 1000
 
 
 def _is_evolution_enabled(whatsapp_account=None):
@@ -79,6 +88,7 @@ def _should_retry_on_default_account(error_message):
         "does not exist" in text
         or "sessionerror" in text
         or "no sessions" in text
+        or "disconnected" in text
     )
 
 
@@ -132,18 +142,11 @@ def _dedupe_numbers(numbers):
     return out
 
 
-def _is_primary_phone_row(row):
-    if not row:
-        return False
-    return any(
-        frappe.utils.cint(row.get(flag))
-        for flag in (
-            "is_primary_mobile_no",
-            "is_primary_mobile",
-            "is_primary_phone",
-            "is_primary",
-        )
-    )
+PARTY_LINK_DOCTYPES = ("Customer", "Supplier", "Lead", "Prospect")
+# Recipient plans per (site, notification, modified); bounded like the condition cache.
+MAX_RECIPIENT_PLANS = 256
+
+_recipient_plans = {}
 
 
 def _resolve_print_format(doctype_name, selected_print_format=None):
@@ -166,33 +169,6 @@ def _resolve_print_format(doctype_name, selected_print_format=None):
     return default_format or "Standard"
 
 
-def _get_tick_fields(purpose="notification"):
-    """
-    Find fields in Contact Phone that match the requested purpose.
-    purpose='notification' -> fields containing 'notification'
-    purpose='whatsapp' -> fields containing 'whatsapp'
-    """
-    meta = frappe.get_meta("Contact Phone")
-    tick_fields = []
-    search_term = purpose.lower()
-    
-    for field in meta.fields:
-        if field.fieldtype == "Check" and search_term in field.fieldname.lower():
-            tick_fields.append(field.fieldname)
-            
-    # Fallbacks for standard naming
-    if purpose == "whatsapp":
-        for default_field in ("is_whatsapp_number", "is_whatsapp", "whatsapp"):
-            if meta.get_field(default_field) and default_field not in tick_fields:
-                tick_fields.append(default_field)
-    elif purpose == "notification":
-        for default_field in ("is_notification_number", "is_notification", "notification"):
-            if meta.get_field(default_field) and default_field not in tick_fields:
-                tick_fields.append(default_field)
-
-    return tick_fields
-
-
 @frappe.whitelist()
 def get_contact_whatsapp_numbers(contact_name, primary_only=0):
     return _get_contact_numbers(
@@ -202,56 +178,42 @@ def get_contact_whatsapp_numbers(contact_name, primary_only=0):
     )
 
 
-def _get_contact_numbers(contact_name, purpose="notification", primary_only=False):
-    if not contact_name or not frappe.db.exists("Contact", contact_name):
-        return []
+def _numbers_from_phone_rows(rows, primary_only=False):
+    """Consented numbers from Contact phone rows, each Contact's primary numbers first."""
+    by_contact = {}
+    for row in rows or []:
+        if not row.ticked:
+            continue
+        primary, secondary = by_contact.setdefault(row.contact, ([], []))
+        (primary if row.is_primary else secondary).extend(_split_candidate_numbers(row.phone))
+
+    numbers = []
+    for primary, secondary in by_contact.values():
+        numbers.extend(primary if primary_only else primary + secondary)
+    return _dedupe_numbers(numbers)
+
 
-    contact = frappe.get_doc("Contact", contact_name)
-    phone_rows = contact.get("phone_nos") or []
+def _get_links_numbers(links, purpose="notification", primary_only=False):
+    """Return ``{(link_doctype, link_name): numbers}`` for many Contacts and linked documents."""
     tick_fields = _get_tick_fields(purpose=purpose)
+    if not tick_fields:
+        # Enforce explicit consent-only behavior.
+        return {}
 
-    numbers = []
-    if tick_fields:
-        primary_numbers = []
-        secondary_numbers = []
-        for row in phone_rows:
-            if any(frappe.utils.cint(row.get(tf)) for tf in tick_fields):
-                row_numbers = _split_candidate_numbers(row.get("phone"))
-                if _is_primary_phone_row(row):
-                    primary_numbers.extend(row_numbers)
-                else:
-                    secondary_numbers.extend(row_numbers)
-        if primary_only:
-            return _dedupe_numbers(primary_numbers)
-        return _dedupe_numbers(primary_numbers + secondary_numbers)
+    return {
+        link: _numbers_from_phone_rows(rows, primary_only=primary_only)
+        for link, rows in contact_numbers.get_phone_rows(links, tick_fields).items()
+    }
 
-    # Enforce explicit consent-only behavior.
-    return []
 
+def _get_contact_numbers(contact_name, purpose="notification", primary_only=False):
+    link = ("Contact", contact_name)
+    return _get_links_numbers([link], purpose=purpose, primary_only=primary_only).get(link, [])
 
-def _get_dynamic_link_contact_numbers(link_doctype, link_name, purpose="notification", primary_only=False):
-    if not link_doctype or not link_name:
-        return []
 
-    contact_names = frappe.get_all(
-        "Dynamic Link",
-        filters={
-            "link_doctype": link_doctype,
-            "link_name": link_name,
-            "parenttype": "Contact",
-        },
-        pluck="parent",
-    )
-    numbers = []
-    for contact_name in contact_names:
-        numbers.extend(
-            _get_contact_numbers(
-                contact_name,
-                purpose=purpose,
-                primary_only=primary_only,
-            )
-        )
-    return _dedupe_numbers(numbers)
+def _get_dynamic_link_contact_numbers(link_doctype, link_name, purpose="notification", primary_only=False):
+    link = (link_doctype, link_name)
+    return _get_links_numbers([link], purpose=purpose, primary_only=primary_only).get(link, [])
 
 
 def _get_employee_fallback_numbers(employee_name):
@@ -308,35 +270,154 @@ def _is_party_recipient_role(role_name):
 
 
 def _get_party_role_numbers(doc_data, role_name):
-    numbers = []
-    candidates = set()
+    batch = _RecipientBatch()
+    batch.add_party_role(doc_data, role_name)
+    return _dedupe_numbers(batch.resolve())
 
-    if role_name == "Contact":
-        for field in ("contact_person", "contact", "supplier_contact", "customer_contact"):
-            value = doc_data.get(field)
-            if value:
-                candidates.add(value)
-    else:
-        # Standard direct link field (customer/supplier/lead/prospect)
-        value = doc_data.get(role_name.lower())
+
+def _existing_names(doctype, names):
+    names = sorted({name for name in names if name and isinstance(name, str)})
+    if not names:
+        return set()
+    return set(frappe.get_all(doctype, filters={"name": ("in", names)}, pluck="name"))
+
+
+class _RecipientBatch:
+    """Collects recipient targets for one document and resolves them together.
+
+    Contacts, party links and values that may name a Contact or party are
+    queued first; existence checks run as one IN query per DocType and all
+    phone rows come from one Dynamic Link/Contact Phone join.
+    """
+
+    def __init__(self, purpose="notification"):
+        self.purpose = purpose
+        self.targets = []
+
+    def add_numbers(self, value):
+        self.targets.append(("numbers", _split_candidate_numbers(value)))
+
+    def add_contact(self, contact_name):
+        # Unknown names simply have no Contact Phone rows.
+        if contact_name:
+            self.targets.append(("contact", contact_name))
+
+    def add_link(self, link_doctype, link_name):
+        if link_doctype and link_name:
+            self.targets.append(("link", (link_doctype, link_name)))
+
+    def add_candidate(self, value, link_doctypes=()):
+        """The Contact named ``value`` if it exists, else ``value`` as a phone number,
+        else the Contacts linked to the first of ``link_doctypes`` with a record named ``value``."""
         if value:
-            candidates.add(value)
-        # Generic party_type/party mapping (e.g. Payment Entry / Journal Entry flows)
-        if doc_data.get("party_type") == role_name and doc_data.get("party"):
-            candidates.add(doc_data.get("party"))
+            self.targets.append(("candidate", (value, tuple(link_doctypes))))
 
-    for name in candidates:
+    def add_party_role(self, doc_data, role_name):
         if role_name == "Contact":
-            numbers.extend(_get_contact_numbers(name, purpose="notification"))
-        else:
-            numbers.extend(
-                _get_dynamic_link_contact_numbers(
-                    role_name,
-                    name,
-                    purpose="notification",
-                )
+            for field in ("contact_person", "contact", "supplier_contact", "customer_contact"):
+                self.add_contact(doc_data.get(field))
+            return
+
+        # Standard direct link field (customer/supplier/lead/prospect)
+        self.add_link(role_name, doc_data.get(role_name.lower()))
+        # Generic party_type/party mapping (e.g. Payment Entry / Journal Entry flows)
+        if doc_data.get("party_type") == role_name:
+            self.add_link(role_name, doc_data.get("party"))
+
+    def _classify(self):
+        candidates = [value for kind, value in self.targets if kind == "candidate"]
+        contacts = _existing_names("Contact", (value for value, _ in candidates))
+        # Only values that are neither a Contact nor a phone number are looked up as parties.
+        parties = [
+            (value, doctypes)
+            for value, doctypes in candidates
+            if doctypes and value not in contacts and not _looks_like_phone(value)
+        ]
+        existing = {
+            doctype: _existing_names(doctype, (value for value, doctypes in parties if doctype in doctypes))
+            for doctype in {doctype for _, doctypes in parties for doctype in doctypes}
+        }
+
+        targets = []
+        for kind, value in self.targets:
+            if kind != "candidate":
+                targets.append((kind, value))
+                continue
+            name, doctypes = value
+            if name in contacts:
+                targets.append(("contact", name))
+            elif _looks_like_phone(name):
+                targets.append(("numbers", _split_candidate_numbers(name)))
+            else:
+                doctype = next((dt for dt in doctypes if name in existing.get(dt, ())), None)
+                if doctype:
+                    targets.append(("link", (doctype, name)))
+        return targets
+
+    def resolve(self):
+        targets = [
+            ("link", ("Contact", value)) if kind == "contact" else (kind, value)
+            for kind, value in self._classify()
+        ]
+        link_numbers = _get_links_numbers(
+            [value for kind, value in targets if kind == "link"],
+            purpose=self.purpose,
+        )
+
+        numbers = []
+        for kind, value in targets:
+            numbers.extend(value if kind == "numbers" else link_numbers.get(value, []))
+        return numbers
+
+
+def _party_link_doctypes():
+    # Installed party DocTypes, checked once per request or job.
+    doctypes = getattr(frappe.local, "whatsapp_party_link_doctypes", None)
+    if doctypes is None:
+        doctypes = tuple(dt for dt in PARTY_LINK_DOCTYPES if frappe.db.exists("DocType", dt))
+        frappe.local.whatsapp_party_link_doctypes = doctypes
+    return doctypes
+
+
+def _get_recipient_plan(notification):
+    if notification.is_new():
+        return _build_recipient_plan(notification)
+
+    key = (frappe.local.site, notification.name, str(notification.modified))
+    plan = _recipient_plans.get(key)
+    if plan is None:
+        if len(_recipient_plans) >= MAX_RECIPIENT_PLANS:
+            _recipient_plans.clear()
+        # A newer ``modified`` replaces the notification's previous plan.
+        for stale in [k for k in _recipient_plans if k[:2] == key[:2]]:
+            del _recipient_plans[stale]
+        plan = _recipient_plans[key] = _build_recipient_plan(notification)
+    return plan
+
+
+def _build_recipient_plan(notification):
+    """Parse the notification's recipient rows once per notification version.
+
+    Nothing here depends on DocType meta: whether a field links to User is
+    checked when the plan runs, so customizing a field takes effect at once.
+    """
+    recipients = []
+    for row in notification.get("recipients") or []:
+        role_name = row.get("receiver_by_role")
+        is_party_role = bool(role_name) and _is_party_recipient_role(role_name)
+        recipients.append(
+            frappe._dict(
+                condition=row.get("condition"),
+                fieldname=row.get("receiver_by_document_field"),
+                party_role=role_name if is_party_role else None,
+                role=role_name if role_name and not is_party_role else None,
             )
-    return _dedupe_numbers(numbers)
+        )
+    return frappe._dict(
+        field_name=notification.field_name,
+        recipients=recipients,
+        send_to_all_assignees=bool(notification.get("send_to_all_assignees")),
+    )
 
 
 def _get_ledger_balance_value(doc):
@@ -462,43 +543,6 @@ def _get_items_text_value(doc):
     return "\n".join(chunks)
 
 
-def _was_recently_sent(reference_doctype, reference_name, to_number, template_name, seconds=90):
-    if not (reference_doctype and reference_name and to_number):
-        return False
-    rows = frappe.db.sql(
-        """
-        select name
-        from `tabWhatsApp Message`
-        where reference_doctype=%s
-          and reference_name=%s
-          and `to`=%s
-          and ifnull(template, '')=%s
-          and creation >= (now() - interval %s second)
-          and ifnull(status, '') in ('Queued', 'Started', 'Success')
-        limit 1
-        """,
-        (reference_doctype, reference_name, to_number, template_name or "", seconds),
-        as_dict=True,
-    )
-    return bool(rows)
-
-
-def _notification_dedup_key(notification_name, reference_doctype, reference_name, to_number, template_name):
-    return (
-        f"wa_notif_dedup:{notification_name}:{reference_doctype}:{reference_name}:"
-        f"{to_number}:{template_name}"
-    )
-
-
-def _acquire_notification_dedup(notification_name, reference_doctype, reference_name, to_number, template_name, ttl=180):
-    key = _notification_dedup_key(notification_name, reference_doctype, reference_name, to_number, template_name)
-    cache = frappe.cache()
-    if cache.get_value(key):
-        return False
-    cache.set_value(key, 1, expires_in_sec=ttl)
-    return True
-
-
 class WhatsAppNotification(Document):
     """Notification."""
 
@@ -556,10 +600,20 @@ class WhatsAppNotification(Document):
 
     def send_simple_template(self, template):
         """ send simple template without a doc to get field data """
-        for contact in self._contact_list:
+        contacts = list(self._contact_list)
+        for index, contact in enumerate(contacts):
+            formatted_to = self.format_number(contact)
+            idempotency_key = idempotency.claim(self.name, formatted_to, template.name, ttl=180)
+            if not idempotency_key:
+                _insert_notification_log(
+                    self.template,
+                    error=f"Skipped duplicate notification for {formatted_to}",
+                )
+                continue
+
             data = {
                 "messaging_product": "whatsapp",
-                "to": self.format_number(contact),
+                "to": formatted_to,
                 "type": "template",
                 "template": {
                     "name": template.actual_name,
@@ -569,7 +623,18 @@ class WhatsAppNotification(Document):
                     "components": []
                 }
             }
-            self.notify(data, template_account=template.get("whatsapp_account"))
+            try:
+                self.notify(data, template_account=template.get("whatsapp_account"), idempotency_key=idempotency_key)
+            except WhatsAppRateLimited as e:
+                # Resume with this and the remaining contacts once the bucket has refilled.
+                idempotency.release(idempotency_key)
+                defer(
+                    "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.send_simple_template_job",
+                    delay=e.retry_after,
+                    notification_name=self.name,
+                    contact_list=contacts[index:],
+                )
+                return
 
 
     def send_template_message(
@@ -579,6 +644,7 @@ class WhatsAppNotification(Document):
         default_template=None,
         ignore_condition=False,
         from_queue=False,
+        recipient_numbers=None,
     ):
         """Specific to Document Event triggered Server Scripts."""
         if self.disabled:
@@ -587,31 +653,30 @@ class WhatsAppNotification(Document):
         doc_data = doc.as_dict()
         if self.condition and not ignore_condition:
             # check if condition satisfies
-            if not frappe.safe_eval(
-                self.condition, get_safe_globals(), dict(doc=doc_data)
-            ):
+            if not conditions.evaluate(self.condition, doc_data, owner=self):
                 return
 
         delay_seconds = frappe.utils.cint(self.get("delay_seconds") or 0)
         if delay_seconds > 0 and not from_queue:
-            frappe.enqueue(
+            defer(
                 "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.send_template_message_job",
+                delay=delay_seconds,
                 queue="short",
-                enqueue_after_commit=True,
                 notification_name=self.name,
                 reference_doctype=doc_data.get("doctype"),
                 reference_name=doc_data.get("name"),
                 phone_no=phone_no,
                 default_template_name=getattr(default_template, "name", None),
                 ignore_condition=ignore_condition,
-                delay_seconds=delay_seconds,
+                recipient_numbers=recipient_numbers,
             )
             return
 
-        template = default_template or frappe.get_doc("WhatsApp Templates", self.template)
+        template = default_template or frappe.get_cached_doc("WhatsApp Templates", self.template)
 
         if template:
-            recipient_numbers = self.get_recipient_numbers(doc, doc_data, phone_no)
+            if not recipient_numbers:
+                recipient_numbers = self.get_recipient_numbers(doc, doc_data, phone_no)
             if not recipient_numbers:
                 _insert_notification_log(
                     self.template,
@@ -670,39 +735,11 @@ class WhatsAppNotification(Document):
                     f"{formatted_to}:{template.name}"
                 )
                 try:
-                    with filelock(lock_key, timeout=10):
-                        if not _acquire_notification_dedup(
-                            notification_name=self.name,
-                            reference_doctype=doc_data.get("doctype"),
-                            reference_name=doc_data.get("name"),
-                            to_number=formatted_to,
-                            template_name=template.name,
-                            ttl=180,
-                        ):
-                            _insert_notification_log(
-                                self.template,
-                                error=(
-                                    f"Skipped duplicate notification for {formatted_to} on "
-                                    f"{doc_data.get('doctype')} {doc_data.get('name')}"
-                                ),
-                            )
-                            continue
-
-                        if _was_recently_sent(
-                            reference_doctype=doc_data.get("doctype"),
-                            reference_name=doc_data.get("name"),
-                            to_number=formatted_to,
-                            template_name=template.name,
-                            seconds=120,
-                        ):
-                            _insert_notification_log(
-                                self.template,
-                                error=(
-                                    f"Skipped recent duplicate (120s) for {formatted_to} on "
-                                    f"{doc_data.get('doctype')} {doc_data.get('name')}"
-                                ),
-                            )
-                            continue
+                    # Held across the send so a concurrent duplicate waits for its outcome.
+                    with redis_lock(lock_key, timeout=10, lease_ms=SEND_LOCK_LEASE_MS):
+                        self._send_to_recipient(
+                            doc, doc_data, template, formatted_to, parameters, attachment_url, attachment_filename
+                        )
                 except LockTimeoutError:
                     _insert_notification_log(
                         self.template,
@@ -711,162 +748,176 @@ class WhatsAppNotification(Document):
                             f"{doc_data.get('doctype')} {doc_data.get('name')}"
                         ),
                     )
-                    continue
 
-                data = {
-                    "messaging_product": "whatsapp",
-                    "to": formatted_to,
-                    "type": "template",
-                    "template": {
-                        "name": template.actual_name,
-                        "language": {
-                            "code": template.language_code
-                        },
-                        "components": []
-                    }
-                }
+    def _send_to_recipient(self, doc, doc_data, template, formatted_to, parameters, attachment_url, attachment_filename):
+        """Claim and send the notification for one recipient.
 
-                if parameters:
-                    data["template"]["components"].append(
-                        {
-                            "type": "body",
-                            "parameters": parameters
-                        }
-                    )
+        ``idempotency.claim`` guarantees the send happens once: its ``SET NX``
+        is atomic across nodes, and the claim is only released when the send
+        was deferred by the rate limiter.
+        """
+        idempotency_key = idempotency.claim(
+            self.name,
+            doc_data.get("doctype"),
+            doc_data.get("name"),
+            formatted_to,
+            template.name,
+            ttl=180,
+        )
+        if not idempotency_key:
+            _insert_notification_log(
+                self.template,
+                error=(
+                    f"Skipped duplicate notification for {formatted_to} on "
+                    f"{doc_data.get('doctype')} {doc_data.get('name')}"
+                ),
+            )
+            return
+
+        data = {
+            "messaging_product": "whatsapp",
+            "to": formatted_to,
+            "type": "template",
+            "template": {
+                "name": template.actual_name,
+                "language": {
+                    "code": template.language_code
+                },
+                "components": []
+            }
+        }
+
+        if parameters:
+            data["template"]["components"].append(
+                {
+                    "type": "body",
+                    "parameters": parameters
+                }
+            )
 
-                if template.header_type == "DOCUMENT" and attachment_url:
-                    data["template"]["components"].append(
+        if template.header_type == "DOCUMENT" and attachment_url:
+            data["template"]["components"].append(
+                {
+                    "type": "header",
+                    "parameters": [
                         {
-                            "type": "header",
-                            "parameters": [
-                                {
-                                    "type": "document",
-                                    "document": {
-                                        "link": attachment_url,
-                                        "filename": attachment_filename,
-                                    },
-                                }
-                            ],
+                            "type": "document",
+                            "document": {
+                                "link": attachment_url,
+                                "filename": attachment_filename,
+                            },
                         }
-                    )
-                elif template.header_type == "IMAGE" and attachment_url:
-                    data["template"]["components"].append(
+                    ],
+                }
+            )
+        elif template.header_type == "IMAGE" and attachment_url:
+            data["template"]["components"].append(
+                {
+                    "type": "header",
+                    "parameters": [
                         {
-                            "type": "header",
-                            "parameters": [
-                                {
-                                    "type": "image",
-                                    "image": {
-                                        "link": attachment_url,
-                                    },
-                                }
-                            ],
+                            "type": "image",
+                            "image": {
+                                "link": attachment_url,
+                            },
                         }
-                    )
-                if template.buttons:
-                    button_fields = self.button_fields.split(",") if self.button_fields else []
-                    for idx, btn in enumerate(template.buttons):
-                        if btn.button_type == "Visit Website" and btn.url_type == "Dynamic":
-                            if button_fields:
-                                data["template"]["components"].append(
-                                    {
-                                        "type": "button",
-                                        "sub_type": "url",
-                                        "index": str(idx),
-                                        "parameters": [
-                                            {"type": "text", "text": doc.get(button_fields.pop(0))}
-                                        ],
-                                    }
-                                )
+                    ],
+                }
+            )
+        if template.buttons:
+            button_fields = self.button_fields.split(",") if self.button_fields else []
+            for idx, btn in enumerate(template.buttons):
+                if btn.button_type == "Visit Website" and btn.url_type == "Dynamic":
+                    if button_fields:
+                        data["template"]["components"].append(
+                            {
+                                "type": "button",
+                                "sub_type": "url",
+                                "index": str(idx),
+                                "parameters": [
+                                    {"type": "text", "text": doc.get(button_fields.pop(0))}
+                                ],
+                            }
+                        )
 
-                try:
-                    self.notify(data, doc_data, template_account=template.whatsapp_account)
-                except Exception:
-                    _insert_notification_log(
-                        self.template,
-                        error=(
-                            f"Recipient send failed for {formatted_to} on "
-                            f"{doc_data.get('doctype')} {doc_data.get('name')}: {frappe.get_traceback()}"
-                        ),
-                    )
-                    continue
+        try:
+            self.notify(
+                data,
+                doc_data,
+                template_account=template.whatsapp_account,
+                idempotency_key=idempotency_key,
+            )
+        except WhatsAppRateLimited as e:
+            # Retry only this recipient once the account's bucket has refilled.
+            idempotency.release(idempotency_key)
+            defer(
+                "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.send_template_message_job",
+                delay=e.retry_after,
+                notification_name=self.name,
+                reference_doctype=doc_data.get("doctype"),
+                reference_name=doc_data.get("name"),
+                default_template_name=template.name,
+                ignore_condition=True,
+                recipient_numbers=[formatted_to],
+            )
+            return
+        except Exception:
+            _insert_notification_log(
+                self.template,
+                error=(
+                    f"Recipient send failed for {formatted_to} on "
+                    f"{doc_data.get('doctype')} {doc_data.get('name')}: {frappe.get_traceback()}"
+                ),
+            )
 
     def get_recipient_numbers(self, doc, doc_data, phone_no=None):
+        plan = _get_recipient_plan(self)
+        reference_doctype = doc_data.get("doctype")
+        batch = _RecipientBatch()
         numbers = []
-        if phone_no and frappe.db.exists("Contact", phone_no):
-            numbers.extend(_get_contact_numbers(phone_no, purpose="notification"))
-        elif phone_no and _looks_like_phone(phone_no):
-            # Keep support for explicit scheduler-provided numbers in _data_list.
-            numbers.extend(_split_candidate_numbers(phone_no))
+
+        # Keep support for explicit scheduler-provided numbers in _data_list.
+        batch.add_candidate(phone_no)
 
         # 1. Handle Explicit Field Selection only
-        if self.field_name:
-            value = doc_data.get(self.field_name)
-            if _is_user_recipient_field(doc_data.get("doctype"), self.field_name):
-                if value and frappe.db.exists("User", value):
+        if plan.field_name:
+            value = doc_data.get(plan.field_name)
+            if _is_user_recipient_field(reference_doctype, plan.field_name):
+                if value:
                     numbers.extend(self._get_user_info([value], "mobile_no"))
             else:
-                numbers.extend(_split_candidate_numbers(value))
-                if value and frappe.db.exists("Contact", value):
-                    numbers.extend(_get_contact_numbers(value, purpose="notification"))
+                batch.add_numbers(value)
+                batch.add_contact(value)
 
         # 2. Handle recipient table document fields that are not user fields
         # (e.g. custom phone field, customer/supplier/contact link field).
-        if getattr(self, "recipients", None):
-            for recipient in self.recipients:
-                if recipient.get("condition"):
-                    if not frappe.safe_eval(
-                        recipient.get("condition"),
-                        get_safe_globals(),
-                        dict(doc=doc_data),
-                    ):
-                        continue
+        include_system_users = plan.send_to_all_assignees
+        for recipient in plan.recipients:
+            is_user_field = _is_user_recipient_field(reference_doctype, recipient.fieldname)
+            if is_user_field or recipient.role:
+                include_system_users = True
+            if not recipient.party_role and (is_user_field or not recipient.fieldname):
+                continue
+
+            if recipient.condition:
+                if not conditions.evaluate(recipient.condition, doc_data, owner=self):
+                    continue
 
-                role_name = recipient.get("receiver_by_role")
-                if role_name and _is_party_recipient_role(role_name):
-                    numbers.extend(_get_party_role_numbers(doc_data, role_name))
+            if recipient.party_role:
+                batch.add_party_role(doc_data, recipient.party_role)
 
-                fieldname = recipient.get("receiver_by_document_field")
-                if not fieldname or _is_user_recipient_field(doc_data.get("doctype"), fieldname):
-                    continue
-                value = doc_data.get(fieldname)
-                if not value:
-                    continue
-                if frappe.db.exists("Contact", value):
-                    numbers.extend(_get_contact_numbers(value, purpose="notification"))
-                    continue
-                if _looks_like_phone(value):
-                    numbers.extend(_split_candidate_numbers(value))
-                    continue
-                for linked_dt in ("Customer", "Supplier", "Lead", "Prospect"):
-                    if frappe.db.exists(linked_dt, value):
-                        numbers.extend(
-                            _get_dynamic_link_contact_numbers(
-                                linked_dt,
-                                value,
-                                purpose="notification",
-                            )
-                        )
-                        break
+            if not is_user_field:
+                value = doc_data.get(recipient.fieldname) if recipient.fieldname else None
+                # A Contact, else a phone number, else a party with linked Contacts.
+                batch.add_candidate(value, link_doctypes=_party_link_doctypes())
+
+        numbers.extend(batch.resolve())
 
         # 3. No implicit linked-contact fallback:
         # Auto notifications should only use Contact rows with explicit
         # Notification consent checkbox enabled and explicitly configured source fields.
 
         # 4. System users are included only when explicitly configured.
-        include_system_users = bool(getattr(self, "send_to_all_assignees", 0))
-        if not include_system_users and getattr(self, "recipients", None):
-            include_system_users = any(
-                (
-                    (r.get("receiver_by_role") and not _is_party_recipient_role(r.get("receiver_by_role")))
-                    or _is_user_recipient_field(
-                        doc_data.get("doctype"),
-                        r.get("receiver_by_document_field"),
-                    )
-                )
-                for r in self.recipients
-            )
-
         if include_system_users:
             sys_numbers = self._get_system_user_numbers(doc, doc_data)
             for num in sys_numbers:
@@ -875,50 +926,42 @@ class WhatsAppNotification(Document):
         return _dedupe_numbers(numbers)
 
     def _get_system_user_numbers(self, doc, doc_data):
-        receiver_list = []
+        plan = _get_recipient_plan(self)
+        users = []
 
         # 1. Include assigned users only when explicitly enabled.
-        if getattr(self, "send_to_all_assignees", 0):
-            assignees = frappe.get_all(
-                "ToDo",
-                filters={
-                    "reference_type": doc_data.get("doctype"),
-                    "reference_name": doc_data.get("name"),
-                    "status": "Open",
-                },
-                pluck="allocated_to",
+        if plan.send_to_all_assignees:
+            users.extend(
+                frappe.get_all(
+                    "ToDo",
+                    filters={
+                        "reference_type": doc_data.get("doctype"),
+                        "reference_name": doc_data.get("name"),
+                        "status": "Open",
+                    },
+                    pluck="allocated_to",
+                )
             )
-            if assignees:
-                receiver_list.extend(self._get_user_info(assignees, "mobile_no"))
-                
+
         # 2. Notification Recipients
-        if getattr(self, "recipients", None):
-            for recipient in self.recipients:
-                if recipient.get("condition"):
-                    if not frappe.safe_eval(recipient.get("condition"), get_safe_globals(), dict(doc=doc_data)):
-                        continue
+        roles = set()
+        for recipient in plan.recipients:
+            is_user_field = _is_user_recipient_field(doc_data.get("doctype"), recipient.fieldname)
+            if not is_user_field and not recipient.role:
+                continue
+            if recipient.condition:
+                if not conditions.evaluate(recipient.condition, doc_data, owner=self):
+                    continue
+            # Owner and user-link fields; _get_user_info skips unknown or disabled users.
+            if is_user_field:
+                users.append(doc_data.get(recipient.fieldname))
+            if recipient.role:
+                roles.add(recipient.role)
+
+        if roles:
+            users.extend(frappe.get_all("Has Role", filters={"role": ("in", sorted(roles))}, pluck="parent"))
 
-                # For sending messages to the owner's mobile phone number
-                if recipient.get("receiver_by_document_field") == "owner":
-                    receiver_list.extend(self._get_user_info([doc_data.get("owner")], "mobile_no"))
-                # For sending messages to user-link fields only.
-                elif _is_user_recipient_field(
-                    doc_data.get("doctype"),
-                    recipient.get("receiver_by_document_field"),
-                ):
-                    val = doc_data.get(recipient.get("receiver_by_document_field"))
-                    if val and frappe.db.exists("User", val):
-                        receiver_list.extend(self._get_user_info([val], "mobile_no"))
-
-                # For sending messages to specified role
-                if recipient.get("receiver_by_role"):
-                    role_name = recipient.get("receiver_by_role")
-                    if not _is_party_recipient_role(role_name):
-                        roles = frappe.get_all("Has Role", filters={"role": role_name}, pluck="parent")
-                        if roles:
-                            receiver_list.extend(self._get_user_info(roles, "mobile_no"))
-                        
-        return receiver_list
+        return self._get_user_info(users, "mobile_no")
 
     def _get_user_info(self, users, field="mobile_no"):
         if not users:
@@ -934,25 +977,24 @@ class WhatsAppNotification(Document):
             filters={"name": ["in", user_names], "enabled": 1},
             fields=fields,
         )
+        employee_numbers = _get_links_numbers(
+            [("Employee", row.get("employee")) for row in rows if has_employee_field and row.get("employee")],
+            purpose="notification",
+        )
         all_nums = []
         for row in rows:
             all_nums.extend(_split_candidate_numbers(row.get(field)))
             all_nums.extend(_split_candidate_numbers(row.get("phone")))
             employee = row.get("employee") if has_employee_field else None
             if employee:
-                contact_numbers = _get_dynamic_link_contact_numbers(
-                    "Employee",
-                    employee,
-                    purpose="notification",
-                    primary_only=False,
-                )
-                if contact_numbers:
-                    all_nums.extend(contact_numbers)
+                numbers = employee_numbers.get(("Employee", employee))
+                if numbers:
+                    all_nums.extend(numbers)
                 else:
                     all_nums.extend(_get_employee_fallback_numbers(employee))
         return _dedupe_numbers(all_nums)
 
-    def notify(self, data, doc_data=None, template_account=None):
+    def notify(self, data, doc_data=None, template_account=None, idempotency_key=None):
         """Notify."""
         default_account = get_whatsapp_account(account_type="outgoing")
         default_account_name = default_account.name if default_account else None
@@ -965,63 +1007,68 @@ class WhatsAppNotification(Document):
                 )
 
             settings = get_evolution_settings(account_name)
-            provider = EvolutionProvider(settings)
-
             to_number = format_number(data.get("to"))
             template_doc = frappe.get_doc("WhatsApp Templates", self.template)
             template_text = (template_doc.get("template") or template_doc.get("template_message") or "").strip()
             params = _extract_body_params(data.get("template"))
             rendered_text = _render_template_text(template_text, params)
 
-            media_url = ""
-            media_type = "document"
-            media_bytes = None
-            media_name = None
-            components = (data.get("template") or {}).get("components") or []
-            for component in components:
-                if component.get("type") != "header":
-                    continue
-                header_params = component.get("parameters") or []
-                if not header_params:
-                    continue
-                hp = header_params[0]
-                if hp.get("type") == "document":
-                    media_type = "document"
-                    media_url = ((hp.get("document") or {}).get("link") or "").strip()
-                    media_name = ((hp.get("document") or {}).get("filename") or "").strip()
-                elif hp.get("type") == "image":
-                    media_type = "image"
-                    media_url = ((hp.get("image") or {}).get("link") or "").strip()
-
-            if self.attach_document_print and doc_data:
-                try:
-                    ref_doctype = _doc_value(doc_data, "doctype")
-                    ref_name = _doc_value(doc_data, "name")
-                    print_format = _resolve_print_format(ref_doctype, self.print_format)
-                    key = frappe.get_doc(ref_doctype, ref_name).get_document_share_key()
-                    link = get_pdf_link(ref_doctype, ref_name, print_format=print_format)
-                    media_url = f"{frappe.utils.get_url()}{link}&key={key}"
-                    pdf = frappe.attach_print(ref_doctype, ref_name, print_format=print_format)
-                    media_bytes = pdf.get("fcontent")
-                    media_name = pdf.get("fname")
-                    media_type = "document"
-                except Exception:
-                    media_bytes = None
-                    media_name = media_name or None
-
-            if media_url or media_bytes:
-                response = provider.send_media(
-                    to_number=to_number,
-                    media_url=media_url,
-                    media_type=media_type,
-                    caption=rendered_text,
-                    media_bytes=media_bytes,
-                    filename=media_name,
-                )
-                content_type = media_type
-            else:
-                response = provider.send_message(to_number, rendered_text)
-                content_type = "text"
+            with ExitStack() as stack:
+                media_url = ""
+                media_type = "document"
+                media_path = None
+                media_name = None
+                components = (data.get("template") or {}).get("components") or []
+                for component in components:
+                    if component.get("type") != "header":
+                        continue
+                    header_params = component.get("parameters") or []
+                    if not header_params:
+                        continue
+                    hp = header_params[0]
+                    if hp.get("type") == "document":
+                        media_type = "document"
+                        media_url = ((hp.get("document") or {}).get("link") or "").strip()
+                        media_name = ((hp.get("document") or {}).get("filename") or "").strip()
+                    elif hp.get("type") == "image":
+                        media_type = "image"
+                        media_url = ((hp.get("image") or {}).get("link") or "").strip()
+
+                if self.attach_document_print and doc_data:
+                    try:
+                        ref_doctype = _doc_value(doc_data, "doctype")
+                        ref_name = _doc_value(doc_data, "name")
+                        print_format = _resolve_print_format(ref_doctype, self.print_format)
+                        key = frappe.get_doc(ref_doctype, ref_name).get_document_share_key()
+                        link = get_pdf_link(ref_doctype, ref_name, print_format=print_format)
+                        media_url = f"{frappe.utils.get_url()}{link}&key={key}"
+                        pdf = frappe.attach_print(ref_doctype, ref_name, print_format=print_format)
+                        # Spooled to disk so the send memory-maps it instead of holding the bytes.
+                        media_path = spool_bytes(pdf.pop("fcontent", None), stack, suffix=".pdf")
+                        media_name = pdf.get("fname")
+                        media_type = "document"
+                    except Exception:
+                        media_path = None
+                        media_name = media_name or None
+
+                if media_url or media_path:
+                    item = {
+                        "to_number": to_number,
+                        "media_url": media_url,
+                        "media_type": media_type,
+                        "caption": rendered_text,
+                        "filename": media_name,
+                        "media_path": media_path,
+                    }
+                    content_type = media_type
+                else:
+                    item = {"to_number": to_number, "message": rendered_text}
+                    content_type = "text"
+                # The caller already holds the idempotency claim for this send.
+                result = batch_send.send_many(settings, [dict(item, idempotency_key=idempotency_key)])[0]
+                if not result["ok"]:
+                    raise result["exception"]
+                response = result["response"]
 
             params_json = frappe.json.dumps(params, default=str) if params else None
             new_doc = {
@@ -1036,7 +1083,8 @@ class WhatsAppNotification(Document):
                 "use_template": 1,
                 "template": self.template,
                 "template_parameters": params_json,
-                "attach": media_url if (media_url or media_bytes) else "",
+                "attach": media_url if (media_url or media_path) else "",
+                "idempotency_key": idempotency_key,
             }
             if doc_data:
                 new_doc.update(
@@ -1052,6 +1100,7 @@ class WhatsAppNotification(Document):
             return response
 
         success = False
+        rate_limited = False
         error_message = None
         response = {}
         try:
@@ -1067,6 +1116,9 @@ class WhatsAppNotification(Document):
                     if df:
                         frappe.db.set_value(_doc_value(doc_data, "doctype"), _doc_value(doc_data, "name"), fieldname, value)
             success = True
+        except WhatsAppRateLimited:
+            rate_limited = True
+            raise
         except Exception as e:
             error_message = str(e)
             if (
@@ -1078,21 +1130,26 @@ class WhatsAppNotification(Document):
                     response = _send_with_account(default_account_name)
                     success = True
                     error_message = None
+                except WhatsAppRateLimited:
+                    rate_limited = True
+                    raise
                 except Exception as e2:
                     error_message = str(e2)
         finally:
-            meta = {"error": error_message} if not success else {"response": response}
-            frappe.get_doc(
-                {
-                    "doctype": "WhatsApp Notification Log",
-                    "template": self.template,
-                    "meta_data": meta,
-                }
-            ).insert(ignore_permissions=True)
+            # Rate-limited sends are deferred by the caller and logged when they run.
+            if not rate_limited:
+                meta = {"error": error_message} if not success else {"response": response}
+                frappe.get_doc(
+                    {
+                        "doctype": "WhatsApp Notification Log",
+                        "template": self.template,
+                        "meta_data": meta,
+                    }
+                ).insert(ignore_permissions=True)
 
 
     def _invalidate_notification_cache(self):
-        frappe.cache().delete_value("whatsapp_notification_map")
+        clear_notifications_map()
 
 
     def on_update(self):
@@ -1166,6 +1223,16 @@ def trigger_notifications(method="daily"):
             alert.get_documents_for_today()
 
 
+def send_simple_template_job(notification_name: str, contact_list: list):
+    """Background worker resuming a simple template send deferred by the rate limiter."""
+    notification = frappe.get_doc("WhatsApp Notification", notification_name)
+    template = frappe.db.get_value("WhatsApp Templates", notification.template, fieldname="*")
+    if not template:
+        return
+    notification._contact_list = contact_list
+    notification.send_simple_template(template)
+
+
 def send_template_message_job(
     notification_name: str,
     reference_doctype: str,
@@ -1174,15 +1241,31 @@ def send_template_message_job(
     default_template_name: str | None = None,
     ignore_condition: bool = False,
     delay_seconds: int = 0,
+    recipient_numbers: list | None = None,
 ):
     """Background worker for delayed WhatsApp notification sends."""
     if delay_seconds and delay_seconds > 0:
-        sleep(delay_seconds)
+        # Jobs queued before delays moved to the deferred set still carry
+        # delay_seconds; schedule them instead of holding the worker.
+        defer(
+            "whatsapp_evolution.whatsapp_evolution.doctype.whatsapp_notification.whatsapp_notification.send_template_message_job",
+            delay=delay_seconds,
+            queue="short",
+            notification_name=notification_name,
+            reference_doctype=reference_doctype,
+            reference_name=reference_name,
+            phone_no=phone_no,
+            default_template_name=default_template_name,
+            ignore_condition=ignore_condition,
+            recipient_numbers=recipient_numbers,
+        )
+        return
 
-    notification = frappe.get_doc("WhatsApp Notification", notification_name)
+    # Served from the document cache, which Frappe clears whenever either is saved.
+    notification = frappe.get_cached_doc("WhatsApp Notification", notification_name)
     reference_doc = frappe.get_doc(reference_doctype, reference_name)
     default_template = (
-        frappe.get_doc("WhatsApp Templates", default_template_name)
+        frappe.get_cached_doc("WhatsApp Templates", default_template_name)
         if default_template_name else None
     )
     notification.send_template_message(
@@ -1191,5 +1274,6 @@ def send_template_message_job(
         default_template=default_template,
         ignore_condition=ignore_condition,
         from_queue=True,
+        recipient_numbers=recipient_numbers,
     )
            
@@ -3,6 +3,8 @@ import json
 from frappe import _
 from frappe.model.document import Document
 
+from whatsapp_evolution.utils.contact_numbers import DEFAULT_TICK_FIELDS, get_phone_rows
+
 
 class WhatsAppRecipientList(Document):
 	DEFAULT_PHONE_FIELDS = (
@@ -75,55 +77,50 @@ class WhatsAppRecipientList(Document):
 		items = sorted([f"+{n}" if n and not n.startswith("+") else n for n in excluded if n])
 		self.excluded_numbers_json = json.dumps(items)
 
-	def _get_contact_numbers(self, contact_name):
-		if not contact_name or not frappe.db.exists("Contact", contact_name):
-			return []
-		contact = frappe.get_doc("Contact", contact_name)
-		phone_rows = contact.get("phone_nos") or []
-
-		tick_field = None
+	def _get_tick_field(self):
 		try:
 			meta = frappe.get_meta("Contact Phone")
-			for fieldname in ("is_whatsapp_number", "is_whatsapp", "whatsapp"):
-				if meta.get_field(fieldname):
-					tick_field = fieldname
-					break
 		except Exception:
-			tick_field = None
+			return None
+		for fieldname in DEFAULT_TICK_FIELDS["whatsapp"]:
+			if meta.get_field(fieldname):
+				return fieldname
+		return None
+
+	def _numbers_from_phone_rows(self, rows):
+		"""WhatsApp-ticked numbers per Contact, else all its phone rows, else its own fields."""
+		by_contact = {}
+		for row in rows or []:
+			by_contact.setdefault(row.contact, []).append(row)
 
 		numbers = []
-		if tick_field:
-			for row in phone_rows:
-				if frappe.utils.cint(row.get(tick_field)):
-					numbers.extend(self._split_mobile_candidates(row.get("phone")))
-			if numbers:
-				return self._dedupe_numbers(numbers)
-
-		for row in phone_rows:
-			numbers.extend(self._split_mobile_candidates(row.get("phone")))
+		for contact_rows in by_contact.values():
+			ticked = [n for row in contact_rows if row.ticked for n in self._split_mobile_candidates(row.phone)]
+			if ticked:
+				numbers.extend(ticked)
+				continue
 
-		if not numbers:
-			numbers.extend(self._split_mobile_candidates(contact.get("mobile_no")))
-			numbers.extend(self._split_mobile_candidates(contact.get("phone")))
+			phones = [n for row in contact_rows for n in self._split_mobile_candidates(row.phone)]
+			if not phones:
+				phones.extend(self._split_mobile_candidates(contact_rows[0].contact_mobile_no))
+				phones.extend(self._split_mobile_candidates(contact_rows[0].contact_phone))
+			numbers.extend(phones)
 
 		return self._dedupe_numbers(numbers)
 
+	def _get_links_numbers(self, links):
+		"""Return ``{(link_doctype, link_name): numbers}`` for many Contacts and linked records at once."""
+		tick_field = self._get_tick_field()
+		rows = get_phone_rows(links, [tick_field] if tick_field else [])
+		return {link: self._numbers_from_phone_rows(link_rows) for link, link_rows in rows.items()}
+
+	def _get_contact_numbers(self, contact_name):
+		link = ("Contact", contact_name)
+		return self._get_links_numbers([link]).get(link, [])
+
 	def _get_dynamic_link_contact_numbers(self, link_doctype, link_name):
-		if not link_doctype or not link_name:
-			return []
-		contact_names = frappe.get_all(
-			"Dynamic Link",
-			filters={
-				"link_doctype": link_doctype,
-				"link_name": link_name,
-				"parenttype": "Contact",
-			},
-			pluck="parent",
-		)
-		numbers = []
-		for contact_name in contact_names:
-			numbers.extend(self._get_contact_numbers(contact_name))
-		return self._dedupe_numbers(numbers)
+		link = (link_doctype, link_name)
+		return self._get_links_numbers([link]).get(link, [])
 
 	def _guess_mobile_fields(self, doctype):
 		meta = frappe.get_meta(doctype)
@@ -179,37 +176,43 @@ class WhatsAppRecipientList(Document):
 
 		return list(dict.fromkeys(fields))
 
-	def _resolve_record_numbers(self, doctype, record, mobile_field=None):
-		numbers = []
-		if doctype == "Contact" and record.get("name"):
-			numbers.extend(self._get_contact_numbers(record.get("name")))
+	def _resolve_records_numbers(self, doctype, records, mobile_field=None):
+		"""Resolve numbers for many records with two bulk Contact lookups instead of one per record."""
+		mobile_fields = [mobile_field] if mobile_field else self._guess_mobile_fields(doctype)
+		own_numbers = {}
+		if doctype == "Contact":
+			own_numbers = self._get_links_numbers([("Contact", r.get("name")) for r in records if r.get("name")])
 
-		if mobile_field:
-			numbers.extend(self._split_mobile_candidates(record.get(mobile_field)))
-		else:
-			for fieldname in self._guess_mobile_fields(doctype):
+		resolved = []
+		for record in records:
+			numbers = list(own_numbers.get(("Contact", record.get("name")), []))
+			for fieldname in mobile_fields:
 				numbers.extend(self._split_mobile_candidates(record.get(fieldname)))
+			resolved.append(self._dedupe_numbers(numbers))
+
+		# Records without a number of their own fall back to linked Contacts.
+		party_fields = [
+			field
+			for field in frappe.get_meta(doctype).fields
+			if field.fieldtype == "Link" and field.options in self.PARTY_LINK_OPTIONS
+		]
+		record_links = {}
+		for idx, record in enumerate(records):
+			if resolved[idx]:
+				continue
+			links = [("Contact", record.get(field)) for field in ("contact", "contact_person") if record.get(field)]
+			links.extend(
+				(field.options, record.get(field.fieldname)) for field in party_fields if record.get(field.fieldname)
+			)
+			if record.get("name"):
+				links.append((doctype, record.get("name")))
+			record_links[idx] = links
 
-		if numbers:
-			return self._dedupe_numbers(numbers)
-
-		contact_fields = ["contact", "contact_person"]
-		for field in contact_fields:
-			if record.get(field):
-				numbers.extend(self._get_contact_numbers(record.get(field)))
-
-		meta = frappe.get_meta(doctype)
-		for field in meta.fields:
-			if field.fieldtype == "Link" and field.options in self.PARTY_LINK_OPTIONS:
-				party_name = record.get(field.fieldname)
-				if party_name:
-					numbers.extend(self._get_dynamic_link_contact_numbers(field.options, party_name))
-
-		record_name = record.get("name")
-		if record_name:
-			numbers.extend(self._get_dynamic_link_contact_numbers(doctype, record_name))
+		link_numbers = self._get_links_numbers(link for links in record_links.values() for link in links)
+		for idx, links in record_links.items():
+			resolved[idx] = self._dedupe_numbers([n for link in links for n in link_numbers.get(link, [])])
 
-		return self._dedupe_numbers(numbers)
+		return resolved
 
 	def _auto_import_contacts_on_save(self):
 		"""Auto-fill recipients from Contact on save when import mode is enabled."""
@@ -296,8 +299,8 @@ class WhatsAppRecipientList(Document):
 		seen_numbers = set()
 		
 		# Add recipients
-		for record in records:
-			mobiles = self._resolve_record_numbers(doctype, record, mobile_field=mobile_field)
+		record_numbers = self._resolve_records_numbers(doctype, records, mobile_field=mobile_field)
+		for record, mobiles in zip(records, record_numbers):
 			if not mobiles:
 				continue
 
@@ -3,29 +3,30 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint
 from whatsapp_evolution.whatsapp_evolution.providers.evolution import EvolutionProvider
-from whatsapp_evolution.utils import get_evolution_settings
+from whatsapp_evolution.utils import get_evolution_settings, instance_health
 
 class WhatsAppSettings(Document):
 	pass
 
 
 @frappe.whitelist()
-def test_evolution_connection(account=None):
-	"""Test Evolution connection for a specific account or all active accounts."""
-	results = []
-	accounts = []
+def test_evolution_connection(account=None, live=0):
+	"""Return Evolution connection state for a specific account or all active accounts.
 
+	State comes from the background health poller; accounts without a cached
+	result (or every account when ``live`` is set) are probed concurrently now.
+	"""
 	if account and frappe.db.exists("WhatsApp Account", account):
-		accounts = [frappe.get_doc("WhatsApp Account", account)]
+		accounts = [account]
 	else:
-		for row in frappe.get_all(
+		accounts = frappe.get_all(
 			"WhatsApp Account",
 			filters={"status": "Active"},
-			fields=["name"],
+			pluck="name",
 			order_by="is_default desc, modified desc",
-		):
-			accounts.append(frappe.get_doc("WhatsApp Account", row.name))
+		)
 
 	if not accounts:
 		settings = get_evolution_settings()
@@ -34,12 +35,15 @@ def test_evolution_connection(account=None):
 		res["account"] = "(Global fallback)"
 		return {"results": [res]}
 
-	for acc in accounts:
-		settings = get_evolution_settings(acc.name)
-		provider = EvolutionProvider(settings)
-		res = provider.test_connection()
-		res["account"] = acc.name
-		res["instance"] = settings.get("evolution_instance")
-		results.append(res)
+	cached = {}
+	if not cint(live):
+		for name in accounts:
+			health = instance_health.get_health(name)
+			if health:
+				cached[name] = health
+
+	missing = [name for name in accounts if name not in cached]
+	for res in instance_health.check_accounts(missing):
+		cached[res["account"]] = res
 
-	return {"results": results}
+	return {"results": [cached[name] for name in accounts if name in cached]}
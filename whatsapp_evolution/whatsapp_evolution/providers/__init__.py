@@ -1,4 +1,5 @@
 from .evolution import EvolutionProvider
+from .exceptions import EvolutionTransientError
 
 PROVIDERS = {
     "Evolution": EvolutionProvider,
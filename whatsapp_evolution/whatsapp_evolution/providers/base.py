@@ -5,5 +5,29 @@ class BaseProvider:
     def send_message(self, to_number, message, **kwargs):
         raise NotImplementedError
 
+    def send_media(self, to_number, media_url, **kwargs):
+        raise NotImplementedError
+
+    def send_many(self, items, concurrency=1):
+        """Send each item in turn. Providers may override this to send concurrently.
+
+        Returns one ``{"ok": True, "response": ...}`` or ``{"ok": False, "error": ...,
+        "exception": ...}`` result per item, in the same order as ``items``.
+        """
+        return [self._send_item_result(item) for item in items or []]
+
+    def _send_item(self, item):
+        item = dict(item)
+        to_number = item.pop("to_number")
+        if item.get("media_url") or item.get("media_bytes") or item.get("media_path"):
+            return self.send_media(to_number=to_number, **item)
+        return self.send_message(to_number, item.pop("message", ""), **item)
+
+    def _send_item_result(self, item):
+        try:
+            return {"ok": True, "response": self._send_item(item)}
+        except Exception as e:
+            return {"ok": False, "error": str(e), "exception": e}
+
     def parse_incoming(self, data):
         raise NotImplementedError
@@ -0,0 +1,109 @@
+"""Redis-backed circuit breaker shared by all workers sending to an Evolution instance."""
+
+import hashlib
+import time
+
+import frappe
+
+from .exceptions import EvolutionTransientError
+
+# Trip-worthy failures within FAILURE_WINDOW seconds of the first one that open the circuit.
+FAILURE_THRESHOLD = 3
+FAILURE_WINDOW = 120
+# Seconds the circuit stays open before a single half-open probe is allowed.
+COOLDOWN_SECONDS = 60
+PROBE_LOCK_SECONDS = 30
+
+
+class EvolutionCircuitOpenError(EvolutionTransientError):
+    pass
+
+
+class CircuitBreaker:
+    """Open/half-open/closed state for one Evolution instance.
+
+    The state lives in Redis so every worker and bench node fails fast together
+    once an instance is known to be down.
+    """
+
+    def __init__(self, api_base, instance):
+        identity = f"{(api_base or '').rstrip('/')}|{instance or ''}"
+        self.instance = instance or "-"
+        self.id = hashlib.sha1(identity.encode("utf-8")).hexdigest()
+
+    def _key(self, name):
+        return frappe.cache().make_key(f"wa_evo_cb:{name}:{self.id}")
+
+    def opened_at(self):
+        try:
+            value = frappe.cache().get(self._key("open"))
+        except Exception:
+            return None
+        return float(value) if value else None
+
+    def is_open(self):
+        return self.opened_at() is not None
+
+    def before_call(self, probe):
+        """Raise while the circuit is open; run ``probe`` once the cooldown has passed.
+
+        ``probe`` returns a truthy value when the instance is healthy again. Only
+        one worker wins the probe lock; the rest keep failing fast meanwhile.
+        """
+        opened_at = self.opened_at()
+        if opened_at is None:
+            return
+        if time.time() - opened_at < COOLDOWN_SECONDS:
+            self._raise_open()
+
+        # Redis errors let the send through, as they do while the circuit is closed.
+        try:
+            cache = frappe.cache()
+            won_probe = cache.set(self._key("probe"), 1, nx=True, ex=PROBE_LOCK_SECONDS)
+        except Exception:
+            return
+        if not won_probe:
+            self._raise_open()
+
+        try:
+            healthy = probe()
+        except Exception:
+            healthy = False
+        finally:
+            try:
+                cache.delete(self._key("probe"))
+            except Exception:
+                pass
+
+        if healthy:
+            self.record_success()
+            return
+        try:
+            cache.set(self._key("open"), time.time())
+        except Exception:
+            pass
+        self._raise_open()
+
+    def record_success(self):
+        try:
+            frappe.cache().delete(self._key("fail"), self._key("open"))
+        except Exception:
+            pass
+
+    def record_failure(self):
+        cache = frappe.cache()
+        try:
+            fail_key = self._key("fail")
+            # The window starts at the first failure; later failures must not extend it.
+            cache.set(fail_key, 0, nx=True, ex=FAILURE_WINDOW)
+            failures = cache.incr(fail_key)
+            if failures >= FAILURE_THRESHOLD:
+                cache.set(self._key("open"), time.time(), nx=True)
+        except Exception:
+            pass
+
+    def _raise_open(self):
+        raise EvolutionCircuitOpenError(
+            f"Evolution instance '{self.instance}' is unavailable; sending is paused for up to "
+            f"{COOLDOWN_SECONDS}s after repeated connection failures."
+        )
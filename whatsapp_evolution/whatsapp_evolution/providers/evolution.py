@@ -1,9 +1,46 @@
+import contextvars
 import frappe
 import requests
-import base64
 import hashlib
 import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from whatsapp_evolution.utils import normalize_message_id, phone_suffix, webhook_stream
+from whatsapp_evolution.utils.message_status import (
+    add_status_update,
+    apply_status_updates,
+    buffer_pending_acks,
+    find_messages_by_ids,
+    status_rank,
+)
 from .base import BaseProvider
+from .circuit_breaker import CircuitBreaker
+from .exceptions import EvolutionTransientError
+from .media_stream import StreamingJSONBody, map_file, spool_download
+from .session_pool import DEFAULT_POOL_SIZE, get_session, use_session
+
+
+# How long a working (endpoint, payload shape) pair is remembered per instance.
+ROUTE_CACHE_TTL = 6 * 60 * 60
+# Downloaded media is cached for the base64 fallback when it is at most this large.
+MEDIA_CACHE_MAX_BYTES = 5 * 1024 * 1024
+MEDIA_CACHE_TTL = 10 * 60
+
+# (api_base, instance) -> (limit, semaphore) capping in-flight sends per instance in this process.
+_send_slots = {}
+_send_slots_lock = threading.Lock()
+
+
+def _instance_send_slots(api_base, instance, limit):
+    with _send_slots_lock:
+        current = _send_slots.get((api_base, instance))
+        if current is None or current[0] != limit:
+            # Batches still holding the old semaphore finish under the old limit.
+            current = (limit, threading.BoundedSemaphore(limit))
+            _send_slots[(api_base, instance)] = current
+        return current[1]
 
 
 class EvolutionProvider(BaseProvider):
@@ -13,6 +50,18 @@ class EvolutionProvider(BaseProvider):
         self.token = settings.get("evolution_api_token")
         self.instance = (settings.get("evolution_instance") or "").strip().strip("/")
         self.send_endpoint = (settings.get("evolution_send_endpoint") or "").strip()
+        self.pool_size = settings.get("http_pool_size")
+        self.idle_timeout = settings.get("http_idle_timeout")
+        self.breaker = CircuitBreaker(self.api_base, self.instance)
+
+    @property
+    def session(self):
+        """The pooled HTTP session for this account, as ``_use_session`` yields it."""
+        return get_session(self.api_base, self.token, pool_size=self.pool_size, idle_timeout=self.idle_timeout)
+
+    def _use_session(self):
+        """Hold the pooled HTTP session for this account while a request runs."""
+        return use_session(self.api_base, self.token, pool_size=self.pool_size, idle_timeout=self.idle_timeout)
 
     def _headers(self):
         return {
@@ -21,19 +70,6 @@ class EvolutionProvider(BaseProvider):
             "Content-Type": "application/json",
         }
 
-    def _dedup_key(self, kind, to_number, content_hash):
-        return f"wa_evo_out:{kind}:{to_number}:{content_hash}"
-
-    def _acquire_dedup(self, kind, to_number, content, ttl=45):
-        raw = (content or "").encode("utf-8", errors="ignore")
-        content_hash = hashlib.sha1(raw).hexdigest()
-        key = self._dedup_key(kind, to_number, content_hash)
-        cache = frappe.cache()
-        if cache.get_value(key):
-            return False
-        cache.set_value(key, 1, expires_in_sec=ttl)
-        return True
-
     def _build_url(self, path_or_url):
         if not path_or_url:
             return ""
@@ -87,178 +123,365 @@ class EvolutionProvider(BaseProvider):
             return "SessionError: No sessions"
         return ""
 
-    def send_message(self, to_number, message, **kwargs):
-        if not self._acquire_dedup("text", to_number, message or "", ttl=45):
-            return {"id": "dedup-skip"}
+    @staticmethod
+    def _route_mode(shape):
+        return "base64" if shape.endswith("_base64") else "url"
 
-        payload_variants = [
-            {"number": to_number, "text": message},
-            {"to": to_number, "text": message},
-            {"number": to_number, "textMessage": {"text": message}},
-            {
-                "number": to_number,
-                "options": {"delay": 1200, "presence": "composing"},
-                "textMessage": {"text": message},
-            },
+    def _route_cache_key(self, kind, mode="url"):
+        identity = f"{self.api_base}|{self.instance}|{self.send_endpoint}"
+        return f"wa_evo_route:{kind}:{mode}:{hashlib.sha1(identity.encode('utf-8')).hexdigest()}"
+
+    def _get_cached_route(self, kind, mode="url"):
+        try:
+            route = frappe.cache().get_value(self._route_cache_key(kind, mode))
+        except Exception:
+            return None
+        return route if isinstance(route, dict) else None
+
+    def _remember_route(self, kind, url, shape):
+        try:
+            frappe.cache().set_value(
+                self._route_cache_key(kind, self._route_mode(shape)),
+                {"url": url, "shape": shape},
+                expires_in_sec=ROUTE_CACHE_TTL,
+            )
+        except Exception:
+            pass
+
+    def _url_mode_failed(self, kind):
+        try:
+            return bool(frappe.cache().get_value(self._route_cache_key(kind, "url_failed")))
+        except Exception:
+            return False
+
+    def _set_url_mode_failed(self, kind, failed):
+        key = self._route_cache_key(kind, "url_failed")
+        try:
+            if failed:
+                frappe.cache().set_value(key, 1, expires_in_sec=ROUTE_CACHE_TTL)
+            else:
+                frappe.cache().delete_value(key)
+        except Exception:
+            pass
+
+    def _forget_route(self, kind, mode=None):
+        for route_mode in (mode,) if mode else ("url", "base64", "url_failed"):
+            try:
+                frappe.cache().delete_value(self._route_cache_key(kind, route_mode))
+            except Exception:
+                pass
+
+    def _post_candidates(self, kind, urls, variants, timeout, fallback_variants=()):
+        """POST each (url, payload shape) combination until one succeeds.
+
+        The combination that last worked for this instance is tried first; if it
+        fails it is forgotten and the remaining combinations are probed again.
+        Routes are remembered per payload mode (url or base64), and a remembered
+        route only moves ahead within its own group. ``fallback_variants`` are
+        tried after every primary combination, unless the last send only
+        succeeded through a fallback: then the fallback group goes first until
+        a primary combination works again. A payload may be a callable so that
+        expensive bodies are built lazily.
+        Session and connection failures feed the instance circuit breaker, which
+        makes later sends fail fast until a health probe succeeds.
+        """
+        self.breaker.before_call(lambda: self.test_connection().get("ok"))
+
+        groups = [
+            [(url, shape, payload) for url in urls for shape, payload in group_variants]
+            for group_variants in (variants, fallback_variants)
         ]
+        cached_combos = {}
+        for mode in {self._route_mode(shape) for shape, _ in [*variants, *fallback_variants]}:
+            cached = self._get_cached_route(kind, mode)
+            if not cached:
+                continue
+            cached_combo = next(
+                (
+                    c
+                    for group in groups
+                    for c in group
+                    if c[0] == cached.get("url") and c[1] == cached.get("shape")
+                ),
+                None,
+            )
+            if cached_combo:
+                cached_combos[mode] = cached_combo
+            else:
+                self._forget_route(kind, mode)
+        for group in groups:
+            for cached_combo in cached_combos.values():
+                if cached_combo in group:
+                    group.remove(cached_combo)
+                    group.insert(0, cached_combo)
+        fallback_first = bool(fallback_variants) and self._url_mode_failed(kind)
+        combos = groups[1] + groups[0] if fallback_first else groups[0] + groups[1]
 
         errors = []
         seen_session_error = ""
-        for url in self._text_candidate_urls():
-            for payload in payload_variants:
-                try:
-                    response = requests.post(url, json=payload, headers=self._headers(), timeout=20)
-                    response.raise_for_status()
-                    return response.json()
-                except requests.HTTPError as e:
-                    session_error = self._extract_session_error(e.response)
-                    if session_error:
-                        seen_session_error = session_error
-                    status_code = e.response.status_code if e.response is not None else "?"
-                    body = ""
-                    if e.response is not None:
-                        body = (e.response.text or "").strip().replace("\n", " ")[:180]
-                    errors.append(f"{url} -> {status_code} {body}".strip())
-                except Exception as e:
-                    errors.append(f"{url} -> {str(e)}")
-
+        tried_url_mode = False
+        attempted = 0
+        unreachable = 0
+        transient = 0
+        for url, shape, payload in combos:
+            if callable(payload):
+                payload = payload()
+                if payload is None:
+                    continue
+            attempted += 1
+            tried_url_mode = tried_url_mode or self._route_mode(shape) == "url"
+            label = f"{url} ({self._route_mode(shape)})" if kind == "media" else url
+            try:
+                with self._use_session() as session:
+                    if isinstance(payload, StreamingJSONBody):
+                        response = session.post(url, data=payload, headers=self._headers(), timeout=timeout)
+                    else:
+                        response = session.post(url, json=payload, headers=self._headers(), timeout=timeout)
+                response.raise_for_status()
+                body = response.json()
+            except requests.HTTPError as e:
+                session_error = self._extract_session_error(e.response)
+                if session_error:
+                    seen_session_error = session_error
+                status_code = e.response.status_code if e.response is not None else "?"
+                if status_code == "?" or status_code == 429 or status_code >= 500:
+                    transient += 1
+                body = ""
+                if e.response is not None:
+                    body = (e.response.text or "").strip().replace("\n", " ")[:180]
+                errors.append(f"{label} -> {status_code} {body}".strip())
+            except (requests.ConnectionError, requests.Timeout) as e:
+                unreachable += 1
+                transient += 1
+                errors.append(f"{label} -> {str(e)}")
+            except Exception as e:
+                errors.append(f"{label} -> {str(e)}")
+            else:
+                self.breaker.record_success()
+                mode = self._route_mode(shape)
+                cached_combo = cached_combos.get(mode)
+                if cached_combo is None or (url, shape) != cached_combo[:2]:
+                    self._remember_route(kind, url, shape)
+                if fallback_variants:
+                    if mode == "base64" and tried_url_mode:
+                        # Every url-mode combination failed, so skip ahead next time.
+                        self._set_url_mode_failed(kind, True)
+                    elif mode == "url" and fallback_first:
+                        self._set_url_mode_failed(kind, False)
+                return body
+
+            mode = self._route_mode(shape)
+            if mode in cached_combos and (url, shape) == cached_combos[mode][:2]:
+                self._forget_route(kind, mode)
+
+        if seen_session_error or (attempted and unreachable == attempted):
+            self.breaker.record_failure()
         if seen_session_error:
-            raise frappe.ValidationError(
+            raise EvolutionTransientError(
                 f"Evolution instance '{self.instance or '-'}' is not connected ({seen_session_error}). "
                 "Open Evolution Manager, connect the instance (QR), then retry."
             )
-        raise frappe.ValidationError(f"Evolution text send failed. Tried: {', '.join(errors)}")
+        # Only worth retrying when no endpoint gave a definitive (4xx) answer.
+        error_class = EvolutionTransientError if attempted and transient == attempted else frappe.ValidationError
+        raise error_class(f"Evolution {kind} send failed. Tried: {', '.join(errors)}")
 
-    def send_media(self, to_number, media_url, media_type="document", caption="", media_bytes=None, filename=None):
-        if media_bytes:
-            # Prefer content hash so signed URLs for same file don't bypass dedup.
-            dedup_content = f"{media_type}|{caption or ''}|{hashlib.sha1(media_bytes).hexdigest()}"
-        else:
-            dedup_content = f"{media_type}|{caption or ''}|{media_url or ''}|{filename or ''}"
-        if not self._acquire_dedup("media", to_number, dedup_content, ttl=60):
-            return {"id": "dedup-skip"}
+    def send_message(self, to_number, message, **kwargs):
+        payload_variants = [
+            ("number_text", {"number": to_number, "text": message}),
+            ("to_text", {"to": to_number, "text": message}),
+            ("text_message", {"number": to_number, "textMessage": {"text": message}}),
+            (
+                "text_message_options",
+                {
+                    "number": to_number,
+                    "options": {"delay": 1200, "presence": "composing"},
+                    "textMessage": {"text": message},
+                },
+            ),
+        ]
+        return self._post_candidates("text", self._text_candidate_urls(), payload_variants, timeout=20)
 
-        media_type = (media_type or "document").lower()
-        media_url = requests.utils.requote_uri(media_url or "")
-        payload_variants = []
+    def _download_media(self, media_url, stack):
+        """Return a buffer with the bytes behind ``media_url``.
 
-        if media_bytes:
+        Small files are cached by URL hash so repeated sends reuse them; larger
+        ones are streamed to a temporary file and memory-mapped.
+        """
+        key = f"wa_evo_media:{hashlib.sha1(media_url.encode('utf-8')).hexdigest()}"
+        cache = frappe.cache()
+        try:
+            content = cache.get_value(key)
+        except Exception:
+            content = None
+        if content:
+            return content
+
+        # The download is read after this returns, so the session is held by ``stack``.
+        session = stack.enter_context(self._use_session())
+        response = session.get(media_url, timeout=20, stream=True)
+        stack.callback(response.close)
+        response.raise_for_status()
+        length = int(response.headers.get("Content-Length") or 0)
+        if length and length <= MEDIA_CACHE_MAX_BYTES:
+            content = response.content
+        else:
+            content = spool_download(response, stack)
+        if content and len(content) <= MEDIA_CACHE_MAX_BYTES:
             try:
-                encoded = base64.b64encode(media_bytes).decode("ascii")
-                media_name = filename or f"{media_type}.bin"
-                # Prefer direct base64 payload when bytes are already available.
-                payload_variants.append(
-                    {
-                        "number": to_number,
-                        "mediaMessage": {
-                            "mediatype": media_type,
-                            "media": encoded,
-                            "caption": caption or "",
-                            "fileName": media_name,
-                        },
-                    }
-                )
-                payload_variants.append(
-                    {
-                        "number": to_number,
-                        "mediatype": media_type,
-                        "media": encoded,
-                        "caption": caption or "",
-                        "fileName": media_name,
-                    }
-                )
+                cache.set_value(key, bytes(content), expires_in_sec=MEDIA_CACHE_TTL)
             except Exception:
                 pass
+        return content
+
+    def send_media(
+        self,
+        to_number,
+        media_url,
+        media_type="document",
+        caption="",
+        media_bytes=None,
+        filename=None,
+        media_path=None,
+    ):
+        with ExitStack() as stack:
+            if media_path and not media_bytes:
+                # Local files are memory-mapped instead of read into the worker.
+                media_bytes = map_file(media_path, stack)
+                filename = filename or os.path.basename(media_path)
+            return self._send_media(to_number, media_url, media_type, caption, media_bytes, filename, stack)
+
+    def _send_media(self, to_number, media_url, media_type, caption, media_bytes, filename, stack):
+        media_type = (media_type or "document").lower()
+        media_url = requests.utils.requote_uri(media_url or "")
+        if media_bytes:
+            media_name = filename or f"{media_type}.bin"
+        else:
+            media_name = media_url.rstrip("/").split("/")[-1] or f"{media_type}.bin"
 
-        # Use URL variants only when we don't already have raw bytes.
-        if media_url and not media_bytes:
-            payload_variants.extend(
-                [
-                    {
-                        "number": to_number,
-                        "mediaMessage": {
-                            "mediatype": media_type,
-                            "media": media_url,
-                            "caption": caption or "",
-                        },
-                    },
-                    {
-                        "number": to_number,
-                        "mediatype": media_type,
-                        "media": media_url,
-                        "caption": caption or "",
-                    },
-                    {
-                        "to": to_number,
-                        "mediatype": media_type,
-                        "media": media_url,
-                        "caption": caption or "",
-                    },
-                ]
-            )
-            # Optional base64 fallback for Evolution setups that do not accept remote URLs.
-            try:
-                response = requests.get(media_url, timeout=20)
-                response.raise_for_status()
-                encoded = base64.b64encode(response.content).decode("ascii")
-                payload_variants.append({
-                    "number": to_number,
+        source_cache = {}
+
+        def media_source():
+            # Resolved on first use only, so URL sends never pay for a download.
+            if "media" not in source_cache:
+                try:
+                    source_cache["media"] = media_bytes or self._download_media(media_url, stack)
+                except Exception:
+                    source_cache["media"] = None
+            return source_cache["media"]
+
+        def base64_body(payload, media_key):
+            def build():
+                source = media_source()
+                if not source:
+                    return None
+                # The base64 text is encoded chunk by chunk while the request is sent.
+                return StreamingJSONBody(payload, source, media_key)
+
+            return build
+
+        media_message_base64 = base64_body(
+            {
+                "number": to_number,
+                "mediaMessage": {
                     "mediatype": media_type,
-                    "media": encoded,
+                    "media": "",
                     "caption": caption or "",
-                    "fileName": media_url.rstrip("/").split("/")[-1] or f"{media_type}.bin",
-                })
-                payload_variants.append({
+                    "fileName": media_name,
+                },
+            },
+            ("mediaMessage", "media"),
+        )
+        flat_base64 = base64_body(
+            {
+                "number": to_number,
+                "mediatype": media_type,
+                "media": "",
+                "caption": caption or "",
+                "fileName": media_name,
+            },
+            ("media",),
+        )
+
+        base64_variants = [("media_message_base64", media_message_base64), ("flat_base64", flat_base64)]
+
+        if media_bytes or not media_url:
+            # Prefer direct base64 payload when bytes are already available.
+            return self._post_candidates("media", self._media_candidate_urls(), base64_variants, timeout=25)
+
+        url_variants = [
+            (
+                "media_message_url",
+                {
                     "number": to_number,
                     "mediaMessage": {
                         "mediatype": media_type,
-                        "media": encoded,
+                        "media": media_url,
                         "caption": caption or "",
-                        "fileName": media_url.rstrip("/").split("/")[-1] or f"{media_type}.bin",
                     },
-                })
-            except Exception:
-                pass
-
-        errors = []
-        seen_session_error = ""
-        for url in self._media_candidate_urls():
-            for payload in payload_variants:
-                try:
-                    response = requests.post(url, json=payload, headers=self._headers(), timeout=25)
-                    response.raise_for_status()
-                    return response.json()
-                except requests.HTTPError as e:
-                    session_error = self._extract_session_error(e.response)
-                    if session_error:
-                        seen_session_error = session_error
-                    status_code = e.response.status_code if e.response is not None else "?"
-                    has_file_name = bool(payload.get("fileName") or (payload.get("mediaMessage") or {}).get("fileName"))
-                    mode = "base64" if has_file_name else "url"
-                    body = ""
-                    if e.response is not None:
-                        body = (e.response.text or "").strip().replace("\n", " ")[:180]
-                    errors.append(f"{url} ({mode}) -> {status_code} {body}".strip())
-                except Exception as e:
-                    has_file_name = bool(payload.get("fileName") or (payload.get("mediaMessage") or {}).get("fileName"))
-                    mode = "base64" if has_file_name else "url"
-                    errors.append(f"{url} ({mode}) -> {str(e)}")
-
-        if seen_session_error:
-            raise frappe.ValidationError(
-                f"Evolution instance '{self.instance or '-'}' is not connected ({seen_session_error}). "
-                "Open Evolution Manager, connect the instance (QR), then retry."
-            )
-        raise frappe.ValidationError(
-            f"Evolution media send failed. Tried: {', '.join(errors)}"
+                },
+            ),
+            (
+                "flat_url",
+                {
+                    "number": to_number,
+                    "mediatype": media_type,
+                    "media": media_url,
+                    "caption": caption or "",
+                },
+            ),
+            (
+                "to_url",
+                {
+                    "to": to_number,
+                    "mediatype": media_type,
+                    "media": media_url,
+                    "caption": caption or "",
+                },
+            ),
+        ]
+        # Base64 fallback for Evolution setups that do not accept remote URLs; the
+        # file is only downloaded once every URL variant has been rejected.
+        return self._post_candidates(
+            "media",
+            self._media_candidate_urls(),
+            url_variants,
+            timeout=25,
+            fallback_variants=base64_variants,
         )
 
+    def send_many(self, items, concurrency=None):
+        """Send several text/media items concurrently against this instance.
+
+        Each item is a dict with ``to_number`` and either ``message`` or the
+        ``send_media`` arguments (``media_url``, ``media_type``, ``caption`` ...).
+        At most ``concurrency`` (by default the account's ``max_concurrent_sends``)
+        requests per instance are in flight in this process, across all batches,
+        and never more than the pooled HTTP session holds. Send guards are the
+        caller's job; see ``whatsapp_evolution.utils.batch_send``.
+        """
+        items = list(items or [])
+        pool_size = int(self.pool_size or DEFAULT_POOL_SIZE)
+        limit = int(concurrency or self.settings.get("max_concurrent_sends") or 1)
+        limit = max(min(limit, pool_size), 1)
+        slots = _instance_send_slots(self.api_base, self.instance, limit)
+
+        def send_one(item):
+            with slots:
+                return self._send_item_result(item)
+
+        if limit == 1 or len(items) <= 1:
+            return [send_one(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(limit, len(items))) as pool:
+            # Each task runs in a copy of this context, so frappe.local stays bound.
+            futures = [pool.submit(contextvars.copy_context().run, send_one, item) for item in items]
+            return [future.result() for future in futures]
+
     def parse_incoming(self, data):
+        """Parse every item of a webhook payload; Evolution batches items in a list."""
         event = data.get("event")
-        payload = data.get("data") or {}
-        if isinstance(payload, list):
-            payload = payload[0] if payload else {}
+        return [self._parse_item(event, payload) for payload in _webhook_items(data)]
 
+    def _parse_item(self, event, payload):
         if event == "messages.upsert":
             message = payload.get("message") or {}
             key = payload.get("key") or {}
@@ -335,7 +558,8 @@ class EvolutionProvider(BaseProvider):
         last_error = ""
         for url in urls:
             try:
-                response = requests.get(url, headers=self._headers(), timeout=20)
+                with self._use_session() as session:
+                    response = session.get(url, headers=self._headers(), timeout=20)
                 if response.status_code == 404:
                     last_error = f"{url} -> 404"
                     continue
@@ -362,11 +586,6 @@ class EvolutionProvider(BaseProvider):
         return {"ok": False, "status": "error", "message": last_error or "Unable to reach Evolution API"}
 
 
-def _status_rank(status_text):
-    order = {"Success": 1, "Sent": 1, "Delivered": 2, "Read": 3, "Played": 4}
-    return order.get(status_text or "", 0)
-
-
 def _map_evolution_status(status_value):
     if status_value is None:
         return None
@@ -402,69 +621,29 @@ def _map_evolution_status(status_value):
     return None
 
 
-def _message_id_candidates(message_id):
-    raw = (message_id or "").strip()
-    if not raw:
-        return []
-    variants = {raw}
-    if raw.startswith("wamid."):
-        variants.add(raw.replace("wamid.", "", 1))
-    else:
-        variants.add(f"wamid.{raw}")
-    return list(variants)
-
-
-def _find_message_name_by_id(message_id):
-    candidates = _message_id_candidates(message_id)
-    if not candidates:
-        return None
-    rows = frappe.get_all(
-        "WhatsApp Message",
-        filters={"message_id": ["in", candidates]},
-        fields=["name", "status"],
-        order_by="modified desc",
-        limit_page_length=1,
-    )
-    return rows[0] if rows else None
-
-
-def _digits(value):
-    return "".join(ch for ch in str(value or "") if ch.isdigit())
-
-
-def _numbers_match(a, b):
-    da, db = _digits(a), _digits(b)
-    if not da or not db:
-        return False
-    if da == db:
-        return True
-    # Handle local/international variants (e.g. 0331... vs 92331...)
-    return da.endswith(db[-10:]) or db.endswith(da[-10:])
-
-
 def _find_recent_outgoing_by_number(remote_jid, instance_name=None):
-    number = (remote_jid or "").split("@")[0]
-    if not number:
+    suffix = phone_suffix((remote_jid or "").split("@")[0])
+    if not suffix:
         return None
 
     rows = frappe.get_all(
         "WhatsApp Message",
         filters={
             "type": "Outgoing",
+            "to_number_suffix": suffix,
             "creation": [">=", frappe.utils.add_to_date(frappe.utils.now_datetime(), hours=-24)],
         },
         fields=["name", "status", "to", "whatsapp_account", "creation"],
         order_by="creation desc",
-        limit_page_length=80,
+        limit_page_length=20,
     )
 
-    candidates = [r for r in rows if _numbers_match(r.get("to"), number)]
     if instance_name:
-        inst_candidates = [r for r in candidates if (r.get("whatsapp_account") or "") == instance_name]
+        inst_candidates = [r for r in rows if (r.get("whatsapp_account") or "") == instance_name]
         if inst_candidates:
-            candidates = inst_candidates
+            rows = inst_candidates
 
-    return candidates[0] if candidates else None
+    return rows[0] if rows else None
 
 
 def _log_webhook_debug(payload):
@@ -474,11 +653,11 @@ def _log_webhook_debug(payload):
         pass
 
 
-def _normalize_webhook_data(data):
+def _webhook_items(data):
     payload = data.get("data") or {}
     if isinstance(payload, list):
-        return payload[0] if payload else {}
-    return payload if isinstance(payload, dict) else {}
+        return [item for item in payload if isinstance(item, dict)]
+    return [payload] if isinstance(payload, dict) else []
 
 
 def _extract_instance_name(data, payload_data):
@@ -506,28 +685,55 @@ def handle_webhook():
     if not event_type:
         return "No event"
 
+    if webhook_stream.is_queued_mode():
+        webhook_stream.publish(data)
+        return "OK"
+
+    process_webhook_payload(data)
+    return "OK"
+
+
+def process_webhook_payload(data):
+    """Apply one (possibly batched) Evolution webhook payload."""
+    event_type = data.get("event")
+    if not event_type:
+        return
+
     provider = EvolutionProvider(frappe.get_single("WhatsApp Settings").as_dict())
-    msg = provider.parse_incoming(data)
-    payload_data = _normalize_webhook_data(data)
+    items = _webhook_items(data)
+    messages = provider.parse_incoming(data)
     
     if event_type == "messages.upsert":
-        if msg.get("is_from_me"):
-            # Update outgoing message status if we find it by ID
-            if msg.get("message_id"):
-                found = _find_message_name_by_id(msg.get("message_id"))
-                if found and _status_rank("Sent") >= _status_rank(found.get("status")):
-                    frappe.db.set_value("WhatsApp Message", found.get("name"), "status", "Sent")
-            return "OK"
-            
-        from whatsapp_evolution.incoming import handle_incoming_message
-        handle_incoming_message(msg)
+        own_ids = []
+        for msg in messages:
+            if msg.get("is_from_me"):
+                # Outgoing echo: mark the stored message Sent once all ids are known.
+                if msg.get("message_id"):
+                    own_ids.append(msg.get("message_id"))
+                continue
+
+            from whatsapp_evolution.incoming import handle_incoming_message
+            handle_incoming_message(msg)
+
+        if own_ids:
+            apply_status_updates({row.name: {"status": "Sent"} for row in find_messages_by_ids(own_ids).values()})
         
     elif event_type == "messages.update":
+        _apply_evolution_status_updates(data, items, messages)
+
+
+def _apply_evolution_status_updates(data, items, messages):
+    found_by_id = find_messages_by_ids(msg.get("message_id") for msg in messages)
+    matched = {}
+    updates = {}
+    pending = []
+
+    for payload_data, msg in zip(items, messages):
         status_code = msg.get("status")
         message_id = msg.get("message_id")
-        key_data = payload_data.get("key") if isinstance(payload_data, dict) else {}
-        remote_jid = (key_data or {}).get("remoteJid")
-        from_me = (key_data or {}).get("fromMe")
+        key_data = payload_data.get("key") or {}
+        remote_jid = key_data.get("remoteJid")
+        from_me = key_data.get("fromMe")
         if not remote_jid:
             remote_jid = msg.get("to")
             if remote_jid and "@" not in remote_jid:
@@ -546,45 +752,7 @@ def handle_webhook():
             }
         )
 
-        if status_code is not None:
-            if status_text:
-                found_by_id = _find_message_name_by_id(message_id) if message_id else None
-                found = found_by_id
-                if not found and remote_jid:
-                    found = _find_recent_outgoing_by_number(remote_jid, instance_name=instance_name)
-                if found and _status_rank(status_text) >= _status_rank(found.get("status")):
-                    frappe.db.set_value("WhatsApp Message", found.get("name"), "status", status_text)
-                    _log_webhook_debug(
-                        {
-                            "event": "messages.update.applied",
-                            "message_id": message_id,
-                            "docname": found.get("name"),
-                            "previous_status": found.get("status"),
-                            "new_status": status_text,
-                            "fallback_by_number": bool(not found_by_id and remote_jid),
-                        }
-                    )
-                else:
-                    _log_webhook_debug(
-                        {
-                            "event": "messages.update.skipped",
-                            "reason": "no_match_or_lower_rank",
-                            "message_id": message_id,
-                            "status_mapped": status_text,
-                            "matched_doc": found.get("name") if found else None,
-                            "current_status": found.get("status") if found else None,
-                        }
-                    )
-            else:
-                _log_webhook_debug(
-                    {
-                        "event": "messages.update.skipped",
-                        "reason": "unmapped_status",
-                        "message_id": message_id,
-                        "status_raw": status_code,
-                    }
-                )
-        else:
+        if status_code is None:
             _log_webhook_debug(
                 {
                     "event": "messages.update.skipped",
@@ -593,5 +761,65 @@ def handle_webhook():
                     "status_raw": status_code,
                 }
             )
+            continue
 
-    return "OK"
+        if not status_text:
+            _log_webhook_debug(
+                {
+                    "event": "messages.update.skipped",
+                    "reason": "unmapped_status",
+                    "message_id": message_id,
+                    "status_raw": status_code,
+                }
+            )
+            continue
+
+        found = found_by_id.get(normalize_message_id(message_id)) if message_id else None
+        if not found and message_id:
+            # The send job may not have stored this id yet; hold the receipt for
+            # it, and still try the number below in case the id never arrives.
+            pending.append((message_id, status_text, {}))
+            _log_webhook_debug(
+                {
+                    "event": "messages.update.buffered",
+                    "message_id": message_id,
+                    "status_mapped": status_text,
+                }
+            )
+
+        fallback_by_number = False
+        if not found and remote_jid:
+            found = _find_recent_outgoing_by_number(remote_jid, instance_name=instance_name)
+            fallback_by_number = bool(found)
+        if found:
+            # Several receipts for one message can share a batch; rank against
+            # the status already applied in this batch, not the stale row.
+            found = matched.setdefault(found.get("name"), found)
+
+        if found and status_rank(status_text) > status_rank(found.get("status")):
+            _log_webhook_debug(
+                {
+                    "event": "messages.update.applied",
+                    "message_id": message_id,
+                    "docname": found.get("name"),
+                    "previous_status": found.get("status"),
+                    "new_status": status_text,
+                    "fallback_by_number": fallback_by_number,
+                }
+            )
+            found["status"] = status_text
+            add_status_update(updates, found.get("name"), status_text)
+        else:
+            _log_webhook_debug(
+                {
+                    "event": "messages.update.skipped",
+                    "reason": "no_match_or_lower_rank",
+                    "message_id": message_id,
+                    "status_mapped": status_text,
+                    "matched_doc": found.get("name") if found else None,
+                    "current_status": found.get("status") if found else None,
+                }
+            )
+
+    apply_status_updates(updates)
+    buffer_pending_acks(pending)
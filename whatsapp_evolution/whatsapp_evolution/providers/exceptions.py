@@ -0,0 +1,5 @@
+import frappe
+
+
+class EvolutionTransientError(frappe.ValidationError):
+    """A send failed for a reason that may clear up on its own (timeout, 5xx, disconnected instance)."""
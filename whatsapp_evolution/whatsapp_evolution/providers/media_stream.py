@@ -0,0 +1,103 @@
+"""Memory-bounded media payloads for Evolution base64 uploads.
+
+Instead of holding the raw file, its base64 string and the serialized JSON body
+at once, the body is produced in fixed-size chunks straight from a buffer
+(``bytes``, or an ``mmap`` of a local file / spooled download).
+"""
+
+import base64
+import json
+import mmap
+import os
+import tempfile
+from urllib.parse import unquote
+
+import frappe
+
+
+# Multiple of 3 so every chunk encodes to base64 without padding.
+CHUNK_SIZE = 3 * 64 * 1024
+_PLACEHOLDER = "__wa_evo_media_stream__"
+
+
+class StreamingJSONBody:
+    """Iterable JSON request body whose ``media`` value is base64-encoded on the fly.
+
+    ``payload`` is the request dict with the media value set to any string; it is
+    replaced by the encoded ``buffer``. ``len()`` gives the exact body size so the
+    request is sent with a Content-Length instead of chunked transfer encoding.
+    The body can be iterated more than once, one pass per candidate endpoint.
+    """
+
+    def __init__(self, payload, buffer, media_key=("media",)):
+        payload = json.loads(json.dumps(payload))
+        target = payload
+        for key in media_key[:-1]:
+            target = target[key]
+        target[media_key[-1]] = _PLACEHOLDER
+        prefix, suffix = json.dumps(payload).split(json.dumps(_PLACEHOLDER), 1)
+        self._prefix = (prefix + '"').encode("utf-8")
+        self._suffix = ('"' + suffix).encode("utf-8")
+        self._buffer = buffer
+
+    def __len__(self):
+        return len(self._prefix) + base64_length(len(self._buffer)) + len(self._suffix)
+
+    def __iter__(self):
+        yield self._prefix
+        # Slices copy one chunk at a time, so no buffer export keeps an mmap pinned.
+        for start in range(0, len(self._buffer), CHUNK_SIZE):
+            yield base64.b64encode(self._buffer[start : start + CHUNK_SIZE])
+        yield self._suffix
+
+
+def base64_length(size):
+    return 4 * ((size + 2) // 3)
+
+
+def local_file_path(file_url):
+    """Return the on-disk path for a ``/files`` or ``/private/files`` URL, if it exists."""
+    file_url = (file_url or "").split("?", 1)[0]
+    if file_url.startswith("/private/files/"):
+        parts = ("private", "files", unquote(file_url[len("/private/files/") :]))
+    elif file_url.startswith("/files/"):
+        parts = ("public", "files", unquote(file_url[len("/files/") :]))
+    else:
+        return None
+
+    base = os.path.realpath(frappe.get_site_path(*parts[:2]))
+    path = os.path.realpath(os.path.join(base, parts[2]))
+    if not path.startswith(base + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def map_file(path, stack):
+    """Memory-map ``path`` read-only; the mapping is closed with ``stack``."""
+    handle = stack.enter_context(open(path, "rb"))
+    if os.fstat(handle.fileno()).st_size == 0:
+        return b""
+    return stack.enter_context(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def spool_bytes(content, stack, suffix=""):
+    """Write ``content`` to a temporary file removed with ``stack`` and return its path.
+
+    Lets the caller drop its copy and send the file through ``map_file``.
+    """
+    handle = stack.enter_context(tempfile.NamedTemporaryFile(suffix=suffix))
+    handle.write(content or b"")
+    handle.flush()
+    return handle.name
+
+
+def spool_download(response, stack):
+    """Write a streamed HTTP response to a temporary file and memory-map it."""
+    handle = stack.enter_context(tempfile.TemporaryFile())
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if chunk:
+            handle.write(chunk)
+    handle.flush()
+    if handle.tell() == 0:
+        return b""
+    return stack.enter_context(mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,120 @@
+"""Process-wide pool of keep-alive HTTP sessions for provider calls."""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_IDLE_TIMEOUT = 300
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+class _PooledSession:
+    __slots__ = ("session", "pool_size", "last_used", "in_use", "retired")
+
+    def __init__(self, session, pool_size):
+        self.session = session
+        self.pool_size = pool_size
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.retired = False
+
+
+def _build_session(pool_size):
+    session = requests.Session()
+    # Retries are handled by the provider's URL/payload discovery loop.
+    # A few host pools are kept so media downloads from the site do not evict
+    # the Evolution API connections.
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+
+def _close(pooled):
+    try:
+        pooled.session.close()
+    except Exception:
+        pass
+
+
+def _retire(pooled):
+    """Close ``pooled`` now, or when its last user returns it. Call with ``_lock`` held."""
+    pooled.retired = True
+    if not pooled.in_use:
+        _close(pooled)
+
+
+def _evict_idle(now, idle_timeout):
+    for key, pooled in list(_sessions.items()):
+        if not pooled.in_use and now - pooled.last_used > idle_timeout:
+            _sessions.pop(key, None)
+            _retire(pooled)
+
+
+def _checkout(api_base, token, pool_size, idle_timeout):
+    pool_size = max(int(pool_size or DEFAULT_POOL_SIZE), 1)
+    idle_timeout = max(int(idle_timeout or DEFAULT_IDLE_TIMEOUT), 1)
+    key = ((api_base or "").rstrip("/"), token or "")
+    now = time.monotonic()
+
+    _evict_idle(now, idle_timeout)
+    pooled = _sessions.get(key)
+    if pooled is None or pooled.pool_size != pool_size:
+        if pooled is not None:
+            # Threads still sending on the old session keep it until they are done.
+            _retire(pooled)
+        pooled = _PooledSession(_build_session(pool_size), pool_size)
+        _sessions[key] = pooled
+    pooled.last_used = now
+    return pooled
+
+
+def get_session(api_base, token, pool_size=None, idle_timeout=None):
+    """Return the shared session for (api_base, token), creating it if needed.
+
+    Sessions idle for longer than ``idle_timeout`` seconds are closed on the
+    next lookup, so rotated tokens and removed accounts do not leak sockets.
+    Callers that send on the session should hold it with ``use_session``, so
+    a settings change does not close it under them.
+    """
+    with _lock:
+        return _checkout(api_base, token, pool_size, idle_timeout).session
+
+
+@contextmanager
+def use_session(api_base, token, pool_size=None, idle_timeout=None):
+    """Hold the shared session for (api_base, token) while the block runs.
+
+    A session in use is never evicted, and one replaced because
+    ``pool_size`` changed is closed only after its last user exits.
+    """
+    with _lock:
+        pooled = _checkout(api_base, token, pool_size, idle_timeout)
+        pooled.in_use += 1
+    try:
+        yield pooled.session
+    finally:
+        with _lock:
+            pooled.in_use -= 1
+            pooled.last_used = time.monotonic()
+            if pooled.retired and not pooled.in_use:
+                _close(pooled)
+
+
+def close_all_sessions():
+    """Close every pooled session (used by tests and on settings change).
+
+    Sessions still in use are closed when their last user exits.
+    """
+    with _lock:
+        for pooled in _sessions.values():
+            _retire(pooled)
+        _sessions.clear()
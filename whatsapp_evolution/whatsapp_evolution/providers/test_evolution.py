@@ -0,0 +1,226 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+import base64
+import hashlib
+import tempfile
+from unittest.mock import MagicMock, patch
+
+import frappe
+import requests
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.whatsapp_evolution.providers.circuit_breaker import (
+    FAILURE_THRESHOLD,
+    EvolutionCircuitOpenError,
+)
+from whatsapp_evolution.utils import phone_suffix
+from whatsapp_evolution.whatsapp_evolution.providers.evolution import (
+    EvolutionProvider,
+    _apply_evolution_status_updates,
+)
+from whatsapp_evolution.whatsapp_evolution.providers.media_stream import StreamingJSONBody
+
+
+def _response(status_code=200, body=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = ""
+    response.json.return_value = body or {}
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+class TestEvolutionProvider(IntegrationTestCase):
+    """Tests for EvolutionProvider sending."""
+
+    def setUp(self):
+        self.provider = EvolutionProvider(
+            {
+                "evolution_api_base": "https://evo.example.com",
+                "evolution_api_token": "tok",
+                "evolution_instance": "route-test",
+            }
+        )
+        self.provider._forget_route("text")
+        self.provider.breaker.record_success()
+
+    def tearDown(self):
+        self.provider._forget_route("text")
+        self.provider.breaker.record_success()
+
+    def test_successful_route_is_remembered_and_tried_first(self):
+        # First two combinations fail, third succeeds.
+        responses = [_response(404), _response(400), _response(200, {"key": {"id": "A"}})]
+        with patch.object(self.provider.session, "post", side_effect=responses) as post:
+            self.provider.send_message("15550001111", "hi")
+            winning_url = post.call_args_list[-1].args[0]
+            winning_payload = post.call_args_list[-1].kwargs["json"]
+
+        route = self.provider._get_cached_route("text")
+        self.assertEqual(route["url"], winning_url)
+
+        with patch.object(self.provider.session, "post", return_value=_response(200, {"key": {"id": "B"}})) as post:
+            self.provider.send_message("15550001111", "hi")
+            self.assertEqual(post.call_count, 1)
+            self.assertEqual(post.call_args.args[0], winning_url)
+            self.assertEqual(post.call_args.kwargs["json"].keys(), winning_payload.keys())
+
+    def test_failed_cached_route_is_forgotten(self):
+        self.provider._remember_route("text", "https://evo.example.com/gone", "number_text")
+        with patch.object(self.provider.session, "post", return_value=_response(500)):
+            with self.assertRaises(frappe.ValidationError):
+                self.provider.send_message("15550001111", "hi")
+        self.assertIsNone(self.provider._get_cached_route("text"))
+
+    def test_circuit_opens_after_repeated_connection_failures(self):
+        with patch.object(self.provider.session, "post", side_effect=requests.ConnectionError("refused")):
+            for _ in range(FAILURE_THRESHOLD):
+                with self.assertRaises(frappe.ValidationError):
+                    self.provider.send_message("15550001111", "hi")
+        self.assertTrue(self.provider.breaker.is_open())
+
+        with patch.object(self.provider.session, "post") as post:
+            with self.assertRaises(EvolutionCircuitOpenError):
+                self.provider.send_message("15550001111", "hi")
+            post.assert_not_called()
+
+    def test_failure_window_is_not_extended_by_later_failures(self):
+        breaker = self.provider.breaker
+        cache = frappe.cache()
+        breaker.record_failure()
+        cache.expire(breaker._key("fail"), 5)
+        breaker.record_failure()
+        self.assertLessEqual(cache.ttl(breaker._key("fail")), 5)
+        self.assertEqual(int(cache.get(breaker._key("fail"))), 2)
+
+    def test_send_media_by_url_does_not_download_when_url_accepted(self):
+        self.provider._forget_route("media")
+        with patch.object(self.provider.session, "post", return_value=_response(200, {"key": {"id": "M"}})):
+            with patch.object(self.provider.session, "get") as get:
+                self.provider.send_media("15550001111", "https://files.example.com/a.pdf")
+                get.assert_not_called()
+        self.provider._forget_route("media")
+
+    def test_send_media_falls_back_to_base64_after_url_variants(self):
+        self.provider._forget_route("media")
+        url = "https://files.example.com/b.pdf"
+        frappe.cache().delete_value(f"wa_evo_media:{hashlib.sha1(url.encode('utf-8')).hexdigest()}")
+        download = MagicMock(content=b"%PDF-1.4", headers={"Content-Length": "8"})
+        posted = []
+
+        def fake_post(url, json=None, data=None, **kwargs):
+            payload = json if data is None else frappe.parse_json(b"".join(data).decode())
+            posted.append(payload)
+            media = payload.get("media") or payload.get("mediaMessage", {}).get("media")
+            return _response(400) if media.startswith("https://") else _response(200, {"key": {"id": "M"}})
+
+        with patch.object(self.provider.session, "post", side_effect=fake_post):
+            with patch.object(self.provider.session, "get", return_value=download) as get:
+                self.provider.send_media("15550001111", url)
+                get.assert_called_once()
+        sent = posted[-1].get("mediaMessage", posted[-1])
+        self.assertEqual(base64.b64decode(sent["media"]), b"%PDF-1.4")
+        self.assertEqual(sent["fileName"], "b.pdf")
+        self.provider._forget_route("media")
+
+    def test_base64_goes_first_once_url_variants_failed(self):
+        self.provider._forget_route("media")
+        url = "https://files.example.com/d.pdf"
+        frappe.cache().delete_value(f"wa_evo_media:{hashlib.sha1(url.encode('utf-8')).hexdigest()}")
+        download = MagicMock(content=b"%PDF-1.4", headers={"Content-Length": "8"})
+
+        def fake_post(url, json=None, data=None, **kwargs):
+            payload = json if data is None else frappe.parse_json(b"".join(data).decode())
+            media = payload.get("media") or payload.get("mediaMessage", {}).get("media")
+            return _response(400) if media.startswith("https://") else _response(200, {"key": {"id": "M"}})
+
+        with patch.object(self.provider.session, "post", side_effect=fake_post) as post:
+            with patch.object(self.provider.session, "get", return_value=download):
+                self.provider.send_media("15550001111", url)
+                self.assertGreater(post.call_count, 1)
+                post.reset_mock()
+                self.provider.send_media("15550001111", url)
+                # The base64 route is tried before the url variants that failed last time.
+                self.assertEqual(post.call_count, 1)
+        self.provider._forget_route("media")
+
+    def test_base64_route_does_not_precede_url_variants(self):
+        self.provider._forget_route("media")
+        self.provider._remember_route("media", self.provider._media_candidate_urls()[0], "media_message_base64")
+        with patch.object(self.provider.session, "post", return_value=_response(200, {"key": {"id": "M"}})) as post:
+            with patch.object(self.provider.session, "get") as get:
+                self.provider.send_media("15550001111", "https://files.example.com/c.pdf")
+                get.assert_not_called()
+        self.assertEqual(post.call_count, 1)
+        self.assertIsNotNone(self.provider._get_cached_route("media", "base64"))
+        self.assertIsNotNone(self.provider._get_cached_route("media", "url"))
+        self.provider._forget_route("media")
+
+    def test_send_media_streams_local_file(self):
+        self.provider._forget_route("media")
+        content = b"x" * 300000
+        with tempfile.NamedTemporaryFile(suffix=".pdf") as handle:
+            handle.write(content)
+            handle.flush()
+            with patch.object(self.provider.session, "post", return_value=_response(200, {"key": {"id": "M"}})) as post:
+                self.provider.send_media("15550001111", "", media_path=handle.name)
+
+        body = post.call_args.kwargs["data"]
+        self.assertIsInstance(body, StreamingJSONBody)
+        payload = frappe.parse_json(b"".join(body).decode())
+        self.assertEqual(base64.b64decode(payload["mediaMessage"]["media"]), content)
+        self.provider._forget_route("media")
+
+    def test_send_many_returns_results_in_item_order(self):
+        def send_message(to_number, message, **kwargs):
+            if to_number == "15550000002":
+                raise requests.ConnectionError("refused")
+            return {"key": {"id": to_number}}
+
+        items = [{"to_number": f"1555000000{i}", "message": "hi"} for i in range(1, 4)]
+        with patch.object(self.provider, "send_message", side_effect=send_message):
+            results = self.provider.send_many(items, concurrency=3)
+
+        self.assertEqual([result["ok"] for result in results], [True, False, True])
+        self.assertEqual(results[0]["response"], {"key": {"id": "15550000001"}})
+        self.assertEqual(results[2]["response"], {"key": {"id": "15550000003"}})
+        self.assertIsInstance(results[1]["exception"], requests.ConnectionError)
+
+    def test_parse_incoming_returns_every_batched_item(self):
+        data = {
+            "event": "messages.update",
+            "data": [
+                {"key": {"id": "A1", "remoteJid": "15550001111@s.whatsapp.net"}, "status": "DELIVERY_ACK"},
+                {"key": {"id": "B2", "remoteJid": "15550002222@s.whatsapp.net"}, "status": "READ"},
+            ],
+        }
+        parsed = self.provider.parse_incoming(data)
+        self.assertEqual([msg["message_id"] for msg in parsed], ["A1", "B2"])
+        self.assertEqual([msg["to"] for msg in parsed], ["15550001111", "15550002222"])
+
+    def test_unknown_receipt_id_falls_back_to_recent_message_by_number(self):
+        msg = frappe.get_doc(
+            {
+                "doctype": "WhatsApp Message",
+                "type": "Outgoing",
+                "to": "15550009876",
+                "to_number_suffix": phone_suffix("15550009876"),
+                "message": "Fallback test",
+                "content_type": "text",
+                "status": "Sent",
+            }
+        )
+        msg.flags.ignore_validate = True
+        msg.db_insert()
+        self.addCleanup(frappe.delete_doc, "WhatsApp Message", msg.name, force=True)
+
+        data = {
+            "event": "messages.update",
+            "data": {"key": {"id": "UNKNOWN-ID-1", "remoteJid": "15550009876@s.whatsapp.net"}, "status": "READ"},
+        }
+        items = [data["data"]]
+        _apply_evolution_status_updates(data, items, self.provider.parse_incoming(data))
+
+        self.assertEqual(frappe.db.get_value("WhatsApp Message", msg.name, "status"), "Read")
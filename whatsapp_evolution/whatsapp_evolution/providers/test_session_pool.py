@@ -0,0 +1,66 @@
+# Copyright (c) 2025, Shridhar Patil and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+from whatsapp_evolution.testing import IntegrationTestCase
+
+from whatsapp_evolution.whatsapp_evolution.providers import session_pool
+from whatsapp_evolution.whatsapp_evolution.providers.evolution import EvolutionProvider
+
+
+class TestSessionPool(IntegrationTestCase):
+    """Tests for the pooled provider HTTP sessions."""
+
+    def setUp(self):
+        session_pool.close_all_sessions()
+
+    def tearDown(self):
+        session_pool.close_all_sessions()
+
+    def test_same_credentials_share_session(self):
+        first = session_pool.get_session("https://evo.example.com/", "tok")
+        second = session_pool.get_session("https://evo.example.com", "tok")
+        self.assertIs(first, second)
+
+    def test_different_token_gets_new_session(self):
+        first = session_pool.get_session("https://evo.example.com", "tok-a")
+        second = session_pool.get_session("https://evo.example.com", "tok-b")
+        self.assertIsNot(first, second)
+
+    def test_pool_size_change_rebuilds_session(self):
+        first = session_pool.get_session("https://evo.example.com", "tok", pool_size=5)
+        second = session_pool.get_session("https://evo.example.com", "tok", pool_size=20)
+        self.assertIsNot(first, second)
+        adapter = second.get_adapter("https://evo.example.com")
+        self.assertEqual(adapter._pool_maxsize, 20)
+
+    def test_replaced_session_closes_after_last_user(self):
+        with session_pool.use_session("https://evo.example.com", "tok", pool_size=5) as old:
+            with patch.object(old, "close") as close:
+                session_pool.get_session("https://evo.example.com", "tok", pool_size=20)
+                # Another thread is still sending on it.
+                close.assert_not_called()
+        close.assert_called_once()
+
+    def test_sessions_in_use_are_not_evicted(self):
+        with patch.object(session_pool.time, "monotonic", return_value=1000.0):
+            with session_pool.use_session("https://evo.example.com", "tok", idle_timeout=60) as held:
+                with patch.object(session_pool.time, "monotonic", return_value=1100.0):
+                    again = session_pool.get_session("https://evo.example.com", "tok", idle_timeout=60)
+        self.assertIs(held, again)
+
+    def test_idle_sessions_are_evicted(self):
+        with patch.object(session_pool.time, "monotonic", return_value=1000.0):
+            first = session_pool.get_session("https://evo.example.com", "tok", idle_timeout=60)
+        with patch.object(session_pool.time, "monotonic", return_value=1100.0):
+            second = session_pool.get_session("https://evo.example.com", "tok", idle_timeout=60)
+        self.assertIsNot(first, second)
+
+    def test_providers_reuse_pooled_session(self):
+        settings = {
+            "evolution_api_base": "https://evo.example.com",
+            "evolution_api_token": "tok",
+            "evolution_instance": "erpnext",
+        }
+        self.assertIs(EvolutionProvider(settings).session, EvolutionProvider(settings).session)